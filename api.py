@@ -0,0 +1,390 @@
+"""
+Serve the survey's sightings and aggregates as JSON over HTTP, from the same
+shared dataset, filters and roll-ups as the dashboard:
+
+    python api.py serve --port 8502
+    curl 'localhost:8502/api/sightings?status=Red&year=2024&page=2&page_size=50'
+    curl 'localhost:8502/api/species?location=Northern,Eastern'
+    curl 'localhost:8502/api/monthly?species=Skylark&species=Bullfinch'
+
+Endpoints take `status`, `year` and `location` filters, each repeated or
+comma separated, plus `page` and `page_size`. `/api/sightings` also takes
+`sort` (one of the Raw Data columns) and `order` (`asc` or `desc`).
+`/api/meta` lists the filter values.
+
+Every response carries an ETag derived from the dataset version, the
+exclusions and the request, so a client repeating a request with
+If-None-Match gets a 304 without anything being recomputed. Bodies are kept
+in a cache bounded by size. To measure it under load:
+
+    python api.py bench --requests 5000 --concurrency 16
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import dashboard
+from figure_cache import FigureCache
+from sighting_table import SORT_COLUMNS
+
+API_PORT = int(os.environ.get("HEAL_API_PORT", "8502"))
+
+# Rows per page unless the client asks for another size, and the most it may ask for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Highest page number accepted, far beyond any survey's last page; larger ones are a 400,
+# as their offset would overflow SQLite's 64-bit integers
+MAX_PAGE = 1_000_000
+
+# Total size of the response bodies kept, in bytes
+API_CACHE_BYTES = 16 * 1024 * 1024
+
+response_cache = FigureCache(API_CACHE_BYTES)
+
+
+class BadRequest(ValueError):
+    """A query the API can't answer; reported to the client as a 400."""
+
+
+def query_values(query: Dict[str, List[str]], name: str) -> List[str]:
+    """Every value of a parameter, whether repeated or comma separated."""
+    return [value.strip() for values in query.get(name, []) for value in values.split(",") if value.strip()]
+
+
+def query_int(query: Dict[str, List[str]], name: str, default: int, minimum: int, maximum: int) -> int:
+    values = query_values(query, name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise BadRequest(f"'{name}' must be a whole number") from None
+    if not minimum <= value <= maximum:
+        raise BadRequest(f"'{name}' must be between {minimum} and {maximum}")
+    return value
+
+
+def parse_filters(query: Dict[str, List[str]]) -> Tuple[List[str], List[int], List[str]]:
+    """Conservation statuses, years and locations, sorted so equal filters give equal ETags."""
+    statuses = sorted(set(query_values(query, "status")))
+    unknown = set(statuses) - set(dashboard.SPECIES_REGISTRY.categories)
+    if unknown:
+        raise BadRequest(f"Unknown conservation status {', '.join(sorted(unknown))}")
+    try:
+        years = sorted({int(year) for year in query_values(query, "year")})
+    except ValueError:
+        raise BadRequest("'year' must be a whole number") from None
+    return statuses, years, sorted(set(query_values(query, "location")))
+
+
+def paginate(records: List[dict], page: int, page_size: int, total: Optional[int] = None) -> Dict[str, object]:
+    """Wrap one page of records with the counts a client needs to fetch the rest."""
+    total = len(records) if total is None else total
+    return {"page": page, "page_size": page_size, "pages": max(1, -(-total // page_size)), "total": total,
+            "results": records}
+
+
+def sightings_page(sightings, exclusions, query: Dict[str, List[str]]) -> Dict[str, object]:
+    """One sorted page of the filtered sightings, as the Raw Data tab shows them."""
+    filters = parse_filters(query)
+    sort_by = (query_values(query, "sort") or ["Date"])[-1]
+    if sort_by not in SORT_COLUMNS:
+        raise BadRequest(f"'sort' must be one of {', '.join(SORT_COLUMNS)}")
+    order = (query_values(query, "order") or ["asc"])[-1]
+    if order not in ("asc", "desc"):
+        raise BadRequest("'order' must be asc or desc")
+    page = query_int(query, "page", 1, 1, MAX_PAGE)
+    page_size = query_int(query, "page_size", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+
+    total = dashboard.count_raw_rows(sightings, *filters, exclusions=exclusions)
+    df = dashboard.get_raw_page(sightings, filters, sort_by, order == "asc", (page - 1) * page_size, page_size,
+                                exclusions)
+    df = df[SORT_COLUMNS + ["Issues"]].rename_axis("Key").reset_index()
+    df["Date"] = df["Date"].astype(str)
+    return paginate(json.loads(df.to_json(orient="records")), page, page_size, total)
+
+
+def species_page(sightings, exclusions, query: Dict[str, List[str]]) -> Dict[str, object]:
+    """Total count of each species under the filters, most counted first."""
+    filters = parse_filters(query)
+    page = query_int(query, "page", 1, 1, MAX_PAGE)
+    page_size = query_int(query, "page_size", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    totals = dashboard.get_aggregates(sightings, exclusions).species_totals(*filters)
+    records = json.loads(totals.drop(columns="species_id").to_json(orient="records"))
+    result = paginate(records[(page - 1) * page_size:page * page_size], page, page_size, len(records))
+    result["species_observed"] = len(records)
+    return result
+
+
+def monthly_page(sightings, exclusions, query: Dict[str, List[str]]) -> Dict[str, object]:
+    """Total count per month of each requested species, as the Species Detail timeline shows it."""
+    species = sorted(set(query_values(query, "species")))
+    if not species:
+        raise BadRequest("Give at least one 'species'")
+    page = query_int(query, "page", 1, 1, MAX_PAGE)
+    page_size = query_int(query, "page_size", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    records = json.loads(dashboard.get_aggregates(sightings, exclusions).monthly_totals(species)
+                         .to_json(orient="records"))
+    return paginate(records[(page - 1) * page_size:page * page_size], page, page_size, len(records))
+
+
+def meta(sightings, exclusions, query: Dict[str, List[str]]) -> Dict[str, object]:
+    """The values each filter can take."""
+    aggregates = dashboard.get_aggregates(sightings, exclusions)
+    return {"statuses": dashboard.SPECIES_REGISTRY.categories, "years": aggregates.years(),
+            "locations": aggregates.location_names(), "species": aggregates.species_names(),
+            "sort": SORT_COLUMNS}
+
+
+ENDPOINTS = {
+    "/api/sightings": sightings_page,
+    "/api/species": species_page,
+    "/api/monthly": monthly_page,
+    "/api/meta": meta,
+}
+
+
+def canonical_query(query: Dict[str, List[str]]) -> str:
+    """The request's parameters in a fixed order, so URLs differing only in parameter order share an ETag."""
+    return json.dumps({name: query_values(query, name) for name in sorted(query)})
+
+
+def response_etag(key: Tuple) -> str:
+    """Strong ETag of a response: its endpoint, dataset version, exclusions version and canonical query."""
+    return '"' + hashlib.sha256(json.dumps(key).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the ETag; weak validators compare equal too."""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, for clients that reuse them, and send
+    # each response as soon as it's written rather than waiting on the client's ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    quiet = False
+
+    def do_GET(self):
+        try:
+            self.dispatch()
+        except ConnectionError:
+            pass  # The client went away; there is no one to answer
+        except Exception as e:
+            print(f"Error handling {self.path}: {e!r}")
+            self.send_json(500, {"error": f"Internal error: {e}"})
+
+    def dispatch(self) -> None:
+        url = urlsplit(self.path)
+        handler = ENDPOINTS.get(url.path.rstrip("/"))
+        if handler is None:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}", "endpoints": sorted(ENDPOINTS)})
+            return
+
+        query = parse_qs(url.query)
+        try:
+            version, sightings = dashboard.get_shared_sightings()
+        except Exception as e:
+            self.send_json(503, {"error": f"Could not load sightings: {e}"})
+            return
+        # The ETag is known before anything is computed, so a matching request costs no aggregation.
+        # The body is built from the same overlay state, so it always matches its ETag
+        state = dashboard.exclusion_overlay.state()
+        key = (url.path.rstrip("/"), version, state[0], canonical_query(query))
+        etag = response_etag(key)
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+
+        def build() -> str:
+            exclusions = dashboard.get_exclusions(sightings, state)
+            return json.dumps({"dataset_version": version, **handler(sightings, exclusions, query)})
+
+        try:
+            body = response_cache.get_serialized(key, build)
+        except BadRequest as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_body(200, body, etag)
+
+    def send_json(self, status: int, payload: Dict[str, object]) -> None:
+        self.send_body(status, json.dumps(payload))
+
+    def send_body(self, status: int, body: str, etag: Optional[str] = None) -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            # Clients may keep responses but must revalidate, as the data can change at any time
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host: str, port: int, quiet: bool = False) -> ThreadingHTTPServer:
+    handler = type("Handler", (ApiHandler,), {"quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def request_mix(host: str, port: int, count: int, seed: int) -> List[str]:
+    """
+    Paths of a plausible workload: a tenth as many distinct requests as
+    `count`, the first few asked for far more often than the rest.
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    connection.request("GET", "/api/meta")
+    response = connection.getresponse()
+    values = json.loads(response.read())
+    connection.close()
+    if response.status != 200:
+        sys.exit(f"/api/meta returned {response.status}: {values.get('error')}")
+
+    rng = random.Random(seed)
+
+    def some(options: List[object]) -> List[object]:
+        return rng.sample(options, rng.randint(0, min(2, len(options))))
+
+    distinct = []
+    for _ in range(max(1, count // 10)):
+        endpoint = rng.choices(["sightings", "species", "monthly"], weights=[5, 3, 2])[0]
+        params: Dict[str, object] = {"page": min(rng.randint(1, 4), rng.randint(1, 4))}
+        if endpoint == "monthly":
+            params["species"] = rng.sample(values["species"], min(rng.randint(1, 3), len(values["species"])))
+        else:
+            params.update(status=some(values["statuses"]), year=some(values["years"]),
+                          location=some(values["locations"]))
+        if endpoint == "sightings":
+            params.update(sort=rng.choice(values["sort"]), order=rng.choice(["asc", "desc"]))
+        distinct.append(f"/api/{endpoint}?{urlencode(params, doseq=True)}")
+    return rng.choices(distinct, weights=[1 / rank for rank in range(1, len(distinct) + 1)], k=count)
+
+
+def run_load(host: str, port: int, paths: List[str], concurrency: int) -> Dict[str, object]:
+    """
+    Send every path from `concurrency` client threads, each on one kept-alive
+    connection and revalidating paths it fetched before with If-None-Match.
+    """
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+
+    def client(chunk: List[str]) -> List[Tuple[int, float]]:
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        etags: Dict[str, str] = {}
+        results = []
+        for path in chunk:
+            headers = {"If-None-Match": etags[path]} if path in etags else {}
+            start = time.perf_counter()
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            results.append((response.status, time.perf_counter() - start))
+            if response.getheader("ETag"):
+                etags[path] = response.getheader("ETag")
+        connection.close()
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [result for chunk in pool.map(client, chunks) for result in chunk]
+    seconds = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    statuses: Dict[int, int] = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "requests": len(results),
+        "seconds": seconds,
+        "requests_per_s": len(results) / seconds,
+        "median_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "statuses": statuses,
+    }
+
+
+def bench(args) -> None:
+    server = None
+    if args.url is None:
+        # Serve from this process on a free port
+        server = make_server("127.0.0.1", 0, quiet=True)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, name="api-bench", daemon=True).start()
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+
+    paths = request_mix(host, port, args.requests, args.seed)
+    print(f"Sending {len(paths)} requests ({len(set(paths))} distinct) from {args.concurrency} clients to "
+          f"{host}:{port}", file=sys.stderr)
+    result = run_load(host, port, paths, args.concurrency)
+
+    print(f"{result['requests']} requests in {result['seconds']:.2f}s: {result['requests_per_s']:.0f} requests/s")
+    print(f"Latency {result['median_ms']:.2f} ms median, {result['p95_ms']:.2f} ms p95, "
+          f"{result['p99_ms']:.2f} ms p99")
+    print("Responses: " + ", ".join(f"{count} x {status}" for status, count in sorted(result["statuses"].items())))
+    if server is not None:
+        hits, misses, entries, nbytes = response_cache.stats()
+        print(f"Response cache: {hits} hits, {misses} misses, {entries} entries, {nbytes / 1e6:.1f} MB")
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve sightings and aggregates as JSON, or load test the API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the API server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=API_PORT)
+
+    load = commands.add_parser("bench", help="Send a generated workload and report throughput and latency")
+    load.add_argument("--url", help="API to load, e.g. http://127.0.0.1:8502 (default: serve one in-process)")
+    load.add_argument("--requests", type=int, default=2000)
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--seed", type=int, default=0, help="Seed of the generated workload")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args)
+        return
+
+    server = make_server(args.host, args.port)
+    # Load before accepting requests, so the first client doesn't wait for the parse
+    dashboard.get_shared_sightings()
+    print(f"Serving {', '.join(sorted(ENDPOINTS))} on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Time and measure the memory of the load, filter and chart paths on synthetic
+workbooks at several multiples of the real survey's size.
+
+Results are saved under .benchmarks/ named by commit, so a run can be
+compared with an earlier one:
+
+    python benchmark.py --scales 1x 10x
+    python benchmark.py --compare 1a2b3c4
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import dashboard
+import snapshot
+from generate_workbook import generate_workbook
+from ingest import SURVEY_SHEET_PATTERN, is_survey_column
+from survey_dates import clear_parse_cache, parse_survey_dates
+from trends import Trends
+
+RESULTS_DIR = Path(".benchmarks")
+
+# Synthetic survey sizes; "1x" is about the size of the real survey
+SCALES = {
+    "1x": dict(years=2, columns=13),
+    "10x": dict(years=10, columns=26),
+    "100x": dict(years=40, columns=65),
+}
+
+# Modules the login page must not import; they load in the background instead
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "openpyxl", "plotly.express", "dashboard"]
+
+# Overview filter combinations run for filter_sightings and create_species_chart
+FILTER_CASES = [
+    (None, None, None),
+    (["Red"], None, None),
+    (["Red", "Amber"], [2024], ["Northern"]),
+    (None, [2023, 2024], ["Eastern", "Southern"]),
+]
+
+# Sightings appended to a loaded table, as when a survey column is entered in the dashboard
+JOURNAL_APPEND_ROWS = 20
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence stdout at the file descriptor level, including parser warnings from worker processes."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            with contextlib.redirect_stdout(devnull):
+                yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved, 1)
+            os.close(saved)
+
+
+def measure(run: Callable[[object], None], setup: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """
+    Time `run(setup())` `repeat` times, then run it once more under tracemalloc.
+
+    Setup is excluded from both. Peak memory covers Python and NumPy
+    allocations in this process only, not worker processes.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"min_s": min(times), "median_s": statistics.median(times), "peak_bytes": peak}
+
+
+def header_rows(workbook_path: Path) -> List[Tuple[int, pd.Series]]:
+    """The year and survey dates of each sheet in a workbook, as ingest passes them to parse_survey_dates."""
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        rows = []
+        for sheet in workbook:
+            match = SURVEY_SHEET_PATTERN.search(sheet.title)
+            if not match:
+                continue
+            for row in sheet.iter_rows(min_row=3, max_row=3, values_only=True):
+                dates = pd.Series(row[3:], index=range(3, len(row)), dtype=object)
+                rows.append((int(match["year"]), dates[is_survey_column(dates)]))
+        return rows
+    finally:
+        workbook.close()
+
+
+def benchmark_scale(workbook_path: Path, snapshot_dir: Path, repeat: int) -> Dict[str, object]:
+    """Run every benchmark against one workbook."""
+    results = {}
+
+    def cold_snapshots():
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    def load(_):
+        with quiet():
+            dashboard.load_bird_sightings([workbook_path])
+
+    results["load_bird_sightings (cold)"] = measure(load, cold_snapshots, repeat)
+    results["load_bird_sightings (sheet snapshots)"] = measure(load, lambda: None, repeat)
+
+    rows = header_rows(workbook_path)
+
+    def parse_dates(_):
+        for year, row in rows:
+            parse_survey_dates(row, year)
+
+    # Each distinct date is parsed once per process; forget them so every run parses
+    results["parse_survey_dates"] = measure(parse_dates, clear_parse_cache, repeat)
+
+    with quiet():
+        sightings = dashboard.load_bird_sightings([workbook_path])
+    species = sightings.count_cube.species_names()
+
+    def fresh_table():
+        # A copy without the indexes and cubes the previous run built
+        return sightings[np.arange(len(sightings))]
+
+    def filter_all(table):
+        for filters in FILTER_CASES:
+            dashboard.filter_sightings(table, *filters)
+
+    def chart_all(table):
+        for filters in FILTER_CASES:
+            dashboard.create_species_chart(table, *filters)
+
+    def timeline_all(table):
+        for selection in (species[:1], species[:5], species[::4]):
+            dashboard.create_monthly_timeline(table, selection)
+
+    def trends_all(table):
+        trends = Trends.from_table(table)
+        trends.yearly()
+        trends.monthly(species)
+
+    results["filter_sightings"] = measure(filter_all, fresh_table, repeat)
+    results["create_species_chart"] = measure(chart_all, fresh_table, repeat)
+    results["create_monthly_timeline"] = measure(timeline_all, fresh_table, repeat)
+    results["trends (every species)"] = measure(trends_all, fresh_table, repeat)
+
+    # Sightings entered in the dashboard are appended to a table whose index and cube are built
+    entered = sightings[np.arange(min(JOURNAL_APPEND_ROWS, len(sightings)))]
+
+    def indexed_table():
+        table = fresh_table()
+        table.filter_index, table.count_cube
+        return table
+
+    def append_entered(table):
+        appended = table.append(entered)
+        appended.filter_index, appended.count_cube
+
+    results[f"append {len(entered)} journal sightings"] = measure(append_entered, indexed_table, repeat)
+
+    return {"sightings": len(sightings), "results": results}
+
+
+def measure_import(module: str, repeat: int) -> Dict[str, object]:
+    """
+    Time importing a module in fresh interpreters, and note which of
+    HEAVY_MODULES the import pulled in.
+    """
+    code = ("import json, sys, time; start = time.perf_counter(); import " + module + "; "
+            "print(json.dumps([time.perf_counter() - start, [m for m in " + repr(HEAVY_MODULES) +
+            " if m in sys.modules]]))")
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        seconds, heavy = json.loads(output.strip().splitlines()[-1])
+        times.append(seconds)
+    return {"min_s": min(times), "median_s": statistics.median(times), "heavy_modules": heavy}
+
+
+def git_commit() -> str:
+    """Short hash of HEAD, suffixed with -dirty when tracked files have changed."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def resolve_commit(ref: str) -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", ref], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ref
+
+
+def print_report(run: Dict[str, object], baseline: Optional[Dict[str, object]] = None) -> None:
+    print(f"Commit {run['commit']}, Python {run['python']}")
+    if "import" in run:
+        result = run["import"]
+        line = f"\nimport app {result['median_s'] * 1000:10.2f} ms median {result['min_s'] * 1000:10.2f} ms min"
+        if "import" in (baseline or {}):
+            line += f"   x{result['median_s'] / baseline['import']['median_s']:.2f} vs {baseline['commit']}"
+        print(line)
+        if result["heavy_modules"]:
+            print(f"  Warning: importing app loaded {', '.join(result['heavy_modules'])}")
+    for scale, scale_run in run["scales"].items():
+        print(f"\n{scale}: {scale_run['sightings']} sightings")
+        base_results = (baseline or {}).get("scales", {}).get(scale, {}).get("results", {})
+        for name, result in scale_run["results"].items():
+            line = (f"  {name:<40} {result['median_s'] * 1000:10.2f} ms median "
+                    f"{result['min_s'] * 1000:10.2f} ms min {result['peak_bytes'] / 1e6:8.1f} MB peak")
+            if name in base_results:
+                line += f"   x{result['median_s'] / base_results[name]['median_s']:.2f} vs {baseline['commit']}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading, filtering and charts on synthetic data.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", metavar="COMMIT", help="Compare with the saved results of a commit")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        baseline_path = RESULTS_DIR / f"{resolve_commit(args.compare)}.json"
+        if not baseline_path.exists():
+            parser.error(f"No saved results at {baseline_path}")
+        baseline = json.loads(baseline_path.read_text())
+
+    run = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "scales": {},
+    }
+
+    print("Timing import app...", file=sys.stderr)
+    run["import"] = measure_import("app", args.repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the benchmark's sheet snapshots away from the dashboard's
+        snapshot_dir = Path(tmp) / "snapshots"
+        snapshot.SNAPSHOT_DIR = snapshot_dir
+        for scale in args.scales:
+            workbook_path = Path(tmp) / f"sightings_{scale}.xlsx"
+            size = SCALES[scale]
+            generate_workbook(workbook_path, range(2025 - size["years"] + 1, 2026), size["columns"],
+                              dashboard.SPECIES_LIST)
+            print(f"Benchmarking {scale}...", file=sys.stderr)
+            run["scales"][scale] = benchmark_scale(workbook_path, snapshot_dir, args.repeat)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    results_path = RESULTS_DIR / f"{run['commit']}.json"
+    results_path.write_text(json.dumps(run, indent=2))
+
+    print_report(run, baseline)
+    print(f"\nSaved {results_path}")
+
+
+if __name__ == "__main__":
+    main()
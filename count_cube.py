@@ -0,0 +1,218 @@
+import copy
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from filter_index import normalise_filters
+from species_registry import UNKNOWN_SPECIES_ID
+
+
+class CountCube:
+    """
+    Dense species x year-month x field section roll-up of a SightingTable.
+
+    Three cubes are kept: the total count, the number of sightings and the
+    position of the first sighting in each cell. The position lets roll-ups
+    list species and months in the order they were first seen, as charts
+    built from the raw sightings did. Every roll-up slices and sums the cubes,
+    so its cost doesn't depend on the number of sightings.
+
+    Sightings flagged in `excluded` are left out of the cubes, though the
+    month and field section axes still span the whole table.
+    """
+
+    def __init__(self, sightings, excluded: Optional[np.ndarray] = None):
+        self.registry = sightings.registry
+        self.locations = list(sightings.locations)
+        self.first_month = int(sightings.month.min()) if len(sightings) else 0
+        n_months = int(sightings.month.max()) - self.first_month + 1 if len(sightings) else 0
+
+        shape = (len(self.registry), n_months, len(self.locations))
+        cell = np.ravel_multi_index(
+            (sightings.species_id, sightings.month - self.first_month, sightings.location_code), shape
+        ) if len(sightings) else np.empty(0, dtype=np.intp)
+        size = int(np.prod(shape))
+        kept = np.arange(len(sightings)) if excluded is None else np.flatnonzero(~excluded)
+        cell = cell[kept]
+
+        self.totals = np.bincount(cell, weights=sightings.count[kept], minlength=size).astype(np.int64).reshape(shape)
+        self.rows = np.bincount(cell, minlength=size).astype(np.int32).reshape(shape)
+        # Positions are ascending, so the first index of each cell is its first sighting
+        self.first = np.full(size, len(sightings), dtype=np.int64)
+        occupied, first_row = np.unique(cell, return_index=True)
+        self.first[occupied] = kept[first_row]
+        self.first = self.first.reshape(shape)
+
+        # Calendar year of each month along the month axis
+        self.month_years = (self.first_month + np.arange(n_months)) // 12 + 1970
+
+    def extended(self, sightings, start: int) -> "CountCube":
+        """
+        Cube of a table made by appending rows to this cube's table, from
+        `start` on, with nothing excluded. The cubes are copied, grown to
+        any new months and field sections, and only the new rows counted.
+        """
+        new = np.arange(start, len(sightings))
+        months = sightings.month[new]
+        bounds = [self.first_month, self.first_month + len(self.month_years) - 1] if len(self.month_years) else []
+        if len(new):
+            bounds += [int(months.min()), int(months.max())]
+        first_month, last_month = (min(bounds), max(bounds)) if bounds else (0, -1)
+
+        cube = copy.copy(self)
+        cube.locations = list(sightings.locations)
+        cube.first_month = first_month
+        n_months = last_month - first_month + 1
+        shape = (len(self.registry), n_months, len(cube.locations))
+        offset = self.first_month - first_month
+
+        def grow(old: np.ndarray, fill: int) -> np.ndarray:
+            grown = np.full(shape, fill, dtype=old.dtype)
+            grown[:, offset:offset + old.shape[1], :old.shape[2]] = old
+            return grown
+
+        cell = np.ravel_multi_index((sightings.species_id[new], months - first_month,
+                                     sightings.location_code[new]), shape)
+        size = int(np.prod(shape))
+        cube.totals = grow(self.totals, 0) + np.bincount(
+            cell, weights=sightings.count[new], minlength=size).astype(np.int64).reshape(shape)
+        cube.rows = grow(self.rows, 0) + np.bincount(cell, minlength=size).astype(np.int32).reshape(shape)
+        # Empty cells hold the table's length as their first position
+        first = self.first.copy()
+        first[first == start] = len(sightings)
+        cube.first = grow(first, len(sightings)).reshape(-1)
+        occupied, first_row = np.unique(cell, return_index=True)
+        cube.first[occupied] = np.minimum(cube.first[occupied], new[first_row])
+        cube.first = cube.first.reshape(shape)
+        cube.month_years = (first_month + np.arange(n_months)) // 12 + 1970
+        return cube
+
+    def _slice(self, conservation_statuses=None, years=None, locations=None):
+        """Species and months kept, plus the cubes restricted to the filtered species, months and locations."""
+        statuses, years, locations = normalise_filters(
+            frozenset(self.registry.categories), conservation_statuses, years, locations,
+            self.month_years.tolist(), self.locations
+        )
+        species_mask = np.ones(len(self.registry), dtype=bool)
+        if statuses is not None:
+            codes = [i for i, category in enumerate(self.registry.categories) if category in statuses]
+            species_mask = np.isin(self.registry.category_codes, codes)
+        month_mask = np.ones(len(self.month_years), dtype=bool)
+        if years is not None:
+            month_mask = np.isin(self.month_years, list(years))
+        location_mask = np.ones(len(self.locations), dtype=bool)
+        if locations is not None:
+            location_mask = np.isin(self.locations, list(locations))
+
+        def restrict(cube: np.ndarray) -> np.ndarray:
+            return cube.compress(species_mask, 0).compress(month_mask, 1).compress(location_mask, 2)
+
+        return (np.flatnonzero(species_mask), np.flatnonzero(month_mask),
+                restrict(self.totals), restrict(self.rows), restrict(self.first))
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the cubes."""
+        return self.totals.nbytes + self.rows.nbytes + self.first.nbytes
+
+    def years(self) -> List[int]:
+        """Calendar years with at least one sighting."""
+        seen = self.rows.sum(axis=(0, 2)) > 0
+        return sorted(set(self.month_years[seen].tolist()))
+
+    def location_names(self) -> List[str]:
+        """Field sections with at least one sighting, sorted."""
+        seen = self.rows.sum(axis=(0, 1)) > 0
+        return sorted(name for name, is_seen in zip(self.locations, seen) if is_seen)
+
+    def species_names(self) -> List[str]:
+        """Species with at least one sighting, sorted."""
+        seen = np.flatnonzero(self.rows.sum(axis=(1, 2)) > 0)
+        return sorted(self.registry.species[i].name for i in seen)
+
+    def species_totals(self, conservation_statuses=None, years=None, locations=None) -> pd.DataFrame:
+        """
+        Total count per species seen under the filters, largest first.
+
+        Returns:
+            DataFrame with `species_id`, `Species`, `Conservation Status` and
+            `Count`, ties in order of first sighting
+        """
+        species_ids, _, totals, rows, first = self._slice(conservation_statuses, years, locations)
+        seen = rows.sum(axis=(1, 2)) > 0
+        species_ids = species_ids[seen]
+        counts = totals.sum(axis=(1, 2))[seen]
+        first_seen = first.min(axis=(1, 2), initial=np.iinfo(np.int64).max)[seen]
+
+        order = np.argsort(first_seen, kind="stable")
+        order = order[np.argsort(-counts[order], kind="stable")]
+        return pd.DataFrame({
+            "species_id": species_ids[order],
+            "Species": [self.registry.species[i].name for i in species_ids[order]],
+            "Conservation Status": [self.registry.species[i].category for i in species_ids[order]],
+            "Count": counts[order],
+        })
+
+    def species_observed(self, conservation_statuses=None, years=None, locations=None) -> int:
+        """Number of distinct species seen under the filters."""
+        _, _, _, rows, _ = self._slice(conservation_statuses, years, locations)
+        return int((rows.sum(axis=(1, 2)) > 0).sum())
+
+    def monthly_summary(self, conservation_statuses=None, years=None, locations=None) -> pd.DataFrame:
+        """
+        Total count and number of species seen per month under the filters.
+
+        Returns:
+            DataFrame with `Month` ("YYYY-MM"), `Count` and `Species` for each
+            month with a sighting, in calendar order
+        """
+        _, month_ids, totals, rows, _ = self._slice(conservation_statuses, years, locations)
+        seen = rows.sum(axis=2) > 0
+        has_sightings = seen.any(axis=0)
+        months = (month_ids + self.first_month).astype("datetime64[M]").astype(str)
+        return pd.DataFrame({
+            "Month": months[has_sightings],
+            "Count": totals.sum(axis=(0, 2))[has_sightings],
+            "Species": seen.sum(axis=0)[has_sightings],
+        })
+
+    def monthly_totals(self, species_names: List[str]) -> pd.DataFrame:
+        """
+        Total count per species and month for the given species.
+
+        Returns:
+            DataFrame with `Species`, `Month` ("YYYY-MM") and `Count` for each
+            month a species was seen, species in order of first sighting and
+            months in order of first sighting within each species
+        """
+        species_ids = {self.registry.id_of(name) for name in species_names} - {UNKNOWN_SPECIES_ID}
+        species_ids = np.array(sorted(species_ids), dtype=np.intp)
+        totals = self.totals[species_ids].sum(axis=2)
+        rows = self.rows[species_ids].sum(axis=2)
+        first = self.first[species_ids].min(axis=2, initial=np.iinfo(np.int64).max)
+
+        seen_species, seen_months = np.nonzero(rows)
+        species_first = first.min(axis=1, initial=np.iinfo(np.int64).max)
+        order = np.lexsort((first[seen_species, seen_months], species_first[seen_species]))
+        seen_species, seen_months = seen_species[order], seen_months[order]
+
+        months = (np.arange(len(self.month_years)) + self.first_month).astype("datetime64[M]").astype(str)
+        return pd.DataFrame({
+            "Species": [self.registry.species[i].name for i in species_ids[seen_species]],
+            "Month": months[seen_months],
+            "Count": totals[seen_species, seen_months],
+        })
+
+    def species_summary(self, species_names: List[str]) -> pd.DataFrame:
+        """Conservation status and total count for each given species that was seen."""
+        summary = []
+        for species_name in species_names:
+            species_id = self.registry.id_of(species_name)
+            if species_id != UNKNOWN_SPECIES_ID and self.rows[species_id].any():
+                summary.append({
+                    "Species": species_name,
+                    "Conservation Status": self.registry.species[species_id].category,
+                    "Total Sightings": int(self.totals[species_id].sum())
+                })
+        return pd.DataFrame(summary)
@@ -0,0 +1,1147 @@
+import functools
+import json
+import os
+import threading
+import streamlit as st
+from pathlib import Path
+import pandas as pd
+import numpy as np
+from datetime import datetime, date
+from typing import Dict, List, Optional, Set, Tuple
+import plotly.express as px
+import plotly.graph_objects as go
+
+import instrumentation
+import snapshot
+from count_cube import CountCube
+from export import EXPORT_FORMATS, export_frame
+from figure_cache import figure_cache
+from filter_index import normalise_filters
+from ingest import FIELD_SECTIONS, INGEST_VERSION, SURVEY_SHEET_PATTERN, discover_sheets, find_workbooks, load_sheets
+from instrumentation import stage
+from journal import COMPACT_INTERVAL, COMPACT_MIN_RECORDS, JournalEntry, SightingJournal, start_compactor
+from models import Species
+from shared_dataset import shared_dataset
+from sighting_table import SORT_COLUMNS, SightingTable
+from species_registry import SpeciesRegistry
+from sqlite_store import SightingStore
+from trends import ROLLING_MONTHS, Trends
+from validation import (RULES, ExclusionMask, ExclusionOverlay, OverlayState, describe_issues, exclusion_mask,
+                        issue_counts, sighting_keys, validate_appended)
+from workbook_watcher import WATCH_INTERVAL, start_watcher
+
+
+# Survey workbooks, relative to the working directory the app is started from.
+# Every sheet whose name matches ingest.SURVEY_SHEET_PATTERN is loaded.
+WORKBOOK_DIR = Path(".")
+WORKBOOK_PATTERN = "sightings_*.xlsx"
+
+# Where sightings are queried from: "memory" keeps them in a SightingTable,
+# "sqlite" loads them into a local SQLite database and queries that instead
+STORAGE_ENGINE = os.environ.get("HEAL_STORAGE_ENGINE", "memory")
+# Each dataset version gets its own database file, so a reload never changes
+# one that sessions are still reading; the newest SQLITE_KEEP_VERSIONS are kept
+SQLITE_DIR = snapshot.SNAPSHOT_DIR / "sqlite"
+SQLITE_KEEP_VERSIONS = 3
+
+# Sightings flagged by hand and which validation rules exclude sightings;
+# kept apart from the workbooks so flagging never forces a re-ingest
+EXCLUSIONS_PATH = WORKBOOK_DIR / "sighting_flags.json"
+
+# Sightings entered in the dashboard, appended to a journal beside the workbooks;
+# a background compactor folds it into sightings_journal.arrow every
+# journal.COMPACT_INTERVAL seconds once it holds journal.COMPACT_MIN_RECORDS sightings
+JOURNAL_PATH = WORKBOOK_DIR / "sightings_journal.jsonl"
+
+# Static reports written by reports.py; their species charts warm the figure
+# cache when they match the loaded dataset
+REPORTS_DIR = Path(os.environ.get("HEAL_REPORTS_DIR", "reports"))
+REPORT_MANIFEST = "manifest.json"
+
+# Page sizes offered in the Raw Data tab
+RAW_PAGE_SIZES = [50, 100, 250, 500]
+
+# Rolling average windows, in months, offered in the Trends tab
+TREND_WINDOWS = [1, 2, 3, 6, 12]
+
+# Number of recent runs listed in the diagnostics sidebar
+DIAGNOSTICS_HISTORY = 20
+
+# Your cleaned species list (make sure this matches what's in your Excel file)
+SPECIES_LIST: List[Species] = [
+    Species("Barn Owl", "Green"),
+    Species("Black-headed Gull", "Amber"),
+    Species("Blackbird", "Green"),
+    Species("Blackcap", "Green"),
+    Species("Blue Tit", "Green"),
+    Species("Bullfinch", "Amber"),
+    Species("Mallard", "Amber"),
+    Species("Domestic Mallard", "Green"),
+    Species("Buzzard", "Green"),
+    Species("Canada Goose", "Green"),
+    Species("Carrion Crow", "Green"),
+    Species("Cattle Egret", "Amber"),
+    Species("Chaffinch", "Green"),
+    Species("Chiffchaff", "Green"),
+    Species("Coal Tit", "Green"),
+    Species("Collared Dove", "Green"),
+    Species("Common Crossbill", "Green"),
+    Species("Common Gull", "Amber"),
+    Species("Coot", "Green"),
+    Species("Cormorant", "Green"),
+    Species("Cuckoo", "Red"),
+    Species("Curlew", "Red"),
+    Species("Dunnock", "Amber"),
+    Species("Feral Pigeon", "Green"),
+    Species("Fieldfare", "Red"),
+    Species("Goldcrest", "Green"),
+    Species("Goldfinch", "Green"),
+    Species("Goshawk", "Green"),
+    Species("Great Black-backed Gull", "Amber"),
+    Species("Great Spotted Woodpecker", "Green"),
+    Species("Great Tit", "Amber"),
+    Species("Great White Egret", "Green"),
+    Species("Green Sandpiper", "Green"),
+    Species("Green Woodpecker", "Green"),
+    Species("Greenfinch", "Red"),
+    Species("Grey Heron", "Green"),
+    Species("Grey Partridge", "Red"),
+    Species("Grey Wagtail", "Amber"),
+    Species("Greylag Goose", "Green"),
+    Species("Hawfinch", "Red"),
+    Species("Herring Gull", "Red"),
+    Species("Hobby", "Green"),
+    Species("House Martin", "Red"),
+    Species("House Sparrow", "Red"),
+    Species("Jack Snipe", "Green"),
+    Species("Jackdaw", "Green"),
+    Species("Jay", "Green"),
+    Species("Kestrel", "Amber"),
+    Species("Kingfisher", "Green"),
+    Species("Lapwing", "Red"),
+    Species("Lesser Black-backed Gull", "Amber"),
+    Species("Lesser Redpoll", "Red"),
+    Species("Lesser Whitethroat", "Green"),
+    Species("Linnet", "Red"),
+    Species("Little Egret", "Green"),
+    Species("Little Owl", "Green"),
+    Species("Long-tailed Tit", "Green"),
+    Species("Magpie", "Green"),
+    Species("Mallard duck", "Green"),
+    Species("Mandarin duck", "Green"),
+    Species("Marsh Tit", "Red"),
+    Species("Meadow Pipit", "Amber"),
+    Species("Mistle Thrush", "Red"),
+    Species("Moorhen", "Amber"),
+    Species("Mute Swan", "Green"),
+    Species("Nightingale", "Red"),
+    Species("Nuthatch", "Green"),
+    Species("Partridge,red leg", "Green"),
+    Species("Pheasant", "Green"),
+    Species("Pied/White Wagtail", "Green"),
+    Species("Quail", "Amber"),
+    Species("Raven", "Green"),
+    Species("Red Kite", "Green"),
+    Species("Redstart", "Amber"),
+    Species("Redwing", "Red"),
+    Species("Reed Bunting", "Amber"),
+    Species("Reed Warbler", "Green"),
+    Species("Robin", "Green"),
+    Species("Rook", "Amber"),
+    Species("Sedge Warbler", "Amber"),
+    Species("Short-eared Owl", "Amber"),
+    Species("Siskin", "Green"),
+    Species("Skylark", "Red"),
+    Species("Snipe", "Amber"),
+    Species("Song Thrush", "Red"),
+    Species("Sparrowhawk", "Green"),
+    Species("Spotted Flycatcher", "Red"),
+    Species("Starling", "Red"),
+    Species("Stock Dove", "Amber"),
+    Species("Stonechat", "Green"),
+    Species("Swallow", "Green"),
+    Species("Swift", "Red"),
+    Species("Tawny Owl", "Amber"),
+    Species("Tree Pipit", "Red"),
+    Species("Treecreeper", "Green"),
+    Species("Turtle Dove", "Red"),
+    Species("Wheatear", "Amber"),
+    Species("Whinchat", "Red"),
+    Species("Whitethroat", "Amber"),
+    Species("Willow warbler", "Amber"),
+    Species("Woodpigeon", "Amber"),
+    Species("Wren", "Amber"),
+    Species("Yellowhammer", "Red"),
+]
+
+# Alternative spellings seen in survey sheets, mapped to names in SPECIES_LIST.
+# Case, hyphens and spacing are already ignored when matching.
+SPECIES_ALIASES = {
+    "Pied Wagtail": "Pied/White Wagtail",
+    "White Wagtail": "Pied/White Wagtail",
+    "Red-legged Partridge": "Partridge,red leg",
+    "Wood Pigeon": "Woodpigeon",
+    "Crossbill": "Common Crossbill",
+}
+
+SPECIES_REGISTRY = SpeciesRegistry(SPECIES_LIST, SPECIES_ALIASES)
+
+# Shared by every session in the process
+exclusion_overlay = ExclusionOverlay(EXCLUSIONS_PATH)
+journal = SightingJournal(JOURNAL_PATH, SPECIES_REGISTRY)
+
+
+def load_bird_sightings(workbook_paths: Optional[List[Path]] = None) -> SightingTable:
+    """
+    Load bird sightings from every survey sheet in the survey workbooks
+
+    Args:
+        workbook_paths: Workbooks to read; defaults to those matching WORKBOOK_PATTERN in WORKBOOK_DIR
+
+    Returns:
+        SightingTable of all sightings
+    """
+    if workbook_paths is None:
+        workbook_paths = find_workbooks(WORKBOOK_DIR, WORKBOOK_PATTERN)
+
+    try:
+        sheets = discover_sheets(workbook_paths, SPECIES_REGISTRY)
+        if not sheets:
+            print(f"Warning: No sheets matching '{SURVEY_SHEET_PATTERN.pattern}' found")
+        return load_sheets(SPECIES_REGISTRY, sheets)
+
+    except Exception as e:
+        print(f"Error processing Excel file: {e}")
+        return SightingTable.empty(SPECIES_REGISTRY)
+
+
+def get_bird_sightings() -> SightingTable:
+    """
+    Load sightings from the dataset snapshot, re-parsing workbooks only
+    when they have changed since the snapshot was written.
+    """
+    workbook_paths = find_workbooks(WORKBOOK_DIR, WORKBOOK_PATTERN)
+    snapshot_key = {"registry": SPECIES_REGISTRY.version, "ingest": INGEST_VERSION}
+
+    with stage("snapshot_read") as reading:
+        table = snapshot.load_snapshot(workbook_paths, snapshot_key)
+        if table is not None:
+            sightings = SightingTable.from_arrow(SPECIES_REGISTRY, table)
+            reading.rows = len(sightings)
+            return sightings
+
+    # Fingerprint before parsing so an edit made mid-parse is picked up next time
+    fingerprints = {path: snapshot.workbook_fingerprint(path) for path in workbook_paths}
+    sightings = load_bird_sightings(workbook_paths)
+    if len(sightings):
+        snapshot.write_snapshot(workbook_paths, sightings.to_arrow(), snapshot_key, fingerprints)
+
+    return sightings
+
+
+def append_journal_sightings(sightings: SightingTable, after_seq: int, until_seq: int) -> SightingTable:
+    """
+    Sightings with those entered in the journal after `after_seq`, up to
+    `until_seq`, appended. Only the new sightings are read and validated
+    (against all the others); the indexes and cubes already built are
+    extended rather than rebuilt.
+    """
+    entered = journal.read(after_seq, until_seq)
+    if not len(entered):
+        return sightings
+    start = len(sightings)
+    combined = sightings.append(entered)
+    combined.issues[start:] = validate_appended(combined, start, FIELD_SECTIONS)
+    return combined
+
+
+def sqlite_path(version: str) -> Path:
+    """Database file of one dataset version in the SQLite engine."""
+    return SQLITE_DIR / f"sightings-{version}.sqlite"
+
+
+def sqlite_stores() -> List[SightingStore]:
+    """Every complete SQLite store file, newest first."""
+    stamped = []
+    for path in SQLITE_DIR.glob("sightings-*.sqlite"):
+        try:
+            stamped.append((path.stat().st_mtime_ns, path))
+        except FileNotFoundError:
+            continue  # Pruned by another process since the glob
+    return [SightingStore(path, SPECIES_REGISTRY) for _, path in sorted(stamped, reverse=True)]
+
+
+def get_sighting_store(journal_seq: int) -> SightingStore:
+    """
+    Open the SQLite store of the current workbooks and journal, building it
+    if it doesn't exist yet, with the current exclusions already marked.
+
+    When a store of the same workbooks holds fewer journal sightings, the
+    new version is a copy of it with the rest inserted; otherwise it is
+    loaded from the workbooks. Either way it is built in a new file, so
+    stores of older versions are never changed under the sessions reading
+    them.
+    """
+    workbooks = workbook_version()
+    version = f"{workbooks}.{journal_seq}"
+    store = SightingStore(sqlite_path(version), SPECIES_REGISTRY)
+    if store.version == version:
+        return store
+
+    stores = sqlite_stores()
+    base = max((s for s in stores if s.version is not None and split_version(s.version)[0] == workbooks
+                and split_version(s.version)[1] < journal_seq),
+               key=lambda s: split_version(s.version)[1], default=None)
+    sightings = append_journal_sightings(get_bird_sightings(), 0, journal_seq)
+    state = exclusion_overlay.state()
+    if base is not None:
+        base.extended(store.path, sightings, len(base), version, state)
+    else:
+        store.replace(sightings, version, state)
+
+    # Older versions stay until newer ones push them out, for sessions still reading them
+    for old in [s for s in stores if s.path != store.path][SQLITE_KEEP_VERSIONS - 1:]:
+        old.path.unlink(missing_ok=True)
+    return store
+
+
+def get_sightings(journal_seq: int):
+    """Sightings from the configured storage engine, including the journal up to `journal_seq`."""
+    if STORAGE_ENGINE == "sqlite":
+        return get_sighting_store(journal_seq)
+    return append_journal_sightings(get_bird_sightings(), 0, journal_seq)
+
+
+def workbook_version() -> str:
+    """Version of the workbooks' contents, whichever storage engine serves them."""
+    workbook_paths = find_workbooks(WORKBOOK_DIR, WORKBOOK_PATTERN)
+    return snapshot.dataset_version(workbook_paths, {"registry": SPECIES_REGISTRY.version, "ingest": INGEST_VERSION})
+
+
+def current_dataset_version() -> str:
+    """
+    Version of the dataset the workbooks and journal would load now, from
+    their stats: a version of the workbooks, a dot, and the sequence number
+    of the last sighting entered in the journal.
+    """
+    workbook_paths = find_workbooks(WORKBOOK_DIR, WORKBOOK_PATTERN)
+    version = snapshot.dataset_version(workbook_paths, {"registry": SPECIES_REGISTRY.version, "ingest": INGEST_VERSION,
+                                                        "engine": STORAGE_ENGINE})
+    return f"{version}.{journal.last_seq()}"
+
+
+def split_version(version: Optional[str]) -> Tuple[Optional[str], int]:
+    """The workbooks' part of a dataset version and its journal sequence number."""
+    if not version or "." not in version:
+        return version, 0
+    workbooks, journal_seq = version.rsplit(".", 1)
+    return workbooks, int(journal_seq)
+
+
+def load_shared_sightings(version: str):
+    """
+    Load sightings for sharing, with the filter index already built and, in
+    SQLite, the current exclusions applied. The count cube depends on the
+    exclusions, so it is built on first use.
+    """
+    sightings = get_sightings(split_version(version)[1])
+    if isinstance(sightings, SightingTable):
+        sightings.filter_index
+    elif isinstance(sightings, SightingStore):
+        sightings.apply_exclusions(exclusion_overlay.state())
+    return sightings
+
+
+def update_shared_sightings(held_version: Optional[str], sightings, derived: Dict[str, Tuple], version: str):
+    """
+    The shared sightings moved on to a version that only adds journal
+    sightings, with the derived values that can be extended carried over.
+    Anything else is loaded afresh.
+    """
+    held_workbooks, held_seq = split_version(held_version)
+    workbooks, journal_seq = split_version(version)
+    if not isinstance(sightings, SightingTable) or held_workbooks != workbooks or held_seq > journal_seq:
+        return load_shared_sightings(version), {}
+
+    updated = append_journal_sightings(sightings, held_seq, journal_seq)
+    carried = {}
+    if "sighting_keys" in derived:
+        key, keys = derived["sighting_keys"]
+        carried["sighting_keys"] = (key, np.concatenate([keys, sighting_keys(updated, len(sightings))]))
+    return updated, carried
+
+
+# The last dataset load run by the warm-up or watcher thread rather than a rerun
+last_background_load: Optional[instrumentation.RerunRecord] = None
+
+
+def instrumented_load(name: str):
+    """
+    Decorator recording a dataset load with `instrumentation.run` when it
+    runs on a background thread, keeping it for the diagnostics sidebar.
+    Called during a rerun, the load is recorded as part of the rerun.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            global last_background_load
+            with instrumentation.run(name, counters=cache_counters) as load:
+                result = func(*args, **kwargs)
+            if load is not None and load.stages:
+                last_background_load = load
+            return result
+        return wrapper
+    return decorate
+
+
+@instrumented_load("reload")
+def reload_shared_sightings(version: str) -> bool:
+    """
+    Re-ingest changed workbooks in the background and swap the result in.
+
+    Only sheets whose fingerprints changed are parsed again, and when only
+    the journal has grown only its new sightings are read and appended.
+    Figures drawn from older versions are dropped; other derived values go
+    with the swap unless they could be extended.
+
+    Returns:
+        False if nothing could be loaded, in which case the current dataset is kept
+    """
+    dataset = shared_dataset("sightings")
+    held_version, held = dataset.current()
+    if isinstance(held, SightingTable) and split_version(held_version)[0] == split_version(version)[0]:
+        dataset.update(version, lambda held_version, sightings, derived:
+                       update_shared_sightings(held_version, sightings, derived, version))
+    else:
+        sightings = load_shared_sightings(version)
+        if not sightings:
+            print(f"Warning: Changed workbooks gave no sightings; keeping dataset version {dataset.version}")
+            return False
+        dataset.refresh(version, lambda: sightings)
+    figure_cache.prune(lambda key: key[1] == version)
+    warm_figure_cache(version)
+    return True
+
+
+def get_shared_sightings():
+    """
+    Sightings shared read-only by every session in this process.
+
+    The first visitor loads them, together with the indexes the dashboard
+    queries; after that a background watcher re-ingests changed workbooks
+    and swaps the new version in, so reruns never wait for a parse.
+
+    Returns:
+        Tuple of the dataset version and the sightings
+    """
+    dataset = shared_dataset("sightings")
+    if WATCH_INTERVAL > 0:
+        start_watcher("sightings", current_dataset_version, reload_shared_sightings,
+                      lambda: dataset.version, WATCH_INTERVAL)
+        version, sightings = dataset.current()
+        if sightings is not None:
+            return version, sightings
+
+    version = current_dataset_version()
+    sightings = dataset.get(version, lambda: load_shared_sightings(version))
+    warm_figure_cache(version)
+    return version, sightings
+
+
+def add_sightings(entries: List[JournalEntry]) -> None:
+    """
+    Append sightings entered in the dashboard to the journal, then to the
+    shared sightings, without waiting for the watcher or reloading.
+
+    Raises:
+        ValueError: if an entry is invalid; nothing is appended
+    """
+    journal.append(entries)
+    reload_shared_sightings(current_dataset_version())
+
+
+_warmed: Set[Tuple[str, str]] = set()
+_warmed_lock = threading.Lock()
+
+
+def warm_figure_cache(version: str) -> int:
+    """
+    Seed the figure cache with the species charts reports.py precomputed,
+    once per dataset and exclusions version. Reports built from other
+    workbooks, journal sightings or exclusions are ignored.
+
+    Returns:
+        Number of charts added
+    """
+    exclusions_version = exclusion_overlay.version
+    with _warmed_lock:
+        if (version, exclusions_version) in _warmed:
+            return 0
+        _warmed.add((version, exclusions_version))
+
+    try:
+        manifest = json.loads((REPORTS_DIR / REPORT_MANIFEST).read_text())
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read precomputed reports: {e}")
+        return 0
+    # Reports are built from the workbooks directly, so either storage engine can use them
+    if (manifest.get("workbook_version") != workbook_version() or
+            manifest.get("journal_seq") != split_version(version)[1] or
+            manifest.get("exclusions_version") != exclusions_version):
+        return 0
+
+    added = 0
+    for entry in manifest.get("reports", []):
+        try:
+            report = json.loads((REPORTS_DIR / entry["json"]).read_text())
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not read precomputed report {entry.get('json')}: {e}")
+            continue
+        # The years and locations the reports were built over are those the overview offers
+        filters = normalise_filters(frozenset(SPECIES_REGISTRY.categories), *report["filters"].values(),
+                                    manifest.get("years"), manifest.get("locations"))
+        figure_cache.put(("species_chart", version, exclusions_version, filters), json.dumps(report["species_chart"]))
+        added += 1
+
+    print(f"Warmed the figure cache with {added} precomputed species charts")
+    return added
+
+
+def get_sighting_keys(sightings: SightingTable) -> np.ndarray:
+    """Stable key of each shared sighting, built once per dataset version."""
+    return shared_dataset("sightings").derived(sightings, "sighting_keys", lambda: sighting_keys(sightings))
+
+
+def get_exclusions(sightings, state: Optional[OverlayState] = None) -> ExclusionMask:
+    """
+    The sightings the exclusion overlay leaves out of every view.
+
+    Built from the issues found at ingest and the flags, and rebuilt only
+    when the overlay changes; the workbooks are never re-read. A
+    SightingStore marks its excluded rows itself. Pass `state` to use an
+    overlay state already read, e.g. the one a response's ETag was made from.
+    """
+    if state is None:
+        state = exclusion_overlay.state()
+    if isinstance(sightings, SightingStore):
+        sightings.apply_exclusions(state)
+        return ExclusionMask(state[0])
+    keys = get_sighting_keys(sightings)
+    return shared_dataset("sightings").derived(sightings, "exclusions",
+                                               lambda: exclusion_mask(keys, sightings.issues, state), key=state[0])
+
+
+def get_aggregates(sightings, exclusions: Optional[ExclusionMask] = None):
+    """
+    Roll-ups for the charts: a SightingStore answers them in SQL, a
+    SightingTable from its count cube, rebuilt without the excluded
+    sightings whenever the exclusions change.
+    """
+    if isinstance(sightings, SightingStore):
+        return sightings
+    if exclusions is None or not exclusions.count:
+        return sightings.count_cube
+    return shared_dataset("sightings").derived(sightings, "count_cube",
+                                               lambda: CountCube(sightings, exclusions.excluded),
+                                               key=exclusions.version)
+
+
+def filter_sightings(sightings, conservation_statuses=None, years=None, locations=None,
+                     exclusions: Optional[ExclusionMask] = None) -> SightingTable:
+    """Filter sightings based on selected criteria."""
+    with stage("filter") as filtering:
+        if isinstance(sightings, SightingStore):
+            filtered = sightings.filter(conservation_statuses, years, locations)
+        else:
+            filtered = sightings[sightings.filter_index.select(conservation_statuses, years, locations,
+                                                               exclude=exclusions)]
+        filtering.rows = len(filtered)
+    return filtered
+
+
+def create_species_chart(sightings, conservation_statuses=None, years=None, locations=None,
+                         exclusions: Optional[ExclusionMask] = None):
+    """Create a bar chart of species sightings colored by conservation status."""
+    # Species counts, sorted by count (descending)
+    with stage("aggregation") as aggregating:
+        species_totals = get_aggregates(sightings, exclusions).species_totals(conservation_statuses, years,
+                                                                              locations)
+        aggregating.rows = len(species_totals)
+
+    # Prepare data for plotting
+    species_names = species_totals["Species"].tolist()
+    counts = species_totals["Count"].tolist()
+    categories = species_totals["Conservation Status"].tolist()
+
+    # Color mapping for conservation status
+    color_map = {'Green': '#2E7D32', 'Amber': '#F57C00', 'Red': '#C62828'}
+    colors = [color_map[cat] for cat in categories]
+
+    # Create plotly bar chart
+    with stage("figure_build"):
+        fig = go.Figure(data=[
+            go.Bar(
+                x=species_names,
+                y=counts,
+                marker_color=colors,
+            )
+        ])
+
+        fig.update_layout(
+            title="Species Sightings by Conservation Status",
+            xaxis_title="Species",
+            yaxis_title="Total Count",
+            xaxis={'tickangle': 45},
+            height=600,
+            showlegend=False
+        )
+
+    return fig
+
+
+def create_monthly_timeline(sightings, selected_species: List[str], exclusions: Optional[ExclusionMask] = None):
+    """Create a monthly timeline chart for selected species."""
+    if not selected_species:
+        return None
+
+    # Group by species and month
+    with stage("aggregation") as aggregating:
+        df = get_aggregates(sightings, exclusions).monthly_totals(selected_species)
+        aggregating.rows = len(df)
+
+    if df.empty:
+        return None
+
+    # Create bar chart
+    with stage("figure_build"):
+        fig = px.bar(df, x='Month', y='Count', color='Species',
+                     title=f"Monthly Sightings Timeline",
+                     labels={'Count': 'Total Birds Counted'})
+
+        fig.update_layout(height=400, xaxis={'tickangle': 45})
+
+    return fig
+
+
+def get_species_chart(sightings, version: str, conservation_statuses=None, years=None, locations=None,
+                      exclusions: Optional[ExclusionMask] = None):
+    """
+    Species chart spec, served from the figure cache when these filters
+    were drawn before. Selecting every year or location the overview offers
+    is keyed as no filter, like the "all" reports reports.py precomputes.
+    """
+    aggregates = get_aggregates(sightings, exclusions)
+    filters = normalise_filters(frozenset(SPECIES_REGISTRY.categories), conservation_statuses, years, locations,
+                                aggregates.years(), aggregates.location_names())
+    exclusions_version = exclusions.version if exclusions is not None else None
+    return figure_cache.get(("species_chart", version, exclusions_version, filters),
+                            lambda: create_species_chart(sightings, conservation_statuses, years, locations,
+                                                         exclusions))
+
+
+def get_monthly_timeline(sightings, version: str, selected_species: List[str],
+                         exclusions: Optional[ExclusionMask] = None):
+    """Monthly timeline spec, served from the figure cache when these species were drawn before."""
+    exclusions_version = exclusions.version if exclusions is not None else None
+    return figure_cache.get(("monthly_timeline", version, exclusions_version, frozenset(selected_species)),
+                            lambda: create_monthly_timeline(sightings, selected_species, exclusions))
+
+
+def get_trends(sightings, exclusions: ExclusionMask) -> Trends:
+    """Trend analytics for every species, built once per dataset and exclusions version."""
+    if isinstance(sightings, SightingStore):
+        build = lambda: Trends.from_store(sightings)
+    else:
+        build = lambda: Trends.from_table(sightings, exclusions.excluded if exclusions.count else None)
+    return shared_dataset("sightings").derived(sightings, "trends", build, key=exclusions.version)
+
+
+def create_trend_chart(trends: Trends, selected_species: List[str], window: int, per_survey: bool, locations=None):
+    """Create a line chart of rolling monthly averages for selected species."""
+    if not selected_species:
+        return None
+
+    with stage("aggregation") as aggregating:
+        df = trends.monthly(selected_species, window, locations)
+        aggregating.rows = len(df)
+
+    if df.empty:
+        return None
+
+    measure = "per survey column" if per_survey else "count"
+    with stage("figure_build"):
+        fig = px.line(df, x="Month", y="Rolling Per Survey" if per_survey else "Rolling Count", color="Species",
+                      markers=True, hover_data=["Count", "Surveys"],
+                      title=f"{window}-month Rolling Average ({measure})",
+                      labels={"Rolling Per Survey": "Birds per Survey", "Rolling Count": "Birds Counted"})
+
+        fig.update_layout(height=400)
+
+    return fig
+
+
+def get_trend_chart(trends: Trends, version: str, exclusions: ExclusionMask, selected_species: List[str],
+                    window: int, per_survey: bool, locations=None):
+    """Trend chart spec, served from the figure cache when these options were drawn before."""
+    key = ("trends", version, exclusions.version, frozenset(selected_species), window, per_survey,
+           frozenset(locations or ()))
+    return figure_cache.get(key, lambda: create_trend_chart(trends, selected_species, window, per_survey, locations))
+
+
+def count_raw_rows(sightings, conservation_statuses=None, years=None, locations=None,
+                   exclusions: Optional[ExclusionMask] = None, include_excluded: bool = False) -> int:
+    """Number of sightings matching the Raw Data filters."""
+    if isinstance(sightings, SightingStore):
+        return sightings.count(conservation_statuses, years, locations, include_excluded)
+    exclude = None if include_excluded else exclusions
+    return len(sightings.filter_index.select(conservation_statuses, years, locations, exclude=exclude))
+
+
+def get_raw_page(sightings, filters, sort_by: str, ascending: bool, offset: int, limit: int,
+                 exclusions: Optional[ExclusionMask] = None, include_excluded: bool = False) -> pd.DataFrame:
+    """
+    One sorted page of the Raw Data table, indexed by sighting key, with
+    each sighting's validation issues and whether it is excluded.
+    """
+    with stage("raw_page", rows=limit):
+        if isinstance(sightings, SightingStore):
+            return sightings.page(*filters, sort_by=sort_by, ascending=ascending, offset=offset, limit=limit,
+                                  include_excluded=include_excluded)
+
+        # The sort order is computed once per column and direction, then filtered
+        order = shared_dataset("sightings").derived(sightings, f"sort:{sort_by}:{ascending}",
+                                                    lambda: sightings.sort_order(sort_by, ascending))
+        positions = sightings.filter_index.select(*filters, exclude=None if include_excluded else exclusions)
+        if len(positions) < len(sightings):
+            selected = np.zeros(len(sightings), dtype=bool)
+            selected[positions] = True
+            order = order[selected[order]]
+
+        page = order[offset:offset + limit]
+        excluded = exclusions.excluded if exclusions is not None and exclusions.excluded is not None else None
+        df = sightings[page].to_frame()
+        df.index = get_sighting_keys(sightings)[page]
+        df["Issues"] = describe_issues(sightings.issues[page])
+        df["Excluded"] = excluded[page] if excluded is not None else False
+        df["issue_bits"] = sightings.issues[page]
+        return df
+
+
+def visible_frame(sightings, exclusions: ExclusionMask) -> pd.DataFrame:
+    """Every sighting that isn't excluded, with the Raw Data columns, for exports."""
+    if isinstance(sightings, SightingTable) and exclusions.count:
+        return sightings[~exclusions.excluded].to_frame()
+    return sightings.to_frame()
+
+
+def cache_counters() -> Dict[str, int]:
+    """Process-wide load and cache counters, for diagnostics."""
+    dataset = shared_dataset("sightings")
+    hits, misses, _, _ = figure_cache.stats()
+    counters = {"dataset_loads": dataset.load_count, "dataset_updates": dataset.update_count,
+                "figure_cache_hits": hits, "figure_cache_misses": misses}
+    sightings = dataset.value
+    if isinstance(sightings, SightingTable) and "filter_index" in sightings.__dict__:
+        counters["filter_index_hits"] = sightings.filter_index.hits
+        counters["filter_index_misses"] = sightings.filter_index.misses
+    return counters
+
+
+def instrumented(name: str):
+    """
+    Decorator recording a function's run with `instrumentation.run` and
+    keeping it for the diagnostics sidebar. Runs nested in another (a
+    fragment rendered by a full rerun) are recorded as part of it.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrumentation.run(name, counters=cache_counters) as rerun:
+                result = func(*args, **kwargs)
+            if rerun is not None:
+                history = st.session_state.setdefault("diagnostics_history", [])
+                history.append(rerun)
+                del history[:-DIAGNOSTICS_HISTORY]
+            return result
+        return wrapper
+    return decorate
+
+
+@st.fragment
+@instrumented("overview")
+def render_overview(sightings, version: str):
+    """Overview tab. Runs as a fragment, so its filters only rerun this tab."""
+    st.header("Survey Overview")
+    exclusions = get_exclusions(sightings)
+    aggregates = get_aggregates(sightings, exclusions)
+
+    # Get unique values for filters
+    all_years = aggregates.years()
+    all_locations = aggregates.location_names()
+    all_conservation_statuses = ["Green", "Amber", "Red"]
+
+    # Filters
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_conservation = st.multiselect("Conservation Status:", all_conservation_statuses,
+                                               default=all_conservation_statuses)
+    with col2:
+        selected_years = st.multiselect("Years:", all_years, default=all_years)
+    with col3:
+        selected_locations = st.multiselect("Locations:", all_locations, default=all_locations)
+
+    # Filters are applied to the aggregates rather than the sightings
+    filters = (selected_conservation, selected_years, selected_locations)
+
+    # Display species count
+    with stage("aggregation"):
+        unique_species = aggregates.species_observed(*filters)
+    st.metric("Species Observed", f"{unique_species} species")
+
+    # Species chart
+    if unique_species:
+        fig = get_species_chart(sightings, version, *filters, exclusions=exclusions)
+        with stage("plotly_render"):
+            st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.warning("No data available for the selected filters.")
+
+
+@st.fragment
+@instrumented("species_detail")
+def render_species_detail(sightings, version: str):
+    """Species Detail tab. Runs as a fragment, so picking species only reruns this tab."""
+    st.header("Species Details & Timeline")
+    exclusions = get_exclusions(sightings)
+    aggregates = get_aggregates(sightings, exclusions)
+
+    # Species selector (multi-select)
+    all_species = shared_dataset("sightings").derived(sightings, "species_names", aggregates.species_names,
+                                                      key=exclusions.version)
+    selected_species = st.multiselect("Select species:", all_species,
+                                      default=[all_species[0]] if all_species else [])
+
+    if selected_species:
+        # Create summary table for selected species
+        with stage("aggregation"):
+            summary_df = aggregates.species_summary(selected_species)
+
+        # Display summary table
+        if not summary_df.empty:
+            st.dataframe(summary_df, use_container_width=True, hide_index=True)
+
+        # Monthly timeline chart
+        timeline_fig = get_monthly_timeline(sightings, version, selected_species, exclusions)
+        if timeline_fig:
+            with stage("plotly_render"):
+                st.plotly_chart(timeline_fig, use_container_width=True)
+        else:
+            st.info("No sightings data available for the selected species.")
+
+
+@st.fragment
+@instrumented("trends")
+def render_trends(sightings, version: str):
+    """
+    Trends tab: rolling monthly averages and year-over-year changes,
+    normalised by survey effort. Runs as a fragment.
+    """
+    st.header("Trends")
+    exclusions = get_exclusions(sightings)
+    aggregates = get_aggregates(sightings, exclusions)
+    trends = get_trends(sightings, exclusions)
+
+    all_species = shared_dataset("sightings").derived(sightings, "species_names", aggregates.species_names,
+                                                      key=exclusions.version)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_species = st.multiselect("Species:", all_species, default=all_species[:1], key="trend_species")
+    with col2:
+        locations = st.multiselect("Locations:", aggregates.location_names(), key="trend_locations")
+    with col3:
+        window = st.select_slider("Rolling average (months):", TREND_WINDOWS, value=ROLLING_MONTHS,
+                                  key="trend_window")
+    per_survey = st.toggle("Per survey column", value=True, key="trend_per_survey",
+                           help="Divide counts by the number of survey columns (date, surveyors and field section) "
+                                "in each month, so busier months don't look like more birds")
+
+    if selected_species:
+        fig = get_trend_chart(trends, version, exclusions, selected_species, window, per_survey, locations)
+        if fig:
+            with stage("plotly_render"):
+                st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No sightings data available for the selected species.")
+
+    # Change in the latest year for every species, fairest per survey column
+    with stage("aggregation") as aggregating:
+        yearly = trends.yearly(locations)
+        latest = yearly[yearly["Year"] == yearly["Year"].max()].sort_values("Per Survey Change %")
+        aggregating.rows = len(latest)
+    if yearly["Year"].nunique() > 1:
+        st.subheader(f"Year over Year: {latest['Year'].max()}")
+        st.dataframe(
+            latest.drop(columns="Year"), use_container_width=True, hide_index=True,
+            column_config={
+                "Per Survey": st.column_config.NumberColumn(format="%.2f"),
+                "Change %": st.column_config.NumberColumn(format="%+.0f%%"),
+                "Per Survey Change %": st.column_config.NumberColumn(format="%+.0f%%"),
+            }
+        )
+        st.caption("Years are compared per survey column as well as by total count, since a year that was only "
+                   "partly surveyed has a lower total.")
+
+
+@st.fragment
+@instrumented("raw_data")
+def render_raw_data(sightings):
+    """
+    Raw Data tab. Rows are filtered, sorted and paged on the server so only
+    the visible page is sent to the browser; exports are built on demand.
+    Sightings are flagged or unflagged here, and validation rules switched
+    on or off; either takes effect for every view on the next rerun.
+    """
+    st.header("Raw Sightings Data")
+    exclusions = get_exclusions(sightings)
+    aggregates = get_aggregates(sightings, exclusions)
+    dataset = shared_dataset("sightings")
+
+    # Validation rules, with how many sightings each one catches
+    if isinstance(sightings, SightingStore):
+        excluded_count, counts = sightings.excluded_count(), sightings.issue_counts()
+    else:
+        excluded_count = exclusions.count
+        counts = dataset.derived(sightings, "issue_counts", lambda: issue_counts(sightings.issues))
+    with st.expander(f"Validation: {excluded_count} sightings excluded"):
+        rules = exclusion_overlay.rules()
+        for name, rule in RULES.items():
+            enabled = st.checkbox(f"Exclude: {rule.label.lower()} ({counts[name]} sightings)", value=rules[name],
+                                  key=f"raw_rule:{name}:{exclusions.version}")
+            if enabled != rules[name]:
+                exclusion_overlay.set_rule(name, enabled)
+                st.rerun(scope="app")
+        show_excluded = st.toggle("Show excluded sightings", key="raw_show_excluded")
+        st.caption("Tick or untick Excluded in the table to flag a sighting. Excluded sightings are kept in "
+                   "the workbooks but left out of every chart, table and export.")
+
+    # Filters, kept separate from the Overview's
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        statuses = st.multiselect("Conservation Status:", ["Green", "Amber", "Red"], key="raw_statuses")
+    with col2:
+        years = st.multiselect("Years:", aggregates.years(), key="raw_years")
+    with col3:
+        locations = st.multiselect("Locations:", aggregates.location_names(), key="raw_locations")
+    filters = (statuses, years, locations)
+    total = count_raw_rows(sightings, *filters, exclusions=exclusions, include_excluded=show_excluded)
+
+    # Sorting and paging
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_by = st.selectbox("Sort by:", SORT_COLUMNS, key="raw_sort_by")
+    with col2:
+        descending = st.toggle("Descending", key="raw_descending")
+    with col3:
+        page_size = st.selectbox("Rows per page:", RAW_PAGE_SIZES, key="raw_page_size")
+    with col4:
+        pages = max(1, -(-total // page_size))
+        page = st.number_input("Page:", min_value=1, max_value=pages, value=1, key="raw_page")
+
+    start = (min(page, pages) - 1) * page_size
+    df = get_raw_page(sightings, filters, sort_by, not descending, start, page_size, exclusions, show_excluded)
+    # Keyed on the exclusions version, so the editor starts afresh once an edit is applied
+    edited = st.data_editor(
+        df, use_container_width=True, hide_index=True, key=f"raw_editor:{exclusions.version}",
+        column_order=[*SORT_COLUMNS, "Issues", "Excluded"], disabled=[*SORT_COLUMNS, "Issues"],
+        column_config={"Excluded": st.column_config.CheckboxColumn(help="Leave this sighting out of every view")}
+    )
+    st.caption(f"Rows {min(start + 1, total)}–{start + len(df)} of {total}")
+
+    changed = edited["Excluded"] != df["Excluded"]
+    if changed.any():
+        exclusion_overlay.set_excluded({key: (bool(row["Excluded"]), int(row["issue_bits"]))
+                                        for key, row in edited[changed].iterrows()})
+        st.rerun(scope="app")
+
+    # Download buttons for the sightings that aren't excluded; each export is
+    # built when first downloaded and then kept until the data or exclusions change
+    def export(fmt: str) -> bytes:
+        df = dataset.derived(sightings, "raw_frame", lambda: visible_frame(sightings, exclusions),
+                             key=exclusions.version)
+        return dataset.derived(sightings, f"export:{fmt}", lambda: export_frame(df, fmt), key=exclusions.version)
+
+    for column, (fmt, export_format) in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()):
+        with column:
+            st.download_button(
+                label=f"Download as {export_format.label}",
+                data=lambda fmt=fmt: export(fmt),
+                file_name=f"heal_somerset_bird_sightings.{export_format.extension}",
+                mime=export_format.mime
+            )
+
+
+@st.fragment
+@instrumented("add_sightings")
+def render_add_sightings():
+    """
+    Add Sightings tab. One survey column (a date, field section and
+    surveyors) is entered at a time, with the count of each species seen.
+    The sightings are appended to the journal and to the shared sightings,
+    then every tab reruns to show them; no workbook is touched.
+    """
+    st.header("Add Sightings")
+    if COMPACT_INTERVAL > 0:
+        start_compactor(journal, COMPACT_INTERVAL, COMPACT_MIN_RECORDS)
+
+    added = st.session_state.pop("sightings_added", None)
+    if added:
+        st.success(f"Added {added} sightings")
+
+    with st.form("add_sightings", clear_on_submit=True):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            day = st.date_input("Date:", value=date.today(), format="DD/MM/YYYY")
+        with col2:
+            location = st.selectbox("Location:", FIELD_SECTIONS)
+        with col3:
+            surveyors = st.text_input("Surveyors:", placeholder="e.g. Jo Bloggs & Sam Smith")
+        counts = st.data_editor(
+            pd.DataFrame({"Species": pd.Series(dtype=object), "Count": pd.Series(dtype="Int64")}),
+            num_rows="dynamic", use_container_width=True, hide_index=True,
+            column_config={
+                "Species": st.column_config.SelectboxColumn(
+                    options=sorted(species.name for species in SPECIES_LIST), required=True),
+                "Count": st.column_config.NumberColumn(min_value=1, step=1, required=True),
+            }
+        )
+        submitted = st.form_submit_button("Add sightings")
+
+    if submitted:
+        rows = counts.dropna()
+        if not surveyors.strip():
+            st.error("Enter the surveyors")
+        elif rows.empty:
+            st.error("Add at least one species and its count")
+        else:
+            entries = [JournalEntry(day, row["Species"], location, surveyors, int(row["Count"]))
+                       for _, row in rows.iterrows()]
+            try:
+                add_sightings(entries)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.session_state["sightings_added"] = len(entries)
+                st.rerun(scope="app")
+
+    st.caption(f"Entered sightings are kept in {journal.path.name}, {journal.pending()} of them not yet "
+               f"compacted into {journal.snapshot_path.name}. Flag a mistaken one as Excluded in the Raw Data tab.")
+
+
+@instrumented("rerun")
+def render_dashboard():
+    """Load the shared sightings and render the tabs."""
+    with st.spinner("Loading bird sightings data..."):
+        try:
+            version, sightings = get_shared_sightings()
+
+            if sightings:
+                # Create tabs for different views; each renders as its own fragment
+                tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Overview", "🔍 Species Detail", "📈 Trends",
+                                                        "📋 Raw Data", "✏️ Add Sightings"])
+
+                with tab1:
+                    render_overview(sightings, version)
+
+                with tab2:
+                    render_species_detail(sightings, version)
+
+                with tab3:
+                    render_trends(sightings, version)
+
+                with tab4:
+                    render_raw_data(sightings)
+
+                with tab5:
+                    render_add_sightings()
+
+            else:
+                st.error("❌ No sightings could be loaded from the file.")
+                st.info("Please check that the file exists at: `/data/sightings_2024_2025.xlsx`")
+
+        except FileNotFoundError:
+            st.error("❌ File not found: `/data/sightings_2024_2025.xlsx`")
+            st.info("Please ensure the Excel file is in the correct location.")
+        except Exception as e:
+            st.error(f"❌ Error loading data: {str(e)}")
+            st.info("Please check the file format and try again.")
+
+
+def render_diagnostics():
+    """Diagnostics sidebar: stage timings of recent runs, cache counters and an optional profile."""
+    history = st.session_state.get("diagnostics_history", [])
+    dataset = shared_dataset("sightings")
+    hits, misses, entries, nbytes = figure_cache.stats()
+
+    with st.sidebar:
+        st.header("Diagnostics")
+        if history:
+            last = history[-1]
+            st.metric("Last run", f"{last.seconds * 1000:.0f} ms", help=f"'{last.name}' run")
+            stages = pd.DataFrame(last.summary(), columns=["stage", "calls", "seconds", "rows"])
+            stages["ms"] = (stages.pop("seconds") * 1000).round(2)
+            st.dataframe(stages, hide_index=True, use_container_width=True)
+            st.caption("Ingest stages run in worker processes can add up to more than the run itself.")
+            if last.counters:
+                st.json(last.counters, expanded=False)
+
+        st.subheader("Process")
+        st.text(f"Dataset: version {dataset.version}, loaded {dataset.load_count} time(s), "
+                f"updated {dataset.update_count} time(s), "
+                f"{dataset.resident_nbytes / 1e6:.1f} MB resident")
+        st.text(f"Figure cache: {hits} hits, {misses} misses, {entries} figures, {nbytes / 1e6:.1f} MB")
+        if history and history[-1].process_peak_rss_bytes:
+            st.text(f"Process peak RSS since start: {history[-1].process_peak_rss_bytes / 1e6:.0f} MB")
+
+        if last_background_load is not None:
+            load = last_background_load
+            st.subheader("Last background load")
+            st.text(f"'{load.name}' at {datetime.fromtimestamp(load.started_at):%H:%M:%S}, "
+                    f"{load.seconds * 1000:.0f} ms")
+            stages = pd.DataFrame(load.summary(), columns=["stage", "calls", "seconds", "rows"])
+            stages["ms"] = (stages.pop("seconds") * 1000).round(2)
+            st.dataframe(stages, hide_index=True, use_container_width=True)
+
+        st.subheader("Recent runs")
+        st.dataframe(pd.DataFrame([{"run": r.name, "ms": round(r.seconds * 1000, 1)} for r in reversed(history)]),
+                     hide_index=True, use_container_width=True)
+
+        st.button("Profile next rerun", help="Run the next rerun of the dashboard under cProfile",
+                  on_click=lambda: st.session_state.update(profile_next_rerun=True))
+        if "profile_output" in st.session_state:
+            with st.expander("Last profile"):
+                st.code(st.session_state["profile_output"], language=None)
+
+
+def render_app():
+    """Everything shown after sign-in: the dashboard and, if opted into, the diagnostics sidebar."""
+    # Diagnostics are opt-in and only offered to signed-in users
+    show_diagnostics = st.sidebar.toggle("Show diagnostics", key="show_diagnostics")
+
+    st.title("🦉 Heal Somerset Bird Survey Dashboard")
+    st.markdown("Welcome to the bird sightings analysis dashboard for Heal Somerset.")
+
+    if st.session_state.pop("profile_next_rerun", False):
+        _, st.session_state["profile_output"] = instrumentation.profile(render_dashboard)
+    else:
+        render_dashboard()
+
+    if show_diagnostics:
+        render_diagnostics()
+
+
+@instrumented_load("warm")
+def warm():
+    """Load the shared sightings ahead of the first signed-in rerun."""
+    get_shared_sightings()
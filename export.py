@@ -0,0 +1,35 @@
+import gzip
+import io
+from dataclasses import dataclass
+from typing import Dict
+
+import pandas as pd
+
+
+@dataclass
+class ExportFormat:
+    label: str
+    extension: str
+    mime: str
+
+
+# Download formats offered for the raw sightings
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "csv": ExportFormat("CSV", "csv", "text/csv"),
+    "csv.gz": ExportFormat("Compressed CSV", "csv.gz", "application/gzip"),
+    "parquet": ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet"),
+}
+
+
+def export_frame(df: pd.DataFrame, fmt: str) -> bytes:
+    """Serialize a DataFrame in one of the EXPORT_FORMATS."""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    if fmt == "csv.gz":
+        # mtime=0 so the same data always compresses to the same bytes
+        return gzip.compress(df.to_csv(index=False).encode(), mtime=0)
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False, engine="pyarrow")
+        return buffer.getvalue()
+    raise ValueError(f"Unknown export format '{fmt}'")
@@ -0,0 +1,93 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+import plotly.io
+
+# Total size of the serialized figures kept, in bytes
+FIGURE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class FigureCache:
+    """
+    LRU cache of serialized Plotly figures, bounded by their total size.
+
+    Keys should be canonical (e.g. frozensets of filter values) and include
+    the dataset version, so stale figures are never served and simply age
+    out. A hit returns the figure spec as a dict, which `st.plotly_chart`
+    accepts, without re-running the aggregation or building a figure.
+    """
+
+    def __init__(self, max_bytes: int = FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()  # Sessions share the cache across threads
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, key: Hashable, build: Callable[[], Optional[object]]) -> Optional[dict]:
+        """
+        Return the spec of the figure for a key, building it on a miss.
+
+        `build` returns a Plotly figure, or None when there is nothing to
+        plot; None results are not cached.
+        """
+        def serialize() -> Optional[str]:
+            fig = build()
+            return None if fig is None else plotly.io.to_json(fig, validate=False)
+
+        spec = self.get_serialized(key, serialize)
+        return None if spec is None else json.loads(spec)
+
+    def get_serialized(self, key: Hashable, build: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Return the serialized value for a key, building it on a miss, e.g.
+        a JSON response of api.py. None results are not cached.
+        """
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value
+
+        value = build()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        """Add a serialized figure built elsewhere, e.g. precomputed by reports.py."""
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = value
+                self.nbytes += len(value)
+            # Evict least recently used figures, always keeping the newest
+            while self.nbytes > self.max_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def prune(self, keep: Callable[[Hashable], bool]) -> int:
+        """Drop every figure whose key `keep` rejects, e.g. those of an old dataset version."""
+        with self._lock:
+            stale = [key for key in self._cache if not keep(key)]
+            for key in stale:
+                self.nbytes -= len(self._cache.pop(key))
+        return len(stale)
+
+    def stats(self) -> Tuple[int, int, int, int]:
+        """Hits, misses, entries and bytes held."""
+        with self._lock:
+            return self.hits, self.misses, len(self._cache), self.nbytes
+
+
+# Shared by every session in the process
+figure_cache = FigureCache()
@@ -0,0 +1,147 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Number of recent filter combinations whose row positions are kept
+FILTER_CACHE_SIZE = 64
+
+
+def normalise_filters(all_categories: FrozenSet[str], conservation_statuses=None, years=None, locations=None,
+                      all_years: Optional[Iterable[int]] = None,
+                      all_locations: Optional[Iterable[str]] = None) -> Tuple[Optional[FrozenSet], ...]:
+    """
+    Canonical form of a filter, with None for filters that don't apply.
+
+    Empty or missing filters select everything, and so does selecting every
+    conservation status, or every year or location of the sightings
+    filtered when they are passed as `all_years` and `all_locations`. The
+    dashboard's default view, with everything selected, then has the same
+    form as no filter at all.
+    """
+    def selection(values, every) -> Optional[FrozenSet]:
+        values = frozenset(values or ())
+        if not values or (every is not None and values >= frozenset(every)):
+            return None
+        return values
+
+    return (
+        selection(conservation_statuses, all_categories),
+        selection(years, all_years),
+        selection(locations, all_locations),
+    )
+
+
+class FilterIndex:
+    """
+    Bitmaps over a SightingTable for each conservation status, year and
+    field section.
+
+    A filter becomes a few bitwise ORs (values within a filter) and ANDs
+    (across filters) on packed bitsets, so its cost depends on the number
+    of rows rather than on how many seasons or values are selected.
+    Excluded sightings are masked out the same way. Row positions for
+    recent filter combinations are memoized.
+    """
+
+    def __init__(self, sightings):
+        self.size = len(sightings)
+        self.all_categories = frozenset(sightings.registry.categories)
+        self.by_status = self._bitmaps(sightings.category_code, sightings.registry.categories)
+        years = np.unique(sightings.year)
+        self.by_year = self._bitmaps(np.searchsorted(years, sightings.year), years.tolist())
+        self.by_location = self._bitmaps(sightings.location_code, sightings.locations)
+        self._cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()  # Sessions share the index across threads
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the bitmaps and memoized positions."""
+        bitmaps = [*self.by_status.values(), *self.by_year.values(), *self.by_location.values()]
+        with self._lock:
+            cached = list(self._cache.values())
+        return sum(b.nbytes for b in bitmaps) + sum(p.nbytes for p in cached)
+
+    def _bitmaps(self, codes: np.ndarray, values: list) -> Dict[object, np.ndarray]:
+        """Packed bitset of the rows holding each value."""
+        return {value: np.packbits(codes == code) for code, value in enumerate(values)}
+
+    def extended(self, sightings, start: int) -> "FilterIndex":
+        """
+        Index of a table made by appending rows to this index's table, from
+        `start` on. Only the new rows are scanned; memoized positions are
+        not carried over.
+        """
+        index = FilterIndex(sightings[np.arange(start, len(sightings))])
+        index.by_status = self._appended(self.by_status, index.by_status, index.size)
+        index.by_year = self._appended(self.by_year, index.by_year, index.size)
+        index.by_location = self._appended(self.by_location, index.by_location, index.size)
+        index.size = len(sightings)
+        return index
+
+    def _appended(self, bitmaps: Dict[object, np.ndarray], new: Dict[object, np.ndarray],
+                  new_size: int) -> Dict[object, np.ndarray]:
+        """Bitmaps over this index's rows followed by `new_size` rows with bitmaps `new`."""
+        tail = self.size % 8
+        result = {}
+        for value in {**bitmaps, **new}:
+            old = bitmaps.get(value, np.zeros((self.size + 7) // 8, dtype=np.uint8))
+            added = new.get(value, np.zeros((new_size + 7) // 8, dtype=np.uint8))
+            if tail:
+                # The new rows start part way through the last byte
+                bits = np.concatenate([np.unpackbits(old[-1:])[:tail], np.unpackbits(added, count=new_size)])
+                old, added = old[:-1], np.packbits(bits)
+            result[value] = np.concatenate([old, added])
+        return result
+
+    def _union(self, bitmaps: Dict[object, np.ndarray], values: Iterable) -> np.ndarray:
+        result = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for value in values:
+            if value in bitmaps:
+                result |= bitmaps[value]
+        return result
+
+    def select(self, conservation_statuses=None, years=None, locations=None, exclude=None) -> np.ndarray:
+        """
+        Row positions matching every given filter, in table order.
+
+        `exclude` is an optional validation.ExclusionMask over the table;
+        its excluded rows are left out.
+        """
+        if exclude is not None and not exclude.count:
+            exclude = None
+        key = (*normalise_filters(self.all_categories, conservation_statuses, years, locations,
+                                  self.by_year, self.by_location),
+               exclude.version if exclude is not None else None)
+        with self._lock:
+            positions = self._cache.get(key)
+            if positions is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return positions
+            self.misses += 1
+
+        statuses, years, locations, _ = key
+        if statuses is None and years is None and locations is None and exclude is None:
+            positions = np.arange(self.size)
+        else:
+            bits = np.full((self.size + 7) // 8, 0xFF, dtype=np.uint8)
+            if statuses is not None:
+                bits &= self._union(self.by_status, statuses)
+            if years is not None:
+                bits &= self._union(self.by_year, years)
+            if locations is not None:
+                bits &= self._union(self.by_location, locations)
+            if exclude is not None:
+                bits &= ~exclude.packed
+            positions = np.flatnonzero(np.unpackbits(bits, count=self.size))
+
+        positions.flags.writeable = False
+        with self._lock:
+            self._cache[key] = positions
+            if len(self._cache) > FILTER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return positions
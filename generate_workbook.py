@@ -0,0 +1,137 @@
+"""
+Write synthetic survey workbooks in the layout the dashboard reads, for
+trying it out at larger scales than the real survey.
+
+    python generate_workbook.py sightings_synthetic.xlsx --years 2015-2025 --columns 96
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Sequence
+
+import openpyxl
+
+from models import Species
+
+# Field sections and surveyor names the synthetic surveys are drawn from
+FIELD_SECTIONS = ["Southern", "Northern", "Eastern"]
+SURVEYOR_NAMES = ["Jenny", "Nicola", "Tegan", "Jan", "Jeremy", "Craig", "Izzy", "Mark", "Tom", "Oli",
+                  "Sam", "Andrew", "Tim", "Josie", "Lucy"]
+
+# Share of species x survey cells that hold a count
+FILL_RATE = 0.35
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July", "August",
+               "September", "October", "November", "December"]
+
+
+def format_survey_date(day: datetime, rng: random.Random):
+    """A survey date in one of the formats found in the real dates row."""
+    kind = rng.random()
+    if kind < 0.6:
+        return day  # A date cell
+    if kind < 0.75:
+        return f"{rng.choice(['8am', '8.30am', '9am'])} {day.day}/{day.month}/{day.year}"
+    if kind < 0.85:
+        return f"{rng.choice(['8am', '9am'])} {day.day:02d}/{day.month:02d}/{day.year % 100:02d}"
+    if kind < 0.95:
+        return day.strftime("%Y-%m-%dT%H:%M:%S")
+    return (day - datetime(1899, 12, 30)).days  # A bare Excel serial number
+
+
+def survey_days(year: int, columns: int, rng: random.Random) -> list:
+    """Survey dates spread across a year, in order."""
+    start = datetime(year, 1, 1)
+    return sorted(start + timedelta(days=rng.randrange(365)) for _ in range(columns))
+
+
+def write_survey_sheet(workbook, year: int, columns: int, species: Sequence[Species], rng: random.Random) -> None:
+    """
+    Add one year's survey sheet.
+
+    Row 1 holds month headings, row 2 the surveyors, row 3 the dates, row 4
+    the field sections, rows 5-6 weather and notes, and species rows start
+    on row 7. Each month's surveys are followed by a "Monthly Totals" column.
+    """
+    sheet = workbook.create_sheet(f"Heal Somerset bird list {year}")
+
+    months, surveyors, dates, sections, weather, notes = ([year, None], ["Species", "Surveyors:"], [None, "Date:"],
+                                                          ["Amber List", "Field section:"],
+                                                          ["Green List", "Weather conditions:"],
+                                                          ["Red List", "Notes"])
+    survey_positions = []
+    days = survey_days(year, columns, rng)
+    for month in range(1, 13):
+        month_days = [d for d in days if d.month == month]
+        for i, day in enumerate(month_days):
+            survey_positions.append(len(dates))
+            months.append(MONTH_NAMES[month - 1] if i == 0 else None)
+            surveyors.append(", ".join(rng.sample(SURVEYOR_NAMES, rng.randint(2, 6))))
+            dates.append(format_survey_date(day, rng))
+            sections.append(rng.choice(FIELD_SECTIONS))
+            weather.append(None)
+            notes.append(None)
+        if month_days:
+            months.append("Monthly Totals")
+            for row in (surveyors, dates, sections, weather, notes):
+                row.append(None)
+    months.extend([f"Total for {year}", f"Species Total {year}"])
+
+    for row in (months, surveyors, dates, sections, weather, notes):
+        sheet.append(row)
+
+    width = len(dates)
+    for species_obj in species:
+        row = [None] * width
+        row[0] = species_obj.name
+        for position in survey_positions:
+            if rng.random() < FILL_RATE:
+                row[position] = rng.choice([1, 1, 1, 2, 2, 3, 4, 5, 8, 12, 20, 40])
+        sheet.append(row)
+
+
+def generate_workbook(path: Path, years: Sequence[int], columns: int, species: Sequence[Species],
+                      seed: int = 0) -> Path:
+    """
+    Write a workbook with one survey sheet per year.
+
+    Args:
+        path: Workbook to write
+        years: Years to survey
+        columns: Survey columns per year
+        species: Species to give a row each
+        seed: Seed for the random counts, dates and surveyors
+    """
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for year in years:
+        write_survey_sheet(workbook, year, columns, species, rng)
+    workbook.save(path)
+    return path
+
+
+def main():
+    # Imported here so generate_workbook() can be used without loading the dashboard
+    from dashboard import SPECIES_LIST
+
+    parser = argparse.ArgumentParser(description="Write a synthetic survey workbook.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--years", default="2024-2025", help="Year or inclusive range, e.g. 2015-2025")
+    parser.add_argument("--columns", type=int, default=48, help="Survey columns per year")
+    parser.add_argument("--species", type=int, default=len(SPECIES_LIST),
+                        help=f"Number of species rows (at most {len(SPECIES_LIST)})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    first, _, last = args.years.partition("-")
+    years = range(int(first), int(last or first) + 1)
+    if not 0 < args.species <= len(SPECIES_LIST):
+        parser.error(f"--species must be between 1 and {len(SPECIES_LIST)}")
+
+    generate_workbook(args.path, years, args.columns, SPECIES_LIST[:args.species], args.seed)
+    print(f"Wrote {args.path}: {len(years)} years x {args.columns} surveys x {args.species} species")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from xml.etree import ElementTree
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+import instrumentation
+import snapshot
+from instrumentation import stage
+from sighting_table import SightingTable
+from species_registry import UNKNOWN_SPECIES_ID, SpeciesRegistry, find_duplicates
+from survey_dates import DateIssue, parse_survey_dates
+from validation import RULES, repeated_rows, validate
+
+# Bump when parsing or validation changes so snapshots are rebuilt
+INGEST_VERSION = "3"
+
+# Survey sheets are found by name; the year they cover is taken from the name
+SURVEY_SHEET_PATTERN = re.compile(r"bird list (?P<year>\d{4})$")
+
+# Header values in the dates row that mark summary columns rather than surveys
+SUMMARY_COLUMN_LABELS = ['Monthly Totals', 'Total for 2024', 'Species Total 2024']
+SUMMARY_COLUMN_PREFIXES = ('North', 'South', 'East')
+
+# Field sections the survey is divided into; sightings recorded elsewhere
+# (including "Unknown", for columns without one) fail validation
+FIELD_SECTIONS = ["Eastern", "Northern", "Southern"]
+
+# Species rows start on row 6 and are converted this many at a time
+FIRST_SPECIES_ROW = 6
+SIGHTING_BLOCK_ROWS = 512
+
+# Sheets are parsed in a process pool when at least this many need parsing;
+# below it, starting the workers costs more than it saves
+PARALLEL_MIN_SHEETS = 3
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_PACKAGE_RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+@dataclass
+class SurveySheet:
+    workbook_path: Path
+    sheet_name: str
+    year: int
+    key: str  # Fingerprint of the sheet's contents
+
+
+def find_workbooks(directory: Path, pattern: str) -> List[Path]:
+    """Workbooks in a directory matching a glob pattern, skipping Excel lock files."""
+    return sorted(path for path in directory.glob(pattern)
+                  if path.is_file() and not path.name.startswith("~$"))
+
+
+def _sheet_parts(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Map each sheet name in an .xlsx archive to the zip member holding it."""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_PACKAGE_RELS_NS}Relationship")}
+
+    parts = {}
+    for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+        target = targets.get(sheet.get(_REL_ID), "")
+        # Targets are relative to xl/ unless they start with a slash
+        parts[sheet.get("name")] = target.lstrip("/") if target.startswith("/") else str(PurePosixPath("xl", target))
+    return parts
+
+
+def discover_sheets(workbook_paths: Sequence[Path], registry: SpeciesRegistry,
+                    pattern: re.Pattern = SURVEY_SHEET_PATTERN) -> List[SurveySheet]:
+    """
+    Find the survey sheets in a set of workbooks.
+
+    Each sheet is fingerprinted from the CRCs the zip archive already stores
+    for the sheet, the shared strings and the styles (which decide whether a
+    number is a date), so nothing is decompressed. A sheet's fingerprint
+    changes when another sheet adds or edits text, which only costs a re-parse.
+
+    Returns:
+        Sheets ordered by year, then workbook, then name
+    """
+    sheets = []
+    for workbook_path in workbook_paths:
+        with zipfile.ZipFile(workbook_path) as archive:
+            members = {info.filename: info for info in archive.infolist()}
+            for sheet_name, part in _sheet_parts(archive).items():
+                match = pattern.search(sheet_name)
+                if not match or part not in members:
+                    continue
+
+                crcs = [(name, members[name].CRC, members[name].file_size)
+                        for name in (part, "xl/sharedStrings.xml", "xl/styles.xml") if name in members]
+                key = hashlib.sha256(json.dumps(
+                    [INGEST_VERSION, registry.version, sheet_name, crcs]
+                ).encode()).hexdigest()
+                sheets.append(SurveySheet(workbook_path, sheet_name, int(match.group("year")), key))
+
+    return sorted(sheets, key=lambda s: (s.year, str(s.workbook_path), s.sheet_name))
+
+
+def is_survey_column(dates: pd.Series) -> pd.Series:
+    """Which values of a dates row head survey columns rather than summary columns (totals, #DIV errors)."""
+    labels = dates.astype(str)
+    return (dates.notna() &
+            ~labels.isin(SUMMARY_COLUMN_LABELS) &
+            ~labels.str.startswith(SUMMARY_COLUMN_PREFIXES) &
+            ~labels.str.contains('#DIV', regex=False))
+
+
+def survey_columns(df: pd.DataFrame, expected_year: Optional[int] = None) -> Tuple[pd.DataFrame, List[DateIssue]]:
+    """
+    Describe the survey columns of a sheet.
+
+    Returns:
+        DataFrame indexed by column position with one row per survey column and
+        `date`, `surveyors` and `field_section` columns, plus any problems found
+        parsing the dates row
+    """
+    # Surveyors, dates and field sections live in rows 1-3; pad short sheets with NaN
+    header = df.iloc[:4].reindex(range(4)).iloc[1:, 3:].T
+    header.columns = ["surveyors", "date", "field_section"]
+
+    columns = header[is_survey_column(header["date"])].copy()
+
+    survey_dates = parse_survey_dates(columns["date"], expected_year)
+    columns["date"] = columns.index.map(survey_dates.dates)
+    columns["surveyors"] = columns["surveyors"].map(str).where(columns["surveyors"].notna(), "Unknown")
+    columns["field_section"] = columns["field_section"].map(str).where(columns["field_section"].notna(), "Unknown")
+
+    # Columns without a usable date contribute no sightings
+    return columns[columns["date"].notna()], survey_dates.issues
+
+
+def count_block_sightings(registry: SpeciesRegistry, species_ids: np.ndarray, block: np.ndarray,
+                          columns: pd.DataFrame, row_issues: Optional[np.ndarray] = None) -> SightingTable:
+    """
+    Turn a block of raw counts into sightings.
+
+    Args:
+        registry: Registry the species IDs belong to
+        species_ids: Species ID of each row in the block
+        block: Raw cell values, one row per species and one column per survey column
+        columns: Survey columns, as returned by `survey_columns`
+        row_issues: Issue bits of each row, given to every sighting from it
+    """
+    # Reshape the species x survey count block into long form, row by row
+    row_pos = np.repeat(np.arange(len(species_ids)), len(columns))
+    col_pos = np.tile(np.arange(len(columns)), len(species_ids))
+    values = pd.Series(block.ravel())
+
+    # Skip empty counts; a numeric zero is empty but a "0" string is kept
+    is_text = values.map(type).eq(str)
+    numbers = pd.to_numeric(values, errors="coerce")
+    keep = (values.notna() & values.ne("") & ~(~is_text & numbers.eq(0)) &
+            numbers.notna() & np.isfinite(numbers))
+
+    counts = numbers[keep].to_numpy().astype(int)  # Truncates floats that should be ints
+    row_pos = row_pos[keep.to_numpy()]
+    col_pos = col_pos[keep.to_numpy()]
+
+    sightings = SightingTable.from_columns(
+        registry,
+        species_ids[row_pos],
+        columns["date"].to_numpy()[col_pos],
+        columns["field_section"].to_numpy()[col_pos],
+        columns["surveyors"].to_numpy()[col_pos],
+        counts
+    )
+    if row_issues is not None:
+        sightings.issues = row_issues[row_pos]
+    return sightings
+
+
+def iter_sheet_sightings(registry: SpeciesRegistry, worksheet, sheet_name: str,
+                         year: int) -> Iterator[SightingTable]:
+    """
+    Stream sightings from a read-only worksheet, a block of species rows at a time.
+
+    Only the header rows and the columns up to the last survey column are read.
+    """
+    with stage("excel_read", rows=4):
+        header = pd.DataFrame(list(worksheet.iter_rows(max_row=4, values_only=True)))
+    with stage("date_parsing") as parsing:
+        columns, date_issues = survey_columns(header, year)
+        parsing.rows = len(columns)
+    for issue in date_issues:
+        # Dates are on the third row of the sheet
+        cell = f"{get_column_letter(issue.column + 1)}3"
+        print(f"Warning: {issue.kind} date '{issue.value}' in '{sheet_name}'!{cell}: {issue.message}")
+
+    if columns.empty:
+        return
+
+    width = int(columns.index.max()) + 1
+    rows = worksheet.iter_rows(min_row=FIRST_SPECIES_ROW + 1, max_col=width, values_only=True)
+
+    unknown_names = {}
+    known_ids, known_rows = [], []
+    seen_ids = set()
+    for block_start in itertools.count(FIRST_SPECIES_ROW, SIGHTING_BLOCK_ROWS):
+        with stage("excel_read") as reading:
+            chunk = list(itertools.islice(rows, SIGHTING_BLOCK_ROWS))
+            reading.rows = len(chunk)
+        if not chunk:
+            break
+
+        # Pad rows openpyxl cut short so the block is rectangular
+        block = np.empty((len(chunk), width), dtype=object)
+        for i, row in enumerate(chunk):
+            block[i, :len(row)] = row[:width]
+
+        # Skip empty rows or rows that don't contain species names
+        species_names = pd.Series(block[:, 0], index=range(block_start, block_start + len(chunk)))
+        has_name = (species_names.notna() & species_names.ne("")).to_numpy()
+        species_names = species_names[has_name]
+
+        # Match each bird row to a species in one pass
+        with stage("species_matching", rows=len(species_names)):
+            match = registry.resolve(species_names)
+        unknown_names.update(dict.fromkeys(match.unknown))
+        known = match.ids != UNKNOWN_SPECIES_ID
+        known_ids.append(match.ids[known])
+        known_rows.append(species_names.index[known])
+
+        # Every row of a species after its first is a duplicate, whichever block it is in
+        row_issues = np.where(repeated_rows(match.ids[known], seen_ids),
+                              RULES["duplicate_rows"].bit, 0).astype(np.uint8)
+
+        if known.any():
+            with stage("sighting_build") as building:
+                sightings = count_block_sightings(registry, match.ids[known],
+                                                  block[has_name][known][:, columns.index], columns, row_issues)
+                building.rows = len(sightings)
+            yield sightings
+
+    for species_name in unknown_names:
+        print(f"Warning: Species '{species_name}' not found in SPECIES_LIST")
+    if known_ids:
+        duplicates = find_duplicates(np.concatenate(known_ids), np.concatenate(known_rows))
+        for species_id, row_labels in duplicates.items():
+            rows_text = ", ".join(str(row + 1) for row in row_labels)
+            print(f"Warning: Species '{registry.species[species_id].name}' "
+                  f"appears on rows {rows_text} of '{sheet_name}'")
+
+
+def parse_sheet(registry: SpeciesRegistry, workbook_path: Path, sheet_name: str, year: int) -> SightingTable:
+    """Parse one survey sheet. Runs in worker processes, so it opens its own workbook."""
+    with stage("excel_open"):
+        workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        return SightingTable.concat(
+            registry, list(iter_sheet_sightings(registry, workbook[sheet_name], sheet_name, year))
+        )
+    finally:
+        workbook.close()
+
+
+def _parse_sheet_recorded(*args) -> Tuple[SightingTable, List[instrumentation.StageRecord]]:
+    """parse_sheet for worker processes, also returning the stages it recorded."""
+    with instrumentation.capture() as records:
+        table = parse_sheet(*args)
+    return table, records
+
+
+def load_sheets(registry: SpeciesRegistry, sheets: Sequence[SurveySheet],
+                max_workers: Optional[int] = None) -> SightingTable:
+    """
+    Load survey sheets into one table, in the order given.
+
+    Sheets whose fingerprint matches a per-sheet snapshot are read from it;
+    the rest are parsed, in a process pool when there are enough of them,
+    and snapshotted for next time. The joined table is then validated in
+    one pass; its issues are kept on the table rather than dropping rows.
+    """
+    tables: Dict[str, SightingTable] = {}
+    pending = []
+    for sheet in sheets:
+        # Identical sheets (e.g. a copied workbook) share a fingerprint and are parsed once
+        if sheet.key in tables or any(p.key == sheet.key for p in pending):
+            continue
+        with stage("snapshot_read") as reading:
+            cached = snapshot.load_sheet_snapshot(sheet.key)
+            if cached is not None:
+                try:
+                    tables[sheet.key] = SightingTable.from_arrow(registry, cached)
+                    reading.rows = len(tables[sheet.key])
+                except ValueError:
+                    pass
+        if sheet.key in tables:
+            continue
+        pending.append(sheet)
+
+    for sheet, table in zip(pending, _parse_sheets(registry, pending, max_workers)):
+        tables[sheet.key] = table
+        snapshot.write_sheet_snapshot(sheet.key, table.to_arrow())
+
+    snapshot.prune_sheet_snapshots(keep=set(tables))
+    sightings = SightingTable.concat(registry, [tables[sheet.key] for sheet in sheets])
+    with stage("validation", rows=len(sightings)):
+        lengths = [len(tables[sheet.key]) for sheet in sheets]
+        sheet_years = np.repeat([sheet.year for sheet in sheets], lengths)
+        sightings.issues = validate(sightings, np.repeat(np.arange(len(sheets)), lengths), sheet_years, FIELD_SECTIONS)
+    return sightings
+
+
+def _parse_sheets(registry: SpeciesRegistry, sheets: Sequence[SurveySheet],
+                  max_workers: Optional[int]) -> List[SightingTable]:
+    args = [(registry, s.workbook_path, s.sheet_name, s.year) for s in sheets]
+    workers = min(len(sheets), max_workers or os.cpu_count() or 1)
+    if len(sheets) >= PARALLEL_MIN_SHEETS and workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_parse_sheet_recorded, *zip(*args)))
+            # Workers time their stages themselves; add them to this run
+            for _, records in results:
+                instrumentation.record_all(records)
+            return [table for table, _ in results]
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Warning: Parsing sheets in parallel failed, parsing serially: {e}")
+
+    return [parse_sheet(*a) for a in args]
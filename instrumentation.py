@@ -0,0 +1,171 @@
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import pstats
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger("heal.diagnostics")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+@dataclass
+class StageRecord:
+    name: str
+    seconds: float
+    rows: Optional[int] = None
+
+
+@dataclass
+class RerunRecord:
+    """Stage timings and counters for one script or fragment run."""
+    name: str
+    started_at: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    stages: List[StageRecord] = field(default_factory=list)
+    counters: Dict[str, int] = field(default_factory=dict)
+    # Peak resident memory of the whole process when the run ended, not of
+    # the run itself: it never goes down, so only a rise points at this run
+    process_peak_rss_bytes: Optional[int] = None
+
+    def summary(self) -> List[Dict[str, object]]:
+        """Stages combined by name, in the order they first ran."""
+        combined: Dict[str, Dict[str, object]] = {}
+        for record in self.stages:
+            entry = combined.setdefault(record.name, {"stage": record.name, "calls": 0, "seconds": 0.0, "rows": None})
+            entry["calls"] += 1
+            entry["seconds"] += record.seconds
+            if record.rows is not None:
+                entry["rows"] = (entry["rows"] or 0) + record.rows
+        return list(combined.values())
+
+    def to_log(self) -> str:
+        return json.dumps({
+            "event": "rerun",
+            "run": self.name,
+            "seconds": round(self.seconds, 6),
+            "stages": [dict(s, seconds=round(s["seconds"], 6)) for s in self.summary()],
+            "counters": self.counters,
+            "process_peak_rss_bytes": self.process_peak_rss_bytes,
+        })
+
+
+_current: contextvars.ContextVar[Optional[List[StageRecord]]] = contextvars.ContextVar("stages", default=None)
+
+
+class _Stage:
+    def __init__(self, rows: Optional[int]):
+        self.rows = rows
+
+
+@contextlib.contextmanager
+def stage(name: str, rows: Optional[int] = None) -> Iterator[_Stage]:
+    """
+    Time a stage of the current run, e.g. `with stage("filter") as s: ...`.
+
+    Set `s.rows` inside the block to record how many rows the stage handled.
+    Outside a run the block still executes but nothing is recorded.
+    """
+    records = _current.get()
+    handle = _Stage(rows)
+    if records is None:
+        yield handle
+        return
+    start = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        records.append(StageRecord(name, time.perf_counter() - start, handle.rows))
+
+
+@contextlib.contextmanager
+def capture() -> Iterator[List[StageRecord]]:
+    """
+    Collect stage records into a list, e.g. in a worker process whose records
+    are sent back to the parent and passed to `record_all`.
+    """
+    records: List[StageRecord] = []
+    token = _current.set(records)
+    try:
+        yield records
+    finally:
+        _current.reset(token)
+
+
+def record_all(records: List[StageRecord]) -> None:
+    """Add records collected elsewhere to the current run, if there is one."""
+    current = _current.get()
+    if current is not None:
+        current.extend(records)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident memory of this process since it started, from getrusage."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+@contextlib.contextmanager
+def run(name: str, counters: Optional[Callable[[], Dict[str, int]]] = None) -> Iterator[Optional[RerunRecord]]:
+    """
+    Record the stages of one rerun and log them as a JSON line when it ends.
+
+    Args:
+        name: Name of the run, e.g. the fragment it renders
+        counters: Returns cumulative counters (e.g. cache hits); the run
+            records how much each one moved
+
+    Nested runs (e.g. a fragment rendered during a full rerun) are folded
+    into the outer run and yield None. Stages only count inside a run, so
+    work on background threads (e.g. loading the dataset) needs its own.
+    """
+    if _current.get() is not None:
+        yield None
+        return
+
+    rerun = RerunRecord(name)
+    before = counters() if counters else {}
+    start = time.perf_counter()
+    with capture() as records:
+        try:
+            yield rerun
+        finally:
+            rerun.seconds = time.perf_counter() - start
+            rerun.stages = records
+            after = counters() if counters else {}
+            rerun.counters = {key: after[key] - before[key] for key in after if key in before}
+            rerun.process_peak_rss_bytes = peak_rss_bytes()
+            logger.info(rerun.to_log())
+
+
+def profile(func, *args, **kwargs):
+    """
+    Run a function under cProfile.
+
+    Returns:
+        Tuple of the function's result and the profile's statistics as text,
+        sorted by cumulative time
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(40)
+    return result, output.getvalue()
+
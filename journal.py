@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+import snapshot
+from sighting_table import SightingTable
+from species_registry import UNKNOWN_SPECIES_ID, SpeciesRegistry
+
+# Seconds between checks for journal sightings to compact; 0 turns the compactor off
+COMPACT_INTERVAL = float(os.environ.get("HEAL_COMPACT_INTERVAL", "60"))
+
+# Sightings the journal must hold before it is compacted
+COMPACT_MIN_RECORDS = 200
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    """One sighting entered by hand: a species' count in one survey column."""
+    date: date
+    species: str
+    field_section: str
+    surveyors: str
+    count: int
+
+
+class SightingJournal:
+    """
+    Append-only log of sightings entered in the dashboard, in JSON Lines.
+
+    Every sighting gets the next sequence number, so a dataset built from the
+    journal up to some number only has to read the sightings after it to
+    catch up. `compact` folds the log into a columnar snapshot beside it
+    (the same path with an .arrow suffix) and truncates it, so loading costs
+    one memory-mapped read plus the sightings entered since.
+
+    A line cut short by a crash is skipped rather than failing the read. The
+    journal expects one writing process, e.g. the dashboard; others may read
+    it at any time.
+    """
+
+    def __init__(self, path: Path, registry: SpeciesRegistry):
+        self.path = Path(path)
+        self.snapshot_path = self.path.with_suffix(".arrow")
+        self.registry = registry
+        self._lock = threading.Lock()  # Appends and rewrites of the log
+        self._compact_lock = threading.Lock()
+        self._stats: Optional[Tuple] = None
+        self._last_seq = 0
+        self._snapshot_seq = 0
+
+    def _file_stats(self) -> Tuple:
+        stats = []
+        for path in (self.path, self.snapshot_path):
+            try:
+                stat = path.stat()
+                stats.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def _read_records(self) -> Tuple[List[Dict[str, object]], int]:
+        """
+        Every complete record in the log, and the offset just past the last
+        one. Called with the lock held.
+        """
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b"\n") + 1
+        records = []
+        for number, line in enumerate(data[:end].splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                records.append({"seq": int(record["seq"]), "date": date.fromisoformat(record["date"]),
+                                "species": str(record["species"]), "field_section": str(record["field_section"]),
+                                "surveyors": str(record["surveyors"]), "count": int(record["count"])})
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Warning: Skipping unreadable line {number} of {self.path}: {e}")
+        return records, end
+
+    def _read_snapshot(self) -> Tuple[Optional[pa.Table], int]:
+        """The compacted sightings and the last sequence number they hold."""
+        table = snapshot.load_journal_snapshot(self.snapshot_path)
+        if table is None:
+            return None, 0
+        return table, int((table.schema.metadata or {}).get(b"last_seq", b"0"))
+
+    def _refresh(self) -> None:
+        """Re-read the sequence numbers if either file changed. Called with the lock held."""
+        stats = self._file_stats()
+        if stats == self._stats:
+            return
+        records, _ = self._read_records()
+        _, self._snapshot_seq = self._read_snapshot()
+        self._last_seq = max([self._snapshot_seq] + [record["seq"] for record in records])
+        self._stats = stats
+
+    def last_seq(self) -> int:
+        """Sequence number of the last sighting entered, 0 if none; cheap while the files are unchanged."""
+        with self._lock:
+            self._refresh()
+            return self._last_seq
+
+    def pending(self) -> int:
+        """Number of sightings in the log that haven't been compacted."""
+        with self._lock:
+            self._refresh()
+            return self._last_seq - self._snapshot_seq
+
+    def append(self, entries: Sequence[JournalEntry]) -> Tuple[int, int]:
+        """
+        Write sightings to the end of the log, flushed to disk before returning.
+
+        Returns:
+            The first and last sequence numbers given to them
+
+        Raises:
+            ValueError: if a sighting names a species missing from the
+                registry, has no field section or surveyors, or a count below 1
+        """
+        lines = []
+        for entry in entries:
+            species_id = self.registry.id_of(entry.species)
+            if species_id == UNKNOWN_SPECIES_ID:
+                raise ValueError(f"Unknown species '{entry.species}'")
+            if not entry.field_section.strip() or not entry.surveyors.strip():
+                raise ValueError("Every sighting needs a field section and surveyors")
+            if int(entry.count) < 1:
+                raise ValueError(f"Count of {entry.species} must be at least 1")
+            lines.append({"date": entry.date.isoformat(), "species": self.registry.species[species_id].name,
+                          "field_section": entry.field_section.strip(), "surveyors": entry.surveyors.strip(),
+                          "count": int(entry.count)})
+
+        entered_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock:
+            self._refresh()
+            first = self._last_seq + 1
+            data = "".join(json.dumps({"seq": first + i, **line, "entered_at": entered_at}) + "\n"
+                           for i, line in enumerate(lines))
+            with open(self.path, "ab+") as f:
+                # Start on a fresh line if the last write was cut short
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = "\n" + data
+                f.write(data.encode())
+                f.flush()
+                os.fsync(f.fileno())
+            self._last_seq = first + len(lines) - 1
+            self._stats = self._file_stats()
+        return first, self._last_seq
+
+    def _table(self, records: List[Dict[str, object]]) -> SightingTable:
+        return SightingTable.from_columns(
+            self.registry,
+            np.array([self.registry.id_of(r["species"]) for r in records], dtype=np.int16),
+            [r["date"] for r in records], [r["field_section"] for r in records],
+            [r["surveyors"] for r in records], [r["count"] for r in records]
+        )
+
+    def read(self, after_seq: int = 0, until_seq: Optional[int] = None) -> SightingTable:
+        """
+        Sightings with sequence numbers after `after_seq` and up to
+        `until_seq`, in the order they were entered. Records naming species
+        no longer in the registry are skipped.
+        """
+        with self._lock:
+            records, _ = self._read_records()
+            compacted, snapshot_seq = self._read_snapshot()
+        until_seq = np.iinfo(np.int64).max if until_seq is None else until_seq
+
+        tables = []
+        if compacted is not None and after_seq < snapshot_seq:
+            seqs = compacted.column("seq").to_numpy()
+            kept = compacted.take(np.flatnonzero((seqs > after_seq) & (seqs <= until_seq)))
+            try:
+                tables.append(SightingTable.from_arrow(self.registry, kept))
+            except ValueError as e:
+                print(f"Warning: Skipping compacted journal sightings: {e}")
+
+        # The log may still hold sightings a crash stopped compaction from removing
+        records = [r for r in records if max(after_seq, snapshot_seq) < r["seq"] <= until_seq]
+        unknown = [r for r in records if self.registry.id_of(r["species"]) == UNKNOWN_SPECIES_ID]
+        if unknown:
+            print(f"Warning: Skipping {len(unknown)} journal sightings of species not in the registry")
+            records = [r for r in records if self.registry.id_of(r["species"]) != UNKNOWN_SPECIES_ID]
+        tables.append(self._table(records))
+        return tables[0] if len(tables) == 1 else tables[0].append(tables[1])
+
+    def compact(self) -> int:
+        """
+        Fold the sightings in the log into the columnar snapshot, then drop
+        them from the log. Sightings appended meanwhile stay in the log.
+
+        Returns:
+            Number of sightings folded in
+        """
+        with self._compact_lock:
+            with self._lock:
+                records, end = self._read_records()
+                compacted, snapshot_seq = self._read_snapshot()
+            records = [r for r in records if r["seq"] > snapshot_seq]
+
+            if records:
+                table = self._table(records)
+                seqs = np.array([r["seq"] for r in records], dtype=np.int64)
+                if compacted is not None:
+                    table = SightingTable.from_arrow(self.registry, compacted).append(table)
+                    seqs = np.concatenate([compacted.column("seq").to_numpy(), seqs])
+                arrow = table.to_arrow().append_column("seq", pa.array(seqs, pa.int64()))
+                if snapshot.write_journal_snapshot(self.snapshot_path, arrow, int(seqs[-1])) is None:
+                    return 0
+
+            if end:
+                with self._lock:
+                    with open(self.path, "rb") as f:
+                        f.seek(end)
+                        rest = f.read()
+                    tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                    with open(tmp_path, "wb") as f:
+                        f.write(rest)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                    self._stats = None
+        if records:
+            print(f"Compacted {len(records)} journal sightings into {self.snapshot_path}")
+        return len(records)
+
+
+class JournalCompactor(threading.Thread):
+    """
+    Background thread that compacts the journal once it holds at least
+    `min_records` sightings, so the log read on load stays short.
+    """
+
+    def __init__(self, journal: SightingJournal, interval: float = COMPACT_INTERVAL,
+                 min_records: int = COMPACT_MIN_RECORDS):
+        super().__init__(name="journal-compactor", daemon=True)
+        self.journal = journal
+        self.interval = interval
+        self.min_records = min_records
+        self._stop_event = threading.Event()
+        self.compactions = 0
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                if self.journal.pending() >= self.min_records:
+                    self.journal.compact()
+                    self.compactions += 1
+            except Exception as e:
+                # Keep the journal as it is; the next check may succeed
+                print(f"Warning: Compacting the journal failed: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_compactors: Dict[Path, JournalCompactor] = {}
+_compactors_lock = threading.Lock()
+
+
+def start_compactor(journal: SightingJournal, interval: float = COMPACT_INTERVAL,
+                    min_records: int = COMPACT_MIN_RECORDS) -> JournalCompactor:
+    """Start the process-wide compactor of a journal, unless it is already running."""
+    with _compactors_lock:
+        compactor = _compactors.get(journal.path)
+        if compactor is None or not compactor.is_alive():
+            compactor = JournalCompactor(journal, interval, min_records)
+            compactor.start()
+            _compactors[journal.path] = compactor
+        return compactor
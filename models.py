@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from datetime import date
+
+
+@dataclass
+class Species:
+    name: str
+    category: str
+
+
+@dataclass
+class Sighting:
+    species: Species
+    surveyors: str
+    date: date
+    field_section: str
+    count: int
@@ -0,0 +1,206 @@
+"""
+Precompute the dashboard's aggregates for every filter combination and write
+them as static JSON and HTML reports, without a Streamlit session.
+
+Each conservation status, year and field section is taken on its own and all
+together, and every combination of the three gets a report with its species
+totals and monthly timeline:
+
+    python reports.py
+    python reports.py --out site/ --workers 4
+
+The dashboard seeds its figure cache from the reports on startup when they
+were built from the dataset and exclusions it has loaded.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from html import escape
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import plotly.express as px
+import plotly.io
+import plotly.offline
+
+import dashboard
+from sighting_table import SightingTable
+from validation import exclusion_mask, sighting_keys
+
+# Conservation statuses, years and field sections of one report; None means all of them
+Filters = Tuple[Optional[List[str]], Optional[List[int]], Optional[List[str]]]
+
+FILTER_NAMES = ("conservation_statuses", "years", "locations")
+
+# Set in each worker process by _init_worker
+_sightings: Optional[SightingTable] = None
+
+
+def filter_combinations(statuses: Sequence[str], years: Sequence[int], locations: Sequence[str]) -> List[Filters]:
+    """Every combination of one value or all values of each filter."""
+    def choices(values):
+        return [None] + [[value] for value in values]
+
+    return list(itertools.product(choices(statuses), choices(years), choices(locations)))
+
+
+def report_name(filters: Filters) -> str:
+    """File name stem of a report, e.g. "status-red_year-all_location-northern"."""
+    parts = []
+    for label, values in zip(("status", "year", "location"), filters):
+        value = "all" if values is None else "-".join(str(v).lower().replace(" ", "-") for v in values)
+        parts.append(f"{label}-{value}")
+    return "_".join(parts)
+
+
+def describe_filters(filters: Filters) -> str:
+    labels = ("Conservation status", "Year", "Location")
+    return ", ".join(f"{label}: {'All' if values is None else ', '.join(map(str, values))}"
+                     for label, values in zip(labels, filters))
+
+
+def create_monthly_chart(monthly: pd.DataFrame):
+    """Bar chart of the total count per month, or None when nothing was seen."""
+    if monthly.empty:
+        return None
+    fig = px.bar(monthly, x="Month", y="Count", hover_data=["Species"], title="Monthly Sightings",
+                 labels={"Count": "Total Birds Counted", "Species": "Species Seen"})
+    fig.update_layout(height=400, xaxis={"tickangle": 45})
+    return fig
+
+
+def _init_worker(sightings: SightingTable) -> None:
+    global _sightings
+    _sightings = sightings
+
+
+def build_report(filters: Filters, out_dir: Path, context: Dict[str, object]) -> Dict[str, object]:
+    """
+    Write the JSON and HTML report for one filter combination.
+
+    Runs in worker processes; the sightings were handed over once, by
+    `_init_worker`, and their count cube is built once per worker.
+
+    Returns:
+        The report's manifest entry
+    """
+    aggregates = _sightings.count_cube
+    species_totals = aggregates.species_totals(*filters).drop(columns="species_id")
+    monthly = aggregates.monthly_summary(*filters)
+    species_chart = dashboard.create_species_chart(_sightings, *filters)
+    monthly_chart = create_monthly_chart(monthly)
+
+    name = report_name(filters)
+    report = {
+        **context,
+        "filters": dict(zip(FILTER_NAMES, filters)),
+        "species_observed": len(species_totals),
+        "species_totals": json.loads(species_totals.to_json(orient="records")),
+        "monthly": json.loads(monthly.to_json(orient="records")),
+        "species_chart": json.loads(plotly.io.to_json(species_chart, validate=False)),
+    }
+    (out_dir / f"{name}.json").write_text(json.dumps(report))
+
+    charts = [species_chart] + ([monthly_chart] if monthly_chart is not None else [])
+    title = escape(describe_filters(filters))
+    (out_dir / f"{name}.html").write_text(
+        f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{title}</title>"
+        f"<script src=\"plotly.min.js\"></script></head><body>\n"
+        f"<p><a href=\"index.html\">All reports</a></p>\n"
+        f"<h1>Heal Somerset Bird Survey</h1>\n<h2>{title}</h2>\n"
+        f"<p>{len(species_totals)} species observed. Workbook version {escape(context['workbook_version'])}, "
+        f"generated {escape(context['generated_at'])}.</p>\n"
+        + "\n".join(chart.to_html(full_html=False, include_plotlyjs=False) for chart in charts) +
+        f"\n{species_totals.to_html(index=False)}\n</body></html>\n"
+    )
+    return {"name": name, "filters": report["filters"], "json": f"{name}.json", "html": f"{name}.html",
+            "species_observed": len(species_totals)}
+
+
+def build_reports(sightings: SightingTable, combinations: Sequence[Filters], out_dir: Path,
+                  context: Dict[str, object], max_workers: Optional[int] = None) -> List[Dict[str, object]]:
+    """Write every report, in a process pool when there are several cores."""
+    workers = min(len(combinations), max_workers or os.cpu_count() or 1)
+    args = [(filters, out_dir, context) for filters in combinations]
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(sightings,)) as pool:
+                return list(pool.map(build_report, *zip(*args), chunksize=max(1, len(args) // (workers * 4))))
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Warning: Building reports in parallel failed, building serially: {e}")
+
+    _init_worker(sightings)
+    return [build_report(*a) for a in args]
+
+
+def write_index(out_dir: Path, entries: List[Dict[str, object]], context: Dict[str, object]) -> None:
+    rows = "\n".join(
+        f"<tr><td><a href=\"{escape(entry['html'])}\">{escape(describe_filters(tuple(entry['filters'].values())))}"
+        f"</a></td><td>{entry['species_observed']}</td><td><a href=\"{escape(entry['json'])}\">JSON</a></td></tr>"
+        for entry in entries
+    )
+    (out_dir / "index.html").write_text(
+        f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Heal Somerset Bird Survey Reports</title>"
+        f"</head><body>\n<h1>Heal Somerset Bird Survey Reports</h1>\n"
+        f"<p>Workbook version {escape(context['workbook_version'])}, generated {escape(context['generated_at'])}."
+        f"</p>\n<table>\n<tr><th>Filters</th><th>Species observed</th><th>Data</th></tr>\n{rows}\n</table>\n"
+        f"</body></html>\n"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute reports for every filter combination.")
+    parser.add_argument("--out", type=Path, default=dashboard.REPORTS_DIR, help="Directory to write reports to")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # The version is taken before loading, as the dashboard does, so an edit mid-load isn't missed
+    version = dashboard.workbook_version()
+    journal_seq = dashboard.journal.last_seq()
+    sightings = dashboard.append_journal_sightings(dashboard.get_bird_sightings(), 0, journal_seq)
+    if not len(sightings):
+        sys.exit("No sightings could be loaded")
+
+    # Reports show what the dashboard shows, so sightings it excludes are left out
+    state = dashboard.exclusion_overlay.state()
+    exclusions = exclusion_mask(sighting_keys(sightings), sightings.issues, state)
+    visible = sightings[~exclusions.excluded]
+    aggregates = visible.count_cube
+    combinations = filter_combinations(dashboard.SPECIES_REGISTRY.categories, aggregates.years(),
+                                       aggregates.location_names())
+
+    context = {
+        "workbook_version": version,
+        "journal_seq": journal_seq,
+        "exclusions_version": state[0],
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    # Reports are written into a fresh directory and swapped in, so readers never see a half-written set
+    tmp_dir = args.out.with_name(f"{args.out.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    (tmp_dir / "plotly.min.js").write_text(plotly.offline.get_plotlyjs())
+    entries = build_reports(visible, combinations, tmp_dir, context, args.workers)
+    write_index(tmp_dir, entries, context)
+    # The dashboard keys its "all" charts on these, as the years and locations its overview offers
+    manifest = {**context, "years": aggregates.years(), "locations": aggregates.location_names(), "reports": entries}
+    (tmp_dir / dashboard.REPORT_MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    shutil.rmtree(args.out, ignore_errors=True)
+    tmp_dir.rename(args.out)
+    print(f"Wrote {len(entries)} reports for {len(visible)} sightings "
+          f"({exclusions.count} excluded) to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
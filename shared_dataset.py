@@ -0,0 +1,173 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+import pandas as pd
+
+T = TypeVar("T")
+
+
+class SharedDataset(Generic[T]):
+    """
+    One read-only dataset shared by every session in the process.
+
+    Streamlit re-runs the app script for each session and interaction, so
+    anything the script builds is per-session. A SharedDataset lives in an
+    imported module instead, so all sessions reference the same object and
+    only their filter state is per-session. Loads happen behind a lock:
+    concurrent first visitors wait for one load rather than each starting
+    their own. The dataset is reloaded when the version passed in changes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # One background reload at a time
+        self._build_locks: Dict[str, threading.Lock] = {}  # One build per derived value name at a time
+        # (version, dataset, derived values by name as (key, value)), swapped as
+        # one object so readers need no lock
+        self._current: Tuple[Optional[str], Optional[T], Dict[str, Tuple[Hashable, Any]]] = (None, None, {})
+        self.load_count = 0
+        self.update_count = 0
+        self.loaded_at: Optional[float] = None
+        self.load_seconds = 0.0
+
+    def get(self, version: str, load: Callable[[], T]) -> T:
+        """Return the dataset for a version, loading it if it isn't the one held."""
+        current_version, value, _ = self._current
+        if current_version == version:
+            return value
+
+        with self._lock:
+            current_version, value, _ = self._current
+            if current_version == version:
+                return value
+            start = time.perf_counter()
+            value = load()
+            self._current = (version, value, {})
+            self.load_count += 1
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - start
+
+        print(f"Loaded shared dataset '{self.name}' version {version} in {self.load_seconds:.2f}s: "
+              f"{len(value)} rows, {self.resident_nbytes / 1e6:.1f} MB resident "
+              f"(load {self.load_count})")
+        return value
+
+    def refresh(self, version: str, load: Callable[[], T]) -> T:
+        """
+        Load a new version without blocking readers and swap it in.
+
+        Unlike `get`, sessions keep being served the current dataset while
+        the new one loads; the swap replaces dataset and derived values at
+        once. Meant to be called from a background thread.
+        """
+        with self._refresh_lock:
+            if self._current[0] == version:
+                return self._current[1]
+            start = time.perf_counter()
+            value = load()
+            with self._lock:
+                self._current = (version, value, {})
+                self.load_count += 1
+                self.loaded_at = time.time()
+                self.load_seconds = time.perf_counter() - start
+
+        print(f"Swapped in shared dataset '{self.name}' version {version} in {self.load_seconds:.2f}s: "
+              f"{len(value)} rows, {self.resident_nbytes / 1e6:.1f} MB resident "
+              f"(load {self.load_count})")
+        return value
+
+    def update(self, version: str,
+               update: Callable[[Optional[str], T, Dict[str, Tuple[Hashable, Any]]],
+                                Tuple[T, Dict[str, Tuple[Hashable, Any]]]]) -> T:
+        """
+        Swap in a version derived from the one held, e.g. with rows appended.
+
+        `update` gets the version, dataset and derived values held and
+        returns the new dataset with whichever derived values it carries
+        over. As with `refresh`, sessions keep being served the current
+        dataset meanwhile; if it was replaced in the meantime, the update is
+        dropped.
+        """
+        with self._refresh_lock:
+            current_version, value, derived = self._current
+            if current_version == version:
+                return value
+            start = time.perf_counter()
+            new_value, new_derived = update(current_version, value, dict(derived))
+            with self._lock:
+                if self._current[1] is not value:
+                    return self._current[1]
+                self._current = (version, new_value, new_derived)
+                self.update_count += 1
+            seconds = time.perf_counter() - start
+
+        print(f"Updated shared dataset '{self.name}' to version {version} in {seconds:.3f}s: "
+              f"{len(new_value)} rows (update {self.update_count})")
+        return new_value
+
+    def current(self) -> Tuple[Optional[str], Optional[T]]:
+        """The version and dataset currently held, read together."""
+        version, value, _ = self._current
+        return version, value
+
+    def derived(self, value: T, name: str, build: Callable[[], Any], key: Hashable = None) -> Any:
+        """
+        Return a value derived from the dataset (e.g. a view's DataFrame),
+        building it once per dataset version.
+
+        `value` is the dataset the caller holds; if it has since been
+        replaced, the result is built for the caller but not kept. `key`
+        identifies anything else the value depends on (e.g. the exclusions
+        version); only the value for the latest key is kept under a name.
+        """
+        _, current, derived = self._current
+        if current is not value:
+            return build()
+        entry = derived.get(name)
+        if entry is None or entry[0] != key:
+            # Built outside the dataset lock, so a slow build (e.g. an export)
+            # only holds up callers waiting for the same value
+            with self._lock:
+                build_lock = self._build_locks.setdefault(name, threading.Lock())
+            with build_lock:
+                entry = derived.get(name)
+                if entry is None or entry[0] != key:
+                    entry = derived[name] = (key, build())
+        return entry[1]
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._current[0]
+
+    @property
+    def value(self) -> Optional[T]:
+        """The dataset currently held, or None if nothing has been loaded."""
+        return self._current[1]
+
+    @property
+    def resident_nbytes(self) -> int:
+        """Memory held by the current dataset and its derived values, or 0 if none is loaded."""
+        _, value, derived = self._current
+        return getattr(value, "resident_nbytes", 0) + sum(_nbytes(d) for _, d in list(derived.values()))
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return getattr(value, "nbytes", 0)
+
+
+_datasets: Dict[str, SharedDataset] = {}
+_datasets_lock = threading.Lock()
+
+
+def shared_dataset(name: str) -> SharedDataset:
+    """The process-wide SharedDataset with the given name, created on first use."""
+    with _datasets_lock:
+        if name not in _datasets:
+            _datasets[name] = SharedDataset(name)
+        return _datasets[name]
@@ -0,0 +1,258 @@
+from datetime import date
+from functools import cached_property
+from typing import Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from count_cube import CountCube
+from filter_index import FilterIndex
+from models import Sighting
+from species_registry import UNKNOWN_SPECIES_ID, SpeciesRegistry
+
+# Raw Data columns a table can be sorted on
+SORT_COLUMNS = ["Date", "Species", "Conservation Status", "Count", "Location", "Surveyors"]
+
+# date.toordinal() of 1970-01-01, for converting to and from datetime64[D]
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class SightingTable:
+    """
+    Columnar store of sightings.
+
+    Each sighting is one position across parallel NumPy arrays of codes:
+    species IDs index `registry.species`, location and surveyor codes index
+    `locations` and `surveyors`, and dates are `date.toordinal()` values.
+    Indexing with an int returns a `Sighting` built on demand, so code that
+    iterates sightings keeps working; indexing with a mask or positions
+    returns a new table sharing the same lookups.
+
+    `issues` holds the validation rules each sighting breaks, as bits of
+    `validation.RULES`; it is filled in at ingest and zero otherwise.
+    """
+
+    def __init__(self, registry: SpeciesRegistry, species_id: np.ndarray, ordinal: np.ndarray,
+                 location_code: np.ndarray, locations: List[str],
+                 surveyor_code: np.ndarray, surveyors: List[str], count: np.ndarray,
+                 issues: Optional[np.ndarray] = None):
+        self.registry = registry
+        self.species_id = np.asarray(species_id, dtype=np.int16)
+        self.category_code = registry.category_codes[self.species_id]
+        self.ordinal = np.asarray(ordinal, dtype=np.int32)
+        self.location_code = np.asarray(location_code, dtype=np.int16)
+        self.locations = list(locations)
+        self.surveyor_code = np.asarray(surveyor_code, dtype=np.int32)
+        self.surveyors = list(surveyors)
+        self.count = np.asarray(count, dtype=np.int32)
+        self.issues = (np.zeros(len(self.count), dtype=np.uint8) if issues is None
+                       else np.asarray(issues, dtype=np.uint8))
+
+    @classmethod
+    def empty(cls, registry: SpeciesRegistry) -> "SightingTable":
+        no_rows = np.empty(0, dtype=np.int32)
+        return cls(registry, no_rows, no_rows, no_rows, [], no_rows, [], no_rows)
+
+    @classmethod
+    def from_columns(cls, registry: SpeciesRegistry, species_id: Sequence[int], dates: Sequence[date],
+                     field_sections: Sequence[str], surveyors: Sequence[str],
+                     counts: Sequence[int]) -> "SightingTable":
+        """Build a table from one value per sighting, encoding the strings."""
+        location_code, locations = pd.factorize(pd.Series(field_sections, dtype=object), sort=True)
+        surveyor_code, surveyor_names = pd.factorize(pd.Series(surveyors, dtype=object), sort=True)
+        ordinal = np.fromiter((d.toordinal() for d in dates), dtype=np.int32, count=len(dates))
+        return cls(registry, species_id, ordinal, location_code, locations.tolist(),
+                   surveyor_code, surveyor_names.tolist(), counts)
+
+    @classmethod
+    def concat(cls, registry: SpeciesRegistry, tables: Sequence["SightingTable"]) -> "SightingTable":
+        """Join tables built against the same registry, re-encoding their strings."""
+        if not tables:
+            return cls.empty(registry)
+
+        def merge(codes: List[np.ndarray], names: List[List[str]]):
+            merged = pd.Index(sorted(set().union(*names)), dtype=object)
+            return np.concatenate([merged.get_indexer(n)[c] for c, n in zip(codes, names)]), merged.tolist()
+
+        location_code, locations = merge([t.location_code for t in tables], [t.locations for t in tables])
+        surveyor_code, surveyors = merge([t.surveyor_code for t in tables], [t.surveyors for t in tables])
+        return cls(registry,
+                   np.concatenate([t.species_id for t in tables]),
+                   np.concatenate([t.ordinal for t in tables]),
+                   location_code, locations, surveyor_code, surveyors,
+                   np.concatenate([t.count for t in tables]),
+                   np.concatenate([t.issues for t in tables]))
+
+    def append(self, other: "SightingTable") -> "SightingTable":
+        """
+        This table followed by another built against the same registry.
+
+        Unlike `concat`, this table's codes are kept and names new to it get
+        the next codes, so the derived columns, filter index and count cube
+        it has already built are extended by the new rows rather than
+        rebuilt. The new table's issues are those of both tables.
+        """
+        def extend(codes: np.ndarray, names: List[str], other_codes: np.ndarray, other_names: List[str]):
+            known = set(names)
+            merged = list(names) + [name for name in other_names if name not in known]
+            mapping = pd.Index(merged, dtype=object).get_indexer(other_names)
+            return np.concatenate([codes, mapping[other_codes] if len(other_codes) else other_codes]), merged
+
+        location_code, locations = extend(self.location_code, self.locations, other.location_code, other.locations)
+        surveyor_code, surveyors = extend(self.surveyor_code, self.surveyors, other.surveyor_code, other.surveyors)
+        table = SightingTable(self.registry,
+                              np.concatenate([self.species_id, other.species_id]),
+                              np.concatenate([self.ordinal, other.ordinal]),
+                              location_code, locations, surveyor_code, surveyors,
+                              np.concatenate([self.count, other.count]),
+                              np.concatenate([self.issues, other.issues]))
+
+        start = len(self)
+        for name in ("day", "year", "month"):
+            if name in self.__dict__:
+                table.__dict__[name] = np.concatenate([self.__dict__[name], getattr(other, name)])
+        if "filter_index" in self.__dict__:
+            table.__dict__["filter_index"] = self.filter_index.extended(table, start)
+        if "count_cube" in self.__dict__:
+            table.__dict__["count_cube"] = self.count_cube.extended(table, start)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.species_id)
+
+    def __iter__(self) -> Iterator[Sighting]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key: Union[int, slice, np.ndarray]) -> Union[Sighting, "SightingTable"]:
+        if isinstance(key, (int, np.integer)):
+            return Sighting(
+                species=self.registry.species[self.species_id[key]],
+                surveyors=self.surveyors[self.surveyor_code[key]],
+                date=date.fromordinal(int(self.ordinal[key])),
+                field_section=self.locations[self.location_code[key]],
+                count=int(self.count[key])
+            )
+        return SightingTable(self.registry, self.species_id[key], self.ordinal[key],
+                             self.location_code[key], self.locations,
+                             self.surveyor_code[key], self.surveyors, self.count[key], self.issues[key])
+
+    @cached_property
+    def day(self) -> np.ndarray:
+        """Dates as datetime64[D]."""
+        return (self.ordinal - EPOCH_ORDINAL).astype("datetime64[D]")
+
+    @cached_property
+    def year(self) -> np.ndarray:
+        return self.day.astype("datetime64[Y]").astype(np.int32) + 1970
+
+    @cached_property
+    def month(self) -> np.ndarray:
+        """Months since January 1970, for grouping by year and month."""
+        return self.day.astype("datetime64[M]").astype(np.int32)
+
+    @cached_property
+    def filter_index(self) -> FilterIndex:
+        """Bitmap index for `filter_sightings`, built on first use."""
+        return FilterIndex(self)
+
+    @cached_property
+    def count_cube(self) -> CountCube:
+        """Species x month x field section counts, built on first use."""
+        return CountCube(self)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the per-sighting arrays."""
+        return sum(a.nbytes for a in (self.species_id, self.category_code, self.ordinal,
+                                      self.location_code, self.surveyor_code, self.count, self.issues))
+
+    @property
+    def resident_nbytes(self) -> int:
+        """Memory held by the table plus whatever derived columns and indexes have been built."""
+        derived = [self.__dict__[name] for name in ("day", "year", "month", "filter_index", "count_cube")
+                   if name in self.__dict__]
+        return self.nbytes + sum(d.nbytes for d in derived)
+
+    def species_names(self) -> np.ndarray:
+        """Species name per sighting."""
+        names = np.array([s.name for s in self.registry.species], dtype=object)
+        return names[self.species_id]
+
+    def sort_order(self, column: str, ascending: bool = True) -> np.ndarray:
+        """Positions ordered by one of SORT_COLUMNS, ties in table order."""
+        def ranked(codes: np.ndarray, names: List[str]) -> np.ndarray:
+            # Rank of each code's name, so codes sort as their names would
+            rank = np.empty(len(names), dtype=np.int64)
+            rank[np.argsort(np.array(names, dtype=str), kind="stable")] = np.arange(len(names))
+            return rank[codes]
+
+        keys = {
+            "Date": lambda: self.ordinal,
+            "Species": lambda: ranked(self.species_id, [s.name for s in self.registry.species]),
+            "Conservation Status": lambda: self.category_code,  # Categories are sorted by name
+            "Count": lambda: self.count,
+            "Location": lambda: ranked(self.location_code, self.locations),
+            "Surveyors": lambda: ranked(self.surveyor_code, self.surveyors),
+        }
+        if column not in keys:
+            raise ValueError(f"Cannot sort on '{column}'")
+        key = keys[column]().astype(np.int64)
+        return np.argsort(key if ascending else -key, kind="stable")
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per sighting, with the columns shown in the Raw Data tab."""
+        categories = np.array(self.registry.categories, dtype=object)
+        return pd.DataFrame({
+            "Date": [date.fromordinal(o) for o in self.ordinal.tolist()],
+            "Species": self.species_names(),
+            "Conservation Status": categories[self.category_code],
+            "Count": self.count,
+            "Location": np.array(self.locations, dtype=object)[self.location_code],
+            "Surveyors": np.array(self.surveyors, dtype=object)[self.surveyor_code],
+        })
+
+    def to_arrow(self) -> pa.Table:
+        """Arrow table with dictionary-encoded strings, for snapshots."""
+        def encoded(codes: np.ndarray, names: List[str]) -> pa.DictionaryArray:
+            return pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), pa.array(names, pa.string()))
+
+        return pa.table({
+            "species": encoded(self.species_id, [s.name for s in self.registry.species]),
+            "category": encoded(self.category_code, self.registry.categories),
+            "surveyors": encoded(self.surveyor_code, self.surveyors),
+            "date": pa.array(self.ordinal - EPOCH_ORDINAL, pa.int32()).cast(pa.date32()),
+            "field_section": encoded(self.location_code, self.locations),
+            "count": pa.array(self.count, pa.int32()),
+            "issues": pa.array(self.issues, pa.uint8()),
+        })
+
+    @classmethod
+    def from_arrow(cls, registry: SpeciesRegistry, table: pa.Table) -> "SightingTable":
+        """
+        Rebuild a table written by `to_arrow`.
+
+        Raises:
+            ValueError: if the table names species missing from the registry
+        """
+        def decoded(name: str):
+            column = table.column(name).combine_chunks()
+            if not isinstance(column, pa.DictionaryArray):
+                column = column.dictionary_encode()
+            return column.indices.to_numpy(zero_copy_only=False), column.dictionary.to_pylist()
+
+        species_code, species_names = decoded("species")
+        registry_ids = np.array([registry.id_of(name) for name in species_names], dtype=np.int16)
+        if (registry_ids == UNKNOWN_SPECIES_ID).any():
+            raise ValueError("Snapshot contains species that are not in the registry")
+
+        location_code, locations = decoded("field_section")
+        surveyor_code, surveyors = decoded("surveyors")
+        days = table.column("date").combine_chunks().cast(pa.int32()).to_numpy(zero_copy_only=False)
+        return cls(registry,
+                   registry_ids[species_code] if len(species_code) else species_code,
+                   days + EPOCH_ORDINAL,
+                   location_code, locations, surveyor_code, surveyors,
+                   table.column("count").to_numpy(),
+                   table.column("issues").to_numpy() if "issues" in table.column_names else None)
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Set
+
+import pyarrow as pa
+
+# Bump when the snapshot schema changes so old files are rebuilt
+SNAPSHOT_VERSION = "3"
+SNAPSHOT_DIR = Path(".snapshots")
+
+
+def workbook_fingerprint(workbook_path: Path, with_hash: bool = True) -> Dict[str, str]:
+    """Return the size, mtime and (optionally) SHA-256 of a workbook."""
+    stat = workbook_path.stat()
+    fingerprint = {
+        "size": str(stat.st_size),
+        "mtime_ns": str(stat.st_mtime_ns),
+    }
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(workbook_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def dataset_version(workbook_paths: Sequence[Path], key: Dict[str, str]) -> str:
+    """
+    Cheap version of the dataset built from a set of workbooks, from their
+    paths, sizes and mtimes plus `key`. Changes whenever a workbook is
+    added, removed or saved.
+    """
+    stats = [(str(p), workbook_fingerprint(p, with_hash=False)) for p in workbook_paths]
+    return hashlib.sha256(json.dumps([SNAPSHOT_VERSION, key, stats], sort_keys=True).encode()).hexdigest()[:16]
+
+
+def snapshot_path() -> Path:
+    """Location of the snapshot of the whole dataset."""
+    return SNAPSHOT_DIR / "sightings.arrow"
+
+
+def sheet_snapshot_path(key: str) -> Path:
+    """Location of the snapshot of one sheet, named by its content fingerprint."""
+    return SNAPSHOT_DIR / "sheets" / f"{key}.arrow"
+
+
+def _read_metadata(path: Path) -> Dict[str, str]:
+    with pa.memory_map(str(path), "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    return {k.decode(): v.decode() for k, v in (schema.metadata or {}).items()}
+
+
+def _read_table(path: Path) -> pa.Table:
+    source = pa.memory_map(str(path), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def _write_table(path: Path, table: pa.Table, metadata: Dict[str, str]) -> Optional[Path]:
+    """
+    Write a table with its metadata.
+
+    The file is written next to its final location and renamed into place so
+    concurrent readers never see a partial snapshot.
+    """
+    table = table.replace_schema_metadata(dict(metadata, version=SNAPSHOT_VERSION))
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write snapshot '{path}': {e}")
+        tmp_path.unlink(missing_ok=True)
+        return None
+
+    return path
+
+
+def load_snapshot(workbook_paths: Sequence[Path], key: Dict[str, str]) -> Optional[pa.Table]:
+    """
+    Memory-map the dataset snapshot if it is still current.
+
+    The snapshot is current if it was built from the same workbooks with the
+    same `key` (e.g. the species registry version). Each workbook is trusted
+    straight away when its size and mtime are unchanged; if only the mtime
+    moved (e.g. the file was copied or touched) the content hash decides,
+    and a match records the new mtime.
+
+    Returns:
+        The snapshot table, or None if it is missing or stale
+    """
+    path = snapshot_path()
+    if not path.exists() or not workbook_paths:
+        return None
+
+    try:
+        metadata = _read_metadata(path)
+        recorded = json.loads(metadata.get("workbooks", "{}"))
+    except (OSError, ValueError, pa.ArrowInvalid) as e:
+        print(f"Warning: Ignoring unreadable snapshot '{path}': {e}")
+        return None
+
+    if metadata.get("version") != SNAPSHOT_VERSION:
+        return None
+    if any(metadata.get(name) != value for name, value in key.items()):
+        return None
+    if set(recorded) != {str(p) for p in workbook_paths}:
+        return None
+
+    touched = False
+    for workbook_path in workbook_paths:
+        fingerprint = recorded[str(workbook_path)]
+        if not workbook_path.exists():
+            return None
+        current = workbook_fingerprint(workbook_path, with_hash=False)
+        if current["size"] != fingerprint.get("size"):
+            return None
+        if current["mtime_ns"] != fingerprint.get("mtime_ns"):
+            current = workbook_fingerprint(workbook_path)
+            if current["sha256"] != fingerprint.get("sha256"):
+                return None
+            recorded[str(workbook_path)] = current
+            touched = True
+
+    table = _read_table(path)
+    if touched:
+        # Record the new mtimes so later loads trust the workbooks without hashing them again
+        _write_table(path, table, dict(metadata, workbooks=json.dumps(recorded)))
+    return table
+
+
+def write_snapshot(workbook_paths: Sequence[Path], table: pa.Table, key: Dict[str, str],
+                   fingerprints: Optional[Dict[Path, Dict[str, str]]] = None) -> Optional[Path]:
+    """
+    Write the dataset snapshot built from a set of workbooks.
+
+    Pass the fingerprints taken before parsing so a workbook edited mid-parse
+    is not recorded as current.
+
+    Returns:
+        Path of the snapshot, or None if it could not be written
+    """
+    if fingerprints is None:
+        fingerprints = {p: workbook_fingerprint(p) for p in workbook_paths}
+    workbooks = json.dumps({str(p): fingerprints[p] for p in workbook_paths})
+    return _write_table(snapshot_path(), table, dict(key, workbooks=workbooks))
+
+
+def load_sheet_snapshot(key: str) -> Optional[pa.Table]:
+    """Memory-map the snapshot of a sheet with the given fingerprint, if there is one."""
+    path = sheet_snapshot_path(key)
+    if not path.exists():
+        return None
+    try:
+        if _read_metadata(path).get("version") != SNAPSHOT_VERSION:
+            return None
+        return _read_table(path)
+    except (OSError, pa.ArrowInvalid) as e:
+        print(f"Warning: Ignoring unreadable snapshot '{path}': {e}")
+        return None
+
+
+def write_sheet_snapshot(key: str, table: pa.Table) -> Optional[Path]:
+    """Write the snapshot of a sheet with the given fingerprint."""
+    return _write_table(sheet_snapshot_path(key), table, {})
+
+
+def prune_sheet_snapshots(keep: Set[str]) -> None:
+    """Remove sheet snapshots whose fingerprints are no longer in use."""
+    for path in sheet_snapshot_path("").parent.glob("*.arrow"):
+        if path.stem not in keep:
+            path.unlink(missing_ok=True)
+
+
+def load_journal_snapshot(path: Path) -> Optional[pa.Table]:
+    """
+    Memory-map the compacted journal of entered sightings, if there is one.
+
+    Unlike the other snapshots it holds data found nowhere else, so it is
+    read whatever SNAPSHOT_VERSION wrote it.
+    """
+    if not path.exists():
+        return None
+    try:
+        return _read_table(path)
+    except (OSError, pa.ArrowInvalid) as e:
+        print(f"Warning: Could not read compacted journal '{path}': {e}")
+        return None
+
+
+def write_journal_snapshot(path: Path, table: pa.Table, last_seq: int) -> Optional[Path]:
+    """Write the compacted journal, holding the sightings up to sequence number `last_seq`."""
+    return _write_table(path, table, {"last_seq": str(last_seq)})
+
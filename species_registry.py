@@ -0,0 +1,89 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ID given to names that match no species
+UNKNOWN_SPECIES_ID = -1
+
+
+def normalise_name(name: str) -> str:
+    """Normalise a species name for matching: case, hyphens, commas, slashes and spacing are ignored."""
+    return " ".join(re.sub(r"[-,/]", " ", str(name)).casefold().split())
+
+
+@dataclass
+class SpeciesMatch:
+    ids: np.ndarray  # species ID per name, UNKNOWN_SPECIES_ID if unmatched
+    unknown: List[str] = field(default_factory=list)
+
+
+class SpeciesRegistry:
+    """
+    Hash index over the species list, handing out compact integer IDs.
+
+    IDs are positions in the species list, so `registry.species[id]` is the
+    Species object for an ID.
+    """
+
+    def __init__(self, species: Iterable, aliases: Optional[Dict[str, str]] = None):
+        self.species = list(species)
+        self._ids: Dict[str, int] = {}
+
+        for species_id, species_obj in enumerate(self.species):
+            key = normalise_name(species_obj.name)
+            if key in self._ids:
+                raise ValueError(f"Species '{species_obj.name}' clashes with "
+                                 f"'{self.species[self._ids[key]].name}'")
+            self._ids[key] = species_id
+
+        for alias, name in (aliases or {}).items():
+            key = normalise_name(alias)
+            if normalise_name(name) not in self._ids:
+                raise ValueError(f"Alias '{alias}' refers to unknown species '{name}'")
+            if key in self._ids:
+                raise ValueError(f"Alias '{alias}' clashes with an existing species or alias")
+            self._ids[key] = self._ids[normalise_name(name)]
+
+        # Changes whenever a name, category or alias changes, for keying cached data
+        self.version = hashlib.sha256(repr(
+            [(s.name, s.category) for s in self.species] + sorted(self._ids.items())
+        ).encode()).hexdigest()[:16]
+
+        self.categories = sorted(set(s.category for s in self.species))
+        # Category code per species ID, for vectorized filtering
+        self.category_codes = np.array([self.categories.index(s.category) for s in self.species], dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.species)
+
+    def id_of(self, name: str) -> int:
+        """Return the species ID for a name or alias, or UNKNOWN_SPECIES_ID."""
+        return self._ids.get(normalise_name(name), UNKNOWN_SPECIES_ID)
+
+    def resolve(self, names: pd.Series) -> SpeciesMatch:
+        """
+        Resolve a column of names in one pass.
+
+        Args:
+            names: Species names indexed by row label
+
+        Returns:
+            SpeciesMatch with an ID per name and the distinct unknown names
+        """
+        ids = np.fromiter((self.id_of(name) for name in names), dtype=np.int32, count=len(names))
+        match = SpeciesMatch(ids=ids)
+
+        unknown = ids == UNKNOWN_SPECIES_ID
+        match.unknown = list(dict.fromkeys(names[unknown]))
+        return match
+
+
+def find_duplicates(ids: np.ndarray, labels) -> Dict[int, list]:
+    """Map each species ID that occurs more than once to the labels of its rows."""
+    known = pd.Series(ids, index=labels)
+    repeated = known[known.duplicated(keep=False)]
+    return {int(species_id): list(rows.index) for species_id, rows in repeated.groupby(repeated)}
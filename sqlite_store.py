@@ -0,0 +1,411 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from filter_index import normalise_filters
+from sighting_table import SightingTable
+from species_registry import UNKNOWN_SPECIES_ID, SpeciesRegistry
+from validation import RULES, OverlayState, describe_issues, sighting_keys
+
+# Held while a store's exclusions are rewritten, so sessions applying the same change copy it once
+_EXCLUSIONS_LOCK = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE species (id INTEGER PRIMARY KEY, name TEXT NOT NULL, category TEXT NOT NULL);
+CREATE TABLE locations (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE surveyors (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE sightings (
+    id INTEGER PRIMARY KEY,  -- position in the dataset, so first sightings sort first
+    species_id INTEGER NOT NULL REFERENCES species (id),
+    category TEXT NOT NULL,
+    day INTEGER NOT NULL,  -- date.toordinal()
+    year INTEGER NOT NULL,
+    month TEXT NOT NULL,  -- YYYY-MM
+    location_id INTEGER NOT NULL REFERENCES locations (id),
+    surveyor_id INTEGER NOT NULL REFERENCES surveyors (id),
+    count INTEGER NOT NULL,
+    key TEXT NOT NULL,  -- validation.sighting_keys
+    issues INTEGER NOT NULL,  -- bits of validation.RULES
+    excluded INTEGER NOT NULL DEFAULT 0  -- set by apply_exclusions
+);
+CREATE UNIQUE INDEX ix_sightings_key ON sightings (key);
+CREATE INDEX ix_sightings_species ON sightings (species_id, month);
+CREATE INDEX ix_sightings_day ON sightings (day);
+CREATE INDEX ix_sightings_location ON sightings (location_id);
+CREATE INDEX ix_sightings_category ON sightings (category);
+"""
+
+# Raw Data rows, selected from sightings aliased as g
+SELECT_ROWS = "SELECT g.day, s.name, s.category, g.count, l.name, v.name"
+RAW_COLUMNS = ["Date", "Species", "Conservation Status", "Count", "Location", "Surveyors"]
+JOIN_NAMES = ("JOIN species AS s ON s.id = g.species_id JOIN locations AS l ON l.id = g.location_id "
+              "JOIN surveyors AS v ON v.id = g.surveyor_id")
+
+# SQL expression for each Raw Data column the rows can be sorted on
+SORT_EXPRESSIONS = {
+    "Date": "g.day",
+    "Species": "s.name",
+    "Conservation Status": "g.category",
+    "Count": "g.count",
+    "Location": "l.name",
+    "Surveyors": "v.name",
+}
+
+
+class SightingStore:
+    """
+    Sightings in a local SQLite database.
+
+    Offers the same roll-ups as CountCube, plus filtering and the raw rows,
+    each as a single indexed query so callers only pull what they display.
+    Connections are opened per call, so a store can be shared across threads.
+
+    Sightings marked excluded by `apply_exclusions` are left out of every
+    query except `page` when asked to include them.
+    """
+
+    def __init__(self, path: Path, registry: SpeciesRegistry):
+        self.path = Path(path)
+        self.registry = registry
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def _query(self, sql: str, params: Tuple = ()) -> list:
+        with closing(self._connect()) as connection:
+            return connection.execute(sql, params).fetchall()
+
+    def _meta(self, key: str) -> Optional[str]:
+        if not self.path.exists():
+            return None
+        try:
+            rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        except sqlite3.DatabaseError:
+            return None
+        return rows[0][0] if rows else None
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version of the dataset last loaded into the store, or None if it is empty."""
+        return self._meta("version")
+
+    def _tmp_path(self) -> Path:
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return tmp_path
+
+    def replace(self, sightings: SightingTable, version: str, state: Optional[OverlayState] = None) -> None:
+        """
+        Replace the store's contents with a table of sightings, with the
+        sightings an exclusion overlay state excludes already marked.
+
+        The database is built in a new file and renamed into place, so
+        queries already running keep reading the old one and no query sees
+        it before its exclusions are applied.
+        """
+        tmp_path = self._tmp_path()
+        registry = sightings.registry
+        months = sightings.day.astype("datetime64[M]").astype(str)
+        with closing(sqlite3.connect(tmp_path)) as connection:
+            connection.executescript(SCHEMA)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)",
+                                   [("version", version), ("registry", registry.version)])
+            connection.executemany("INSERT INTO species VALUES (?, ?, ?)",
+                                   [(i, s.name, s.category) for i, s in enumerate(registry.species)])
+            connection.executemany("INSERT INTO locations VALUES (?, ?)", enumerate(sightings.locations))
+            connection.executemany("INSERT INTO surveyors VALUES (?, ?)", enumerate(sightings.surveyors))
+            connection.executemany(
+                "INSERT INTO sightings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                zip(range(len(sightings)),
+                    sightings.species_id.tolist(),
+                    np.array(registry.categories, dtype=object)[sightings.category_code].tolist(),
+                    sightings.ordinal.tolist(),
+                    sightings.year.tolist(),
+                    months.tolist(),
+                    sightings.location_code.tolist(),
+                    sightings.surveyor_code.tolist(),
+                    sightings.count.tolist(),
+                    sighting_keys(sightings).tolist(),
+                    sightings.issues.tolist())
+            )
+            if state is not None:
+                _mark_excluded(connection, state)
+            connection.commit()
+        os.replace(tmp_path, self.path)
+
+    def extended(self, path: Path, sightings: SightingTable, start: int, version: str,
+                 state: Optional[OverlayState] = None) -> "SightingStore":
+        """
+        A copy of the store at `path` with the sightings of a table from
+        `start` on added, e.g. those entered in the journal, and the
+        sightings an exclusion overlay state excludes marked.
+
+        This store's file is left as it is, so sessions still reading it see
+        neither the new sightings nor unmarked ones. Locations and surveyors
+        are matched to the store's by name, adding any it hasn't seen.
+        """
+        extended = SightingStore(path, self.registry)
+        tmp_path = extended._tmp_path()
+        registry = sightings.registry
+        new = sightings[np.arange(start, len(sightings))]
+        with closing(self._connect()) as source, closing(sqlite3.connect(tmp_path)) as connection:
+            source.backup(connection)
+
+            def ids(table: str, codes: np.ndarray, names: List[str]) -> List[int]:
+                known = {name: i for i, name in connection.execute(f"SELECT id, name FROM {table}")}
+                added = [name for name in dict.fromkeys(np.array(names, dtype=object)[codes].tolist())
+                         if name not in known]
+                added = list(enumerate(added, start=max(known.values(), default=-1) + 1))
+                connection.executemany(f"INSERT INTO {table} VALUES (?, ?)", added)
+                known.update({name: i for i, name in added})
+                return np.array([known.get(name, -1) for name in names], dtype=np.int64)[codes].tolist()
+
+            connection.executemany(
+                "INSERT INTO sightings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                zip(range(start, len(sightings)),
+                    new.species_id.tolist(),
+                    np.array(registry.categories, dtype=object)[new.category_code].tolist(),
+                    new.ordinal.tolist(),
+                    new.year.tolist(),
+                    new.day.astype("datetime64[M]").astype(str).tolist(),
+                    ids("locations", new.location_code, sightings.locations),
+                    ids("surveyors", new.surveyor_code, sightings.surveyors),
+                    new.count.tolist(),
+                    sighting_keys(sightings, start).tolist(),
+                    new.issues.tolist())
+            )
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+            if state is not None:
+                _mark_excluded(connection, state)
+            else:
+                connection.execute("DELETE FROM meta WHERE key = 'exclusions'")
+            connection.commit()
+        os.replace(tmp_path, path)
+        return extended
+
+    def apply_exclusions(self, state: OverlayState) -> None:
+        """
+        Mark the sightings an ExclusionOverlay excludes, unless the store
+        already reflects that version of it.
+
+        The marks are made in a copy of the database that is renamed into
+        place, like `replace`, so queries already running keep reading the
+        old file and none sees the marks half applied.
+        """
+        with _EXCLUSIONS_LOCK:
+            if self._meta("exclusions") == state[0]:
+                return
+            tmp_path = self._tmp_path()
+            with closing(self._connect()) as source, closing(sqlite3.connect(tmp_path)) as connection:
+                source.backup(connection)
+                _mark_excluded(connection, state)
+                connection.commit()
+            os.replace(tmp_path, self.path)
+
+    def excluded_count(self) -> int:
+        """Number of sightings currently excluded."""
+        return self._query("SELECT COUNT(*) FROM sightings WHERE excluded")[0][0]
+
+    def issue_counts(self) -> Dict[str, int]:
+        """Number of sightings breaking each validation rule."""
+        counts = self._query("SELECT " + ", ".join(f"COUNT(*) FILTER (WHERE issues & {rule.bit})"
+                                                   for rule in RULES.values()) + " FROM sightings")[0]
+        return dict(zip(RULES, counts))
+
+    def _where(self, conservation_statuses=None, years=None, locations=None,
+               include_excluded: bool = False) -> Tuple[str, list]:
+        """SQL condition and parameters for the overview filters."""
+        statuses, years, locations = normalise_filters(
+            frozenset(self.registry.categories), conservation_statuses, years, locations
+        )
+        clauses, params = ([] if include_excluded else ["excluded = 0"]), []
+        if statuses is not None:
+            clauses.append(f"category IN ({', '.join('?' * len(statuses))})")
+            params.extend(sorted(statuses))
+        if years is not None:
+            # Whole-year day ranges use the day index
+            clauses.append("(" + " OR ".join("day BETWEEN ? AND ?" for _ in years) + ")")
+            for year in sorted(years):
+                params.extend([date(int(year), 1, 1).toordinal(), date(int(year), 12, 31).toordinal()])
+        if locations is not None:
+            clauses.append(f"location_id IN (SELECT id FROM locations WHERE name IN "
+                           f"({', '.join('?' * len(locations))}))")
+            params.extend(sorted(locations))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @property
+    def resident_nbytes(self) -> int:
+        """Nothing is held in memory between queries; the data lives in the database file."""
+        return 0
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM sightings")[0][0]
+
+    def years(self) -> List[int]:
+        """Calendar years with at least one sighting."""
+        return [row[0] for row in self._query("SELECT DISTINCT year FROM sightings WHERE excluded = 0 ORDER BY year")]
+
+    def location_names(self) -> List[str]:
+        """Field sections with at least one sighting, sorted."""
+        return [row[0] for row in self._query(
+            "SELECT name FROM locations WHERE id IN "
+            "(SELECT DISTINCT location_id FROM sightings WHERE excluded = 0) ORDER BY name"
+        )]
+
+    def species_names(self) -> List[str]:
+        """Species with at least one sighting, sorted."""
+        return [row[0] for row in self._query(
+            "SELECT name FROM species WHERE id IN "
+            "(SELECT DISTINCT species_id FROM sightings WHERE excluded = 0) ORDER BY name"
+        )]
+
+    def all_locations(self) -> List[str]:
+        """Every field section name, in location ID order."""
+        return [row[0] for row in self._query("SELECT name FROM locations ORDER BY id")]
+
+    def cell_totals(self) -> pd.DataFrame:
+        """Total count per species, month ("YYYY-MM") and location ID, for Trends."""
+        rows = self._query("SELECT species_id, month, location_id, SUM(count) FROM sightings WHERE excluded = 0 "
+                           "GROUP BY species_id, month, location_id")
+        return pd.DataFrame(rows, columns=["species_id", "month", "location_id", "count"])
+
+    def survey_visits(self) -> pd.DataFrame:
+        """Month and location ID of each survey column (a distinct date, surveyors and field section)."""
+        rows = self._query("SELECT DISTINCT month, day, surveyor_id, location_id FROM sightings WHERE excluded = 0")
+        return pd.DataFrame(rows, columns=["month", "day", "surveyor_id", "location_id"])
+
+    def filter(self, conservation_statuses=None, years=None, locations=None) -> SightingTable:
+        """Sightings matching the filters, in dataset order."""
+        where, params = self._where(conservation_statuses, years, locations)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT species_id, day, location_id, surveyor_id, count FROM sightings{where} ORDER BY id",
+                params
+            ).fetchall()
+            locations = [row[0] for row in connection.execute("SELECT name FROM locations ORDER BY id")]
+            surveyors = [row[0] for row in connection.execute("SELECT name FROM surveyors ORDER BY id")]
+
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 5).T
+        return SightingTable(self.registry, columns[0], columns[1], columns[2], locations,
+                             columns[3], surveyors, columns[4])
+
+    def species_totals(self, conservation_statuses=None, years=None, locations=None) -> pd.DataFrame:
+        """Total count per species seen under the filters, largest first, ties in order of first sighting."""
+        where, params = self._where(conservation_statuses, years, locations)
+        rows = self._query(
+            f"SELECT t.species_id, s.name, s.category, t.total FROM "
+            f"(SELECT species_id, SUM(count) AS total, MIN(id) AS first FROM sightings{where} "
+            f"GROUP BY species_id) AS t JOIN species AS s ON s.id = t.species_id "
+            f"ORDER BY t.total DESC, t.first",
+            tuple(params)
+        )
+        return pd.DataFrame(rows, columns=["species_id", "Species", "Conservation Status", "Count"])
+
+    def species_observed(self, conservation_statuses=None, years=None, locations=None) -> int:
+        """Number of distinct species seen under the filters."""
+        where, params = self._where(conservation_statuses, years, locations)
+        return self._query(f"SELECT COUNT(DISTINCT species_id) FROM sightings{where}", tuple(params))[0][0]
+
+    def _species_ids(self, species_names: List[str]) -> List[int]:
+        ids = {self.registry.id_of(name) for name in species_names} - {UNKNOWN_SPECIES_ID}
+        return sorted(ids)
+
+    def monthly_totals(self, species_names: List[str]) -> pd.DataFrame:
+        """
+        Total count per species and month, species in order of first sighting
+        and months in order of first sighting within each species.
+        """
+        species_ids = self._species_ids(species_names)
+        rows = self._query(
+            f"SELECT s.name, m.month, m.total FROM "
+            f"(SELECT species_id, month, SUM(count) AS total, MIN(id) AS first FROM sightings "
+            f"WHERE excluded = 0 AND species_id IN ({', '.join('?' * len(species_ids))}) "
+            f"GROUP BY species_id, month) AS m "
+            f"JOIN species AS s ON s.id = m.species_id "
+            f"ORDER BY MIN(m.first) OVER (PARTITION BY m.species_id), m.first",
+            tuple(species_ids)
+        )
+        return pd.DataFrame(rows, columns=["Species", "Month", "Count"])
+
+    def species_summary(self, species_names: List[str]) -> pd.DataFrame:
+        """Conservation status and total count for each given species that was seen."""
+        species_ids = self._species_ids(species_names)
+        totals = dict(self._query(
+            f"SELECT species_id, SUM(count) FROM sightings "
+            f"WHERE excluded = 0 AND species_id IN ({', '.join('?' * len(species_ids))}) GROUP BY species_id",
+            tuple(species_ids)
+        ))
+        summary = []
+        for species_name in species_names:
+            species_id = self.registry.id_of(species_name)
+            if species_id in totals:
+                summary.append({
+                    "Species": species_name,
+                    "Conservation Status": self.registry.species[species_id].category,
+                    "Total Sightings": totals[species_id]
+                })
+        return pd.DataFrame(summary)
+
+    def count(self, conservation_statuses=None, years=None, locations=None, include_excluded: bool = False) -> int:
+        """Number of sightings matching the filters."""
+        where, params = self._where(conservation_statuses, years, locations, include_excluded)
+        return self._query(f"SELECT COUNT(*) FROM sightings{where}", tuple(params))[0][0]
+
+    def page(self, conservation_statuses=None, years=None, locations=None, sort_by: str = "Date",
+             ascending: bool = True, offset: int = 0, limit: Optional[int] = None,
+             include_excluded: bool = False) -> pd.DataFrame:
+        """
+        One page of the sightings matching the filters, as Raw Data rows.
+
+        Sorting and paging run in SQL, so only the rows on the page are read.
+
+        Returns:
+            DataFrame indexed by sighting key, with the Raw Data columns plus
+            `Issues`, `Excluded` and the raw `issue_bits`
+        """
+        if sort_by not in SORT_EXPRESSIONS:
+            raise ValueError(f"Cannot sort on '{sort_by}'")
+        where, params = self._where(conservation_statuses, years, locations, include_excluded)
+        direction = "ASC" if ascending else "DESC"
+        rows = self._query(
+            f"{SELECT_ROWS}, g.issues, g.excluded, g.key FROM (SELECT * FROM sightings{where}) AS g {JOIN_NAMES} "
+            f"ORDER BY {SORT_EXPRESSIONS[sort_by]} {direction}, g.id LIMIT ? OFFSET ?",
+            tuple(params) + (-1 if limit is None else limit, offset)
+        )
+        df = self._frame(rows, RAW_COLUMNS + ["issue_bits", "Excluded", "key"]).set_index("key")
+        df.index.name = None
+        df.insert(len(RAW_COLUMNS), "Issues", describe_issues(df["issue_bits"].to_numpy()))
+        df["Excluded"] = df["Excluded"].astype(bool)
+        return df[RAW_COLUMNS + ["Issues", "Excluded", "issue_bits"]]
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per sighting that isn't excluded, with the columns shown in the Raw Data tab."""
+        rows = self._query(f"{SELECT_ROWS} FROM sightings AS g {JOIN_NAMES} WHERE g.excluded = 0 ORDER BY g.id")
+        return self._frame(rows, RAW_COLUMNS)
+
+    def _frame(self, rows: list, columns: List[str]) -> pd.DataFrame:
+        df = pd.DataFrame(rows, columns=columns)
+        df["Date"] = [date.fromordinal(day) for day in df["Date"]]
+        df["Count"] = df["Count"].astype(np.int32)
+        return df
+
+
+def _mark_excluded(connection: sqlite3.Connection, state: OverlayState) -> None:
+    """Set the excluded column from an exclusion overlay state, within the connection's transaction."""
+    version, rule_bits, flags = state
+    connection.execute("UPDATE sightings SET excluded = (issues & ?) != 0", (rule_bits,))
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS flags (key TEXT PRIMARY KEY, excluded INTEGER NOT NULL)")
+    connection.execute("DELETE FROM flags")
+    connection.executemany("INSERT INTO flags VALUES (?, ?)", flags.items())
+    connection.execute("UPDATE sightings SET excluded = (SELECT excluded FROM flags WHERE flags.key = "
+                       "sightings.key) WHERE key IN (SELECT key FROM flags)")
+    connection.execute("INSERT OR REPLACE INTO meta VALUES ('exclusions', ?)", (version,))
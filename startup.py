@@ -0,0 +1,26 @@
+import importlib
+import threading
+from typing import Set, Tuple
+
+_started: Set[Tuple[str, str]] = set()
+_started_lock = threading.Lock()
+
+
+def warm_in_background(module_name: str, function_name: str) -> None:
+    """
+    Import a module and call one of its functions on a daemon thread, once
+    per process. Anything importing the module meanwhile waits on Python's
+    import lock rather than importing it twice.
+    """
+    with _started_lock:
+        if (module_name, function_name) in _started:
+            return
+        _started.add((module_name, function_name))
+
+    def warm():
+        try:
+            getattr(importlib.import_module(module_name), function_name)()
+        except Exception as e:
+            print(f"Warning: Warming up {module_name}.{function_name} failed: {e}")
+
+    threading.Thread(target=warm, name=f"warm-{module_name}", daemon=True).start()
@@ -0,0 +1,196 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from numbers import Real
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Excel's 1900 date system: serial 1 is 1900-01-01, and serial 60 is the
+# non-existent 1900-02-29, so modern serials count from 1899-12-30
+EXCEL_EPOCH = np.datetime64("1899-12-30", "D")
+
+# Serials that land between 0001-01-01 and 9999-12-31
+MIN_SERIAL = (date(1, 1, 1) - date(1899, 12, 30)).days
+MAX_SERIAL = (date(9999, 12, 31) - date(1899, 12, 30)).days
+
+# Formats tried for strings like "8.30am 3/5/2025" or "8am 21/06/25", in order
+DAY_FIRST_FORMATS = ["%d/%m/%Y", "%d/%m/%y"]
+MONTH_FIRST_FORMATS = ["%m/%d/%Y", "%m/%d/%y"]
+
+# Parsed values keyed on (type, value), shared across loads and the threads
+# that run them; _PARSE_CACHE_LOCK guards every access
+_PARSE_CACHE: Dict[Tuple[type, object], Tuple[Optional[date], Optional[Tuple[str, str]]]] = {}
+_PARSE_CACHE_LIMIT = 10_000
+_PARSE_CACHE_LOCK = threading.Lock()
+
+
+@dataclass
+class DateIssue:
+    column: object
+    value: object
+    kind: str  # "unparseable", "ambiguous" or "out_of_range"
+    message: str
+
+
+@dataclass
+class SurveyDates:
+    dates: Dict[object, date]
+    issues: List[DateIssue] = field(default_factory=list)
+
+
+def parse_survey_dates(values: pd.Series, expected_year: Optional[int] = None) -> SurveyDates:
+    """
+    Parse a row of survey date headers.
+
+    Each distinct value is parsed once and remembered across calls. Excel
+    serials, ISO strings and "time d/m/y" strings are converted in batches.
+
+    Args:
+        values: Header values indexed by column
+        expected_year: Year the sheet covers; dates outside it are reported
+
+    Returns:
+        SurveyDates mapping each parseable column to its date, plus any issues
+    """
+    values = values[values.notna()]
+    # This call's values are looked up in a local dict, so another thread
+    # clearing the shared cache meanwhile can't lose them
+    known = {}
+    todo = {}
+    with _PARSE_CACHE_LOCK:
+        for value in values:
+            key = (type(value), value)
+            if key in _PARSE_CACHE:
+                known[key] = _PARSE_CACHE[key]
+            else:
+                todo[key] = value
+    if todo:
+        parsed_batch = dict(zip(todo.keys(), _parse_batch(list(todo.values()))))
+        known.update(parsed_batch)
+        with _PARSE_CACHE_LOCK:
+            if len(_PARSE_CACHE) + len(parsed_batch) > _PARSE_CACHE_LIMIT:
+                _PARSE_CACHE.clear()
+            _PARSE_CACHE.update(parsed_batch)
+
+    result = SurveyDates(dates={})
+    for column, value in values.items():
+        parsed, problem = known[(type(value), value)]
+        if problem:
+            result.issues.append(DateIssue(column, value, *problem))
+        if parsed is None:
+            continue
+
+        result.dates[column] = parsed
+        if expected_year is not None and parsed.year != expected_year:
+            result.issues.append(DateIssue(
+                column, value, "out_of_range",
+                f"{parsed.isoformat()} is outside {expected_year}"
+            ))
+
+    return result
+
+
+def clear_parse_cache() -> None:
+    """Forget every parsed value, e.g. so a benchmark times parsing rather than lookups."""
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE.clear()
+
+
+def _parse_batch(values: list) -> List[Tuple[Optional[date], Optional[Tuple[str, str]]]]:
+    """Parse distinct header values, returning (date, (issue kind, message)) pairs."""
+    results: List[Tuple[Optional[date], Optional[Tuple[str, str]]]] = [(None, None)] * len(values)
+
+    serials, slashed, iso, other = [], [], [], []
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            if "/" in value:
+                slashed.append(i)
+            elif "T" in value:
+                iso.append(i)
+            else:
+                other.append(i)
+        elif isinstance(value, Real):
+            serials.append(i)
+        else:
+            other.append(i)
+
+    if serials:
+        days = np.trunc(np.array([values[i] for i in serials], dtype=float))
+        in_range = (days >= MIN_SERIAL) & (days <= MAX_SERIAL)
+        dates = (EXCEL_EPOCH + np.where(in_range, days, 0).astype("int64")).astype(object)
+        for i, parsed, ok in zip(serials, dates, in_range):
+            results[i] = (parsed, None) if ok else (None, ("unparseable", "Excel serial out of range"))
+
+    if slashed:
+        # The date is the last token, after an optional time such as "8.30am"
+        tokens = pd.Series([values[i].split()[-1] for i in slashed], index=slashed)
+        parsed = pd.Series(None, index=slashed, dtype=object)
+        for date_format in DAY_FIRST_FORMATS + MONTH_FIRST_FORMATS:
+            pending = parsed.isna()
+            if not pending.any():
+                break
+            attempt = pd.to_datetime(tokens[pending], format=date_format, errors="coerce")
+            if date_format.endswith("/%y"):
+                # Assuming years 00-30 are 2000-2030, 31-99 are 1931-1999
+                attempt = attempt.where(attempt.dt.year >= 1950, attempt + pd.DateOffset(years=100))
+            parsed[pending] = attempt.dt.date
+
+        # Day-first wins, but flag tokens that also read as a different month-first date
+        month_first = pd.Series(None, index=slashed, dtype=object)
+        for date_format in MONTH_FIRST_FORMATS:
+            pending = month_first.isna()
+            month_first[pending] = pd.to_datetime(tokens[pending], format=date_format, errors="coerce").dt.date
+
+        for i in slashed:
+            if pd.isna(parsed[i]):
+                # Possibly outside the range pandas can hold; fall back to the scalar parser
+                results[i] = _parse_slashed(tokens[i])
+            elif pd.notna(month_first[i]) and month_first[i] != parsed[i]:
+                results[i] = (parsed[i], (
+                    "ambiguous",
+                    f"read as {parsed[i].isoformat()} (d/m), could be {month_first[i].isoformat()} (m/d)"
+                ))
+            else:
+                results[i] = (parsed[i], None)
+
+    if iso:
+        strings = pd.Series([values[i] for i in iso], index=iso)
+        simple = strings.str.fullmatch(r"\d{4}-\d{2}-\d{2}T[\d:.]*(Z|[+-]\d{2}:?\d{2})?")
+        parsed = pd.to_datetime(strings.str.slice(0, 10).where(simple), format="%Y-%m-%d", errors="coerce")
+        for i in iso:
+            if pd.notna(parsed[i]):
+                results[i] = (parsed[i].date(), None)
+            else:
+                results[i] = _parse_iso(values[i])
+
+    for i in other:
+        value = values[i]
+        if hasattr(value, "date"):
+            results[i] = (value.date(), None)
+        elif isinstance(value, date):
+            results[i] = (value, None)
+        else:
+            results[i] = (None, ("unparseable", "not a recognised date format"))
+
+    return results
+
+
+def _parse_slashed(token: str) -> Tuple[Optional[date], Optional[Tuple[str, str]]]:
+    for date_format in DAY_FIRST_FORMATS + MONTH_FIRST_FORMATS:
+        try:
+            parsed = datetime.strptime(token, date_format).date()
+        except ValueError:
+            continue
+        if date_format.endswith("/%y") and parsed.year < 1950:
+            parsed = parsed.replace(year=parsed.year + 100)
+        return parsed, None
+    return None, ("unparseable", f"could not parse date part '{token}' with any known format")
+
+
+def _parse_iso(value: str) -> Tuple[Optional[date], Optional[Tuple[str, str]]]:
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).date(), None
+    except ValueError as e:
+        return None, ("unparseable", str(e))
@@ -0,0 +1,30 @@
+"""
+Every test runs in one temporary directory holding a copy of the survey
+workbook, so snapshots, SQLite stores, journals and reports never touch the
+checkout. The dashboard's paths are relative, so changing into it is enough.
+"""
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKBOOK = ROOT / "sightings_2024_2025.xlsx"
+
+sys.path.insert(0, str(ROOT))
+
+# The tests drive loads and compaction themselves rather than racing background threads
+os.environ["HEAL_WATCH_INTERVAL"] = "0"
+os.environ["HEAL_COMPACT_INTERVAL"] = "0"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def survey_dir(tmp_path_factory) -> Path:
+    directory = tmp_path_factory.mktemp("survey")
+    shutil.copy(WORKBOOK, directory / WORKBOOK.name)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    yield directory
+    os.chdir(cwd)
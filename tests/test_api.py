@@ -0,0 +1,102 @@
+import http.client
+import itertools
+import json
+import threading
+
+import pytest
+
+import api
+import dashboard
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = api.make_server("127.0.0.1", 0, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[:2]
+    server.shutdown()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(dashboard, "STORAGE_ENGINE", request.param)
+    return request.param
+
+
+def get(server, path, headers=None):
+    connection = http.client.HTTPConnection(*server, timeout=60)
+    try:
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, response.getheader("ETag"), json.loads(body) if body else None
+    finally:
+        connection.close()
+
+
+def test_etag_revalidation(server, engine):
+    status, etag, body = get(server, "/api/species?year=2024&location=Northern,Eastern")
+    assert status == 200 and etag and body["species_observed"] == len(body["results"])
+
+    # Parameter order doesn't change the ETag, and a match costs nothing to answer
+    hits, misses, _, _ = api.response_cache.stats()
+    assert get(server, "/api/species?location=Northern,Eastern&year=2024", {"If-None-Match": etag}) == \
+        (304, etag, None)
+    assert get(server, "/api/species?year=2024&location=Northern,Eastern", {"If-None-Match": f"W/{etag}"})[0] == 304
+    assert api.response_cache.stats()[:2] == (hits, misses)
+
+    # Other filters, or flagging a sighting, give a new ETag
+    assert get(server, "/api/species?year=2025")[1] != etag
+    key = get(server, "/api/sightings?year=2024&page_size=1")[2]["results"][0]["Key"]
+    dashboard.exclusion_overlay.set_excluded({key: (True, 0)})
+    try:
+        status, new_etag, body = get(server, "/api/species?year=2024&location=Northern,Eastern",
+                                     {"If-None-Match": etag})
+        assert status == 200 and new_etag != etag
+    finally:
+        dashboard.exclusion_overlay.set_excluded({key: (False, 0)})
+
+
+def test_pages_cover_every_sighting(server, engine):
+    first = get(server, "/api/sightings?status=Red&page_size=7&sort=Count&order=desc")[2]
+    keys = [row["Key"] for page in range(1, first["pages"] + 1)
+            for row in get(server, f"/api/sightings?status=Red&page_size=7&sort=Count&order=desc&page={page}")[2]
+            ["results"]]
+    assert len(keys) == len(set(keys)) == first["total"]
+    assert get(server, f"/api/sightings?status=Red&page={first['pages'] + 1}")[2]["results"] == []
+
+
+@pytest.mark.parametrize("query", ["page=0", "page=abc", f"page={api.MAX_PAGE + 1}", "page=9223372036854775807",
+                                   f"page_size={api.MAX_PAGE_SIZE + 1}", "status=Purple", "sort=Colour"])
+def test_bad_requests(server, engine, query):
+    status, _, body = get(server, f"/api/sightings?{query}")
+    assert status == 400 and body["error"]
+
+
+def test_last_allowed_page(server, engine):
+    status, _, body = get(server, f"/api/sightings?page={api.MAX_PAGE}&page_size={api.MAX_PAGE_SIZE}")
+    assert status == 200 and body["results"] == []
+
+
+def test_body_matches_its_etag(server, monkeypatch):
+    version, sightings = dashboard.get_shared_sightings()
+    # The overlay changes, every rule switched off and back, each time it is read
+    states = [dashboard.exclusion_overlay.state(), ("changed", 0, {})]
+    reads = itertools.count()
+    monkeypatch.setattr(dashboard.exclusion_overlay, "state", lambda: states[next(reads) % 2])
+
+    status, etag, body = get(server, "/api/species?year=2024&page_size=500&case=etag")
+    query = {"year": ["2024"], "page_size": ["500"], "case": ["etag"]}
+    tagged = next(state for state in states
+                  if api.response_etag(("/api/species", version, state[0], api.canonical_query(query))) == etag)
+    expected = api.species_page(sightings, dashboard.get_exclusions(sightings, tagged), query)
+    assert status == 200 and body["results"] == expected["results"]
+
+
+def test_unexpected_errors_are_json(server, monkeypatch):
+    def broken(sightings, exclusions, query):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(api.ENDPOINTS, "/api/meta", broken)
+    status, _, body = get(server, "/api/meta?case=broken")
+    assert status == 500 and "boom" in body["error"]
@@ -0,0 +1,65 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dashboard
+from conftest import WORKBOOK
+from count_cube import CountCube
+from sqlite_store import SightingStore
+from validation import RULES, exclusion_mask, sighting_keys
+
+
+@pytest.fixture(scope="module")
+def sightings():
+    return dashboard.load_bird_sightings([WORKBOOK])
+
+
+def overlay_state(sightings, version):
+    """Every rule on, with a few sightings flagged by hand and one flagged duplicate kept."""
+    keys = sighting_keys(sightings)
+    flags = {key: True for key in keys[::37]}
+    flags[keys[np.flatnonzero(sightings.issues & RULES["duplicate_rows"].bit)[0]]] = False
+    return version, sum(rule.bit for rule in RULES.values()), flags
+
+
+@pytest.fixture(scope="module", params=["none", "flagged"])
+def engines(request, sightings, tmp_path_factory):
+    """A count cube and a SQLite store of the same sightings, with the same exclusions."""
+    store = SightingStore(tmp_path_factory.mktemp("store") / "sightings.sqlite", sightings.registry)
+    if request.param == "none":
+        store.replace(sightings, "test")
+        return CountCube(sightings), store
+    state = overlay_state(sightings, request.param)
+    excluded = exclusion_mask(sighting_keys(sightings), sightings.issues, state).excluded
+    store.replace(sightings, "test", state)
+    assert store.excluded_count() == np.count_nonzero(excluded) > 0
+    return CountCube(sightings, excluded), store
+
+
+def test_axes_match_sqlite(engines):
+    cube, store = engines
+    assert cube.years() == store.years()
+    assert cube.location_names() == store.location_names()
+    assert cube.species_names() == store.species_names()
+
+
+def test_species_totals_match_sqlite(engines):
+    cube, store = engines
+    for statuses, years, locations in itertools.product(
+            [None, ["Red"], ["Amber", "Green"]], [None, [2024], [2025], [2023]],
+            [None, ["Northern"], ["Eastern", "Southern"]]):
+        expected = store.species_totals(statuses, years, locations)
+        pd.testing.assert_frame_equal(cube.species_totals(statuses, years, locations), expected, check_dtype=False)
+        assert cube.species_observed(statuses, years, locations) == store.species_observed(statuses, years,
+                                                                                           locations)
+
+
+def test_species_roll_ups_match_sqlite(engines):
+    cube, store = engines
+    names = store.species_names()
+    for chosen in [names[:1], names[::5], names, ["Dodo"]]:
+        pd.testing.assert_frame_equal(cube.monthly_totals(chosen), store.monthly_totals(chosen), check_dtype=False)
+        pd.testing.assert_frame_equal(cube.species_summary(chosen), store.species_summary(chosen),
+                                      check_dtype=False)
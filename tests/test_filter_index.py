@@ -0,0 +1,70 @@
+import itertools
+from datetime import date
+
+import numpy as np
+import pytest
+
+import dashboard
+from conftest import WORKBOOK
+from filter_index import FilterIndex
+from sighting_table import SightingTable
+from validation import ExclusionMask
+
+
+@pytest.fixture(scope="module")
+def sightings():
+    return dashboard.load_bird_sightings([WORKBOOK])
+
+
+def subsets(values):
+    values = sorted(values)
+    return [list(chosen) for size in range(len(values) + 1) for chosen in itertools.combinations(values, size)]
+
+
+def naive_select(sightings, conservation_statuses, years, locations, excluded=None):
+    """Positions of the matching sightings, checked one column at a time."""
+    statuses = np.array(sightings.registry.categories, dtype=object)[sightings.category_code]
+    names = np.array(sightings.locations, dtype=object)[sightings.location_code]
+    keep = np.ones(len(sightings), dtype=bool)
+    if conservation_statuses:
+        keep &= np.isin(statuses, conservation_statuses)
+    if years:
+        keep &= np.isin(sightings.year, years)
+    if locations:
+        keep &= np.isin(names, locations)
+    if excluded is not None:
+        keep &= ~excluded
+    return np.flatnonzero(keep)
+
+
+def check_every_filter(sightings, index, exclude=None):
+    excluded = None if exclude is None else exclude.excluded
+    for statuses, years, locations in itertools.product(
+            subsets(sightings.registry.categories), subsets(np.unique(sightings.year).tolist()) + [[2023]],
+            subsets(sightings.locations)):
+        expected = naive_select(sightings, statuses, years, locations, excluded)
+        np.testing.assert_array_equal(index.select(statuses, years, locations, exclude=exclude), expected)
+
+
+def test_select_matches_naive_filter(sightings):
+    check_every_filter(sightings, FilterIndex(sightings))
+
+
+def test_select_leaves_out_excluded(sightings):
+    excluded = np.random.default_rng(0).random(len(sightings)) < 0.2
+    index = FilterIndex(sightings)
+    check_every_filter(sightings, index, ExclusionMask("some", excluded))
+    # Memoized positions of one exclusion version are not served for another
+    check_every_filter(sightings, index, ExclusionMask("other", ~excluded))
+
+
+@pytest.mark.parametrize("start", [0, 1, 7, 8, 500])
+def test_extended_index_matches_rebuilt(sightings, start):
+    head = sightings[np.arange(start)]
+    head.filter_index
+    added = SightingTable.from_columns(
+        sightings.registry, sightings.species_id[:9], [date(2026, 1, 5)] * 9,
+        ["Western"] * 4 + ["Northern"] * 5, ["Jo"] * 9, [1] * 9
+    )
+    combined = head.append(sightings[np.arange(start, len(sightings))]).append(added)
+    check_every_filter(combined, combined.filter_index)
@@ -0,0 +1,116 @@
+from collections import Counter
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+import dashboard
+import snapshot
+from conftest import WORKBOOK
+from generate_workbook import generate_workbook
+from ingest import FIELD_SECTIONS
+from survey_dates import parse_survey_dates
+from validation import RULES
+
+
+def baseline_sightings(path):
+    """
+    The sightings the original loader read, as (species, date, surveyors,
+    field section, count) tuples: a cell by cell walk of each survey sheet
+    with the same rules for columns, species and counts.
+    """
+    names = {species.name for species in dashboard.SPECIES_LIST}
+    sightings = []
+    for sheet_name, df in pd.read_excel(path, sheet_name=None, header=None).items():
+        if not sheet_name.startswith("Heal Somerset bird list"):
+            continue
+        surveyors, dates, sections = df.iloc[1], df.iloc[2], df.iloc[3]
+        columns = [col for col in range(3, len(dates))
+                   if not pd.isna(dates.iloc[col])
+                   and str(dates.iloc[col]) not in ['Monthly Totals', 'Total for 2024', 'Species Total 2024']
+                   and not str(dates.iloc[col]).startswith(('North', 'South', 'East'))
+                   and '#DIV' not in str(dates.iloc[col])]
+        survey_dates = parse_survey_dates(dates[columns]).dates
+        for row in range(6, len(df)):
+            species = df.iloc[row, 0]
+            if species not in names:
+                continue
+            for col in columns:
+                value = df.iloc[row, col]
+                if pd.isna(value) or value == "" or value == 0:
+                    continue
+                try:
+                    count = int(float(value))
+                except (ValueError, TypeError):
+                    continue
+                survey_date = survey_dates.get(col)
+                if not survey_date:
+                    continue
+                sightings.append((species, survey_date,
+                                  "Unknown" if pd.isna(surveyors.iloc[col]) else str(surveyors.iloc[col]),
+                                  "Unknown" if pd.isna(sections.iloc[col]) else str(sections.iloc[col]),
+                                  count))
+    return sightings
+
+
+def flagged(sightings, rule):
+    return sightings[(sightings.issues & RULES[rule].bit) != 0]
+
+
+def test_matches_baseline_loader():
+    sightings = dashboard.load_bird_sightings([WORKBOOK])
+    loaded = Counter((s.species.name, s.date, s.surveyors, s.field_section, s.count) for s in sightings)
+    assert loaded == Counter(baseline_sightings(WORKBOOK))
+
+
+def test_repeated_species_rows_are_flagged():
+    sightings = dashboard.load_bird_sightings([WORKBOOK])
+    # House Martin and Marsh Tit are each listed on two rows of the 2024 sheet
+    assert Counter(s.species.name for s in flagged(sightings, "duplicate_rows")) == \
+        Counter({"House Martin": 2, "Marsh Tit": 1})
+
+
+def test_dates_are_checked_against_their_sheet(tmp_path):
+    path = generate_workbook(tmp_path / "synthetic.xlsx", [2024, 2025], 24, dashboard.SPECIES_LIST[:20])
+    assert not len(flagged(dashboard.load_bird_sightings([path]), "out_of_range_dates"))
+
+    # A 2025 date in the 2024 sheet is out of range, though 2025 is surveyed
+    workbook = openpyxl.load_workbook(path)
+    cell = next(cell for cell in workbook["Heal Somerset bird list 2024"][3][3:] if cell.value is not None)
+    cell.value = datetime(2025, 3, 1)
+    workbook.save(path)
+
+    sightings = dashboard.load_bird_sightings([path])
+    out_of_range = flagged(sightings, "out_of_range_dates")
+    assert len(out_of_range) and {s.date.isoformat() for s in out_of_range} == {"2025-03-01"}
+    assert set(sightings.locations) <= set(FIELD_SECTIONS)
+
+
+def test_snapshot_of_an_older_ingest_is_reparsed():
+    workbook_paths = dashboard.find_workbooks(dashboard.WORKBOOK_DIR, dashboard.WORKBOOK_PATTERN)
+    stale = dashboard.load_bird_sightings(workbook_paths)
+    stale.issues[:] = 0
+    snapshot.write_snapshot(workbook_paths, stale.to_arrow(), {"registry": dashboard.SPECIES_REGISTRY.version})
+    assert len(flagged(dashboard.get_bird_sightings(), "duplicate_rows")) == 3
+
+
+def test_only_sightings_repeated_across_sheets_are_duplicates(tmp_path):
+    path = generate_workbook(tmp_path / "synthetic.xlsx", [2024], 24, dashboard.SPECIES_LIST[:20])
+
+    # Two visits on one day, by the same surveyors to the same field section, in separate columns
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook["Heal Somerset bird list 2024"]
+    first, second = [col for col in range(4, sheet.max_column + 1) if sheet.cell(3, col).value is not None][:2]
+    for row in (2, 3, 4):
+        sheet.cell(row, second).value = sheet.cell(row, first).value
+    workbook.save(path)
+
+    sightings = dashboard.load_bird_sightings([path])
+    assert not len(flagged(sightings, "duplicate_rows"))
+
+    # The same sheet in a copied workbook repeats every sighting
+    copy = tmp_path / "copy.xlsx"
+    copy.write_bytes(path.read_bytes())
+    sightings = dashboard.load_bird_sightings([path, copy])
+    assert (sightings.issues[len(sightings) // 2:] & RULES["duplicate_rows"].bit).all()
+    assert len(flagged(sightings, "duplicate_rows")) == len(sightings) // 2
@@ -0,0 +1,121 @@
+import itertools
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dashboard
+from conftest import WORKBOOK
+from count_cube import CountCube
+from filter_index import FilterIndex
+from journal import JournalEntry, SightingJournal
+from sighting_table import SightingTable
+from sqlite_store import SightingStore
+from validation import RULES, sighting_keys
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return SightingJournal(tmp_path / "sightings_journal.jsonl", dashboard.SPECIES_REGISTRY)
+
+
+def entries(count, day=date(2026, 1, 5)):
+    return [JournalEntry(day, "Robin", "Northern", "Jo, Sam", i + 1) for i in range(count)]
+
+
+def rows(table):
+    return [(s.date, s.species.name, s.field_section, s.surveyors, s.count) for s in table]
+
+
+def test_append_and_read(journal):
+    assert journal.last_seq() == 0 and not len(journal.read())
+    assert journal.append(entries(3)) == (1, 3)
+    assert journal.append(entries(2, date(2026, 2, 1))) == (4, 5)
+
+    assert journal.last_seq() == 5 and journal.pending() == 5
+    assert rows(journal.read()) == rows(journal.read(0, 3)) + rows(journal.read(3))
+    assert [s.count for s in journal.read(2, 4)] == [3, 1]
+
+
+@pytest.mark.parametrize("entry", [
+    JournalEntry(date(2026, 1, 5), "Dodo", "Northern", "Jo", 1),
+    JournalEntry(date(2026, 1, 5), "Robin", " ", "Jo", 1),
+    JournalEntry(date(2026, 1, 5), "Robin", "Northern", "", 1),
+    JournalEntry(date(2026, 1, 5), "Robin", "Northern", "Jo", 0),
+])
+def test_rejects_bad_entries(journal, entry):
+    with pytest.raises(ValueError):
+        journal.append(entries(1) + [entry])
+    assert journal.last_seq() == 0
+
+
+def test_skips_torn_line(journal):
+    journal.append(entries(2))
+    with open(journal.path, "a") as f:
+        f.write('{"seq": 3, "date": "2026-01-')
+    assert journal.last_seq() == 2 and len(journal.read()) == 2
+
+    # The next sighting starts on a fresh line and takes the next number
+    assert journal.append(entries(1)) == (3, 3)
+    assert len(journal.read()) == 3
+
+
+def test_compact_keeps_every_sighting(journal):
+    journal.append(entries(4))
+    before = rows(journal.read())
+    assert journal.compact() == 4
+    assert journal.pending() == 0 and journal.path.read_text() == ""
+
+    journal.append(entries(2, date(2026, 3, 1)))
+    assert journal.last_seq() == 6 and journal.pending() == 2
+    assert rows(journal.read()) == before + rows(journal.read(4))
+    assert [s.count for s in journal.read(3, 5)] == [4, 1]
+
+
+def test_appended_dataset_matches_rebuild(journal, monkeypatch, tmp_path):
+    base = dashboard.load_bird_sightings([WORKBOOK])
+    base.filter_index
+    base.count_cube
+    first = base[0]
+    journal.append([
+        # The same sighting as one in the workbook, in a new field section, and in a new month
+        JournalEntry(first.date, first.species.name, first.field_section, first.surveyors, 3),
+        JournalEntry(date(2025, 6, 1), "Robin", "Western", "Jo", 2),
+        JournalEntry(date(2026, 1, 5), "Nightingale", "Northern", "Jo, Sam", 1),
+    ])
+    monkeypatch.setattr(dashboard, "journal", journal)
+    appended = dashboard.append_journal_sightings(base, 0, journal.last_seq())
+    rebuilt = SightingTable.from_arrow(base.registry, appended.to_arrow())
+
+    assert rows(appended) == rows(rebuilt)
+    assert appended.issues[len(base):].tolist() == [RULES["duplicate_rows"].bit,
+                                                      RULES["unknown_field_sections"].bit, 0]
+    np.testing.assert_array_equal(np.concatenate([sighting_keys(base), sighting_keys(appended, len(base))]),
+                                  sighting_keys(rebuilt))
+
+    # The filter index and count cube were extended rather than rebuilt, and agree with rebuilt ones
+    assert "filter_index" in appended.__dict__ and "count_cube" in appended.__dict__
+    index = FilterIndex(rebuilt)
+    cube = CountCube(rebuilt)
+    for statuses, years, locations in itertools.product(
+            [None, ["Red"], ["Green", "Amber"]], [None, [2025], [2026]], [None, ["Northern"], ["Western"]]):
+        np.testing.assert_array_equal(appended.filter_index.select(statuses, years, locations),
+                                      index.select(statuses, years, locations))
+        pd.testing.assert_frame_equal(appended.count_cube.species_totals(statuses, years, locations),
+                                      cube.species_totals(statuses, years, locations))
+    assert appended.count_cube.years() == cube.years() == [2024, 2025, 2026]
+    assert appended.count_cube.location_names() == cube.location_names()
+    names = cube.species_names()
+    pd.testing.assert_frame_equal(appended.count_cube.monthly_totals(names), cube.monthly_totals(names))
+
+    # So does a SQLite store extended with the entered sightings
+    store = SightingStore(tmp_path / "base.sqlite", base.registry)
+    store.replace(base, "base")
+    extended = store.extended(tmp_path / "extended.sqlite", appended, len(base), "appended")
+    replaced = SightingStore(tmp_path / "replaced.sqlite", base.registry)
+    replaced.replace(rebuilt, "rebuilt")
+    assert extended.version == "appended" and store.version == "base"
+    pd.testing.assert_frame_equal(extended.to_frame(), replaced.to_frame())
+    assert extended.issue_counts() == replaced.issue_counts()
+    pd.testing.assert_frame_equal(extended.species_totals(), replaced.species_totals())
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+import dashboard
+from conftest import ROOT
+from figure_cache import figure_cache
+from filter_index import normalise_filters
+
+
+def test_full_selection_is_no_filter():
+    categories = frozenset(["Green", "Amber", "Red"])
+    assert normalise_filters(categories, ["Red", "Green", "Amber"], [2024, 2025], ["Northern"],
+                             [2024, 2025], ["Eastern", "Northern"]) == (None, None, frozenset(["Northern"]))
+    assert normalise_filters(categories, [], [2024], None, None, None) == (None, frozenset([2024]), None)
+
+
+def test_default_overview_is_served_from_reports(survey_dir):
+    subprocess.run([sys.executable, str(ROOT / "reports.py"), "--workers", "1"], cwd=survey_dir, check=True,
+                   env=dict(os.environ, PYTHONPATH=str(ROOT)), capture_output=True)
+    manifest = json.loads((survey_dir / dashboard.REPORTS_DIR / dashboard.REPORT_MANIFEST).read_text())
+    assert len(manifest["reports"]) == 4 * (len(manifest["years"]) + 1) * (len(manifest["locations"]) + 1)
+
+    # Start from a cold figure cache, warmed from the reports on the first load
+    dashboard._warmed.clear()
+    figure_cache.prune(lambda key: False)
+    hits, misses, _, _ = figure_cache.stats()
+
+    app = AppTest.from_file(str(ROOT / "app.py"), default_timeout=60)
+    app.session_state["password_correct"] = True
+    app.run()
+    assert not app.exception
+
+    # Every year, location and status is selected by default, which is the report of no filter
+    assert figure_cache.stats()[0] > hits
+    version, sightings = dashboard.get_shared_sightings()
+    chart = dashboard.get_species_chart(sightings, version, exclusions=dashboard.get_exclusions(sightings))
+    report = json.loads((survey_dir / dashboard.REPORTS_DIR /
+                         "status-all_year-all_location-all.json").read_text())
+    assert chart == report["species_chart"]
@@ -0,0 +1,32 @@
+import os
+import shutil
+
+import pyarrow as pa
+
+import snapshot
+from conftest import WORKBOOK
+
+
+def test_touched_workbook_is_hashed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", tmp_path / ".snapshots")
+    workbook = shutil.copy(WORKBOOK, tmp_path / WORKBOOK.name)
+    table = pa.table({"count": [1, 2, 3]})
+    snapshot.write_snapshot([workbook], table, {"registry": "test"})
+
+    stat = workbook.stat()
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    hashed = []
+    fingerprint = snapshot.workbook_fingerprint
+    monkeypatch.setattr(snapshot, "workbook_fingerprint",
+                        lambda path, with_hash=True: hashed.append(with_hash) or fingerprint(path, with_hash))
+
+    assert snapshot.load_snapshot([workbook], {"registry": "test"}).equals(table)
+    assert hashed.count(True) == 1
+    assert snapshot.load_snapshot([workbook], {"registry": "test"}).equals(table)
+    assert hashed.count(True) == 1
+
+    # An edit of the same size is still caught by the hash
+    data = bytearray(workbook.read_bytes())
+    data[-100] ^= 0xFF
+    workbook.write_bytes(bytes(data))
+    assert snapshot.load_snapshot([workbook], {"registry": "test"}) is None
@@ -0,0 +1,49 @@
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+import dashboard
+from conftest import WORKBOOK
+from sqlite_store import SightingStore
+from validation import RULES, sighting_keys
+
+
+def test_exclusions_are_applied_to_a_new_file(tmp_path):
+    sightings = dashboard.load_bird_sightings([WORKBOOK])
+    store = SightingStore(tmp_path / "sightings.sqlite", sightings.registry)
+    store.replace(sightings, "test")
+    rule_bits = sum(rule.bit for rule in RULES.values())
+    flagged = {key: True for key in sighting_keys(sightings)[:5]}
+
+    with closing(sqlite3.connect(f"file:{store.path}?mode=ro", uri=True)) as reader:
+        inode = store.path.stat().st_ino
+        store.apply_exclusions(("flagged", rule_bits, flagged))
+        assert store.path.stat().st_ino != inode
+        assert store.excluded_count() == 5 + np.count_nonzero(sightings.issues & rule_bits)
+        # A reader of the old file sees none of the marks
+        assert reader.execute("SELECT COUNT(*) FROM sightings WHERE excluded").fetchone()[0] == 0
+
+    # The same overlay version isn't applied twice
+    inode = store.path.stat().st_ino
+    store.apply_exclusions(("flagged", rule_bits, flagged))
+    assert store.path.stat().st_ino == inode
+
+
+def test_stores_pruned_meanwhile_are_skipped():
+    dashboard.SQLITE_DIR.mkdir(parents=True, exist_ok=True)
+    # A dangling link stands in for a file another process unlinked after the glob
+    gone = dashboard.sqlite_path("gone")
+    gone.symlink_to(dashboard.SQLITE_DIR / "missing.sqlite")
+    try:
+        assert gone not in [store.path for store in dashboard.sqlite_stores()]
+    finally:
+        gone.unlink()
+
+
+def test_no_workbooks_give_an_empty_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = dashboard.get_sighting_store(0)
+    assert isinstance(store, SightingStore) and len(store) == 0
+    assert store.years() == [] and store.species_totals().empty
+    assert dashboard.count_raw_rows(store) == 0 and dashboard.get_raw_page(store, (), "Date", True, 0, 10).empty
@@ -0,0 +1,36 @@
+import numpy as np
+
+from validation import RULES, ExclusionOverlay, exclusion_mask, repeated_rows
+
+DUPLICATE = RULES["duplicate_rows"].bit
+OUT_OF_RANGE = RULES["out_of_range_dates"].bit
+
+
+def test_repeated_rows_span_blocks():
+    seen = set()
+    assert repeated_rows(np.array([3, 5, 3]), seen).tolist() == [False, False, True]
+    assert repeated_rows(np.array([7, 5, 7]), seen).tolist() == [False, True, True]
+    assert seen == {3, 5, 7}
+
+
+def test_flags_override_rules():
+    keys = np.array(["a", "b", "c", "d"], dtype=object)
+    issues = np.array([0, DUPLICATE, OUT_OF_RANGE, 0], dtype=np.uint8)
+    mask = exclusion_mask(keys, issues, ("v", DUPLICATE, {"b": False, "d": True, "gone": True}))
+    assert mask.excluded.tolist() == [False, False, False, True]
+    assert mask.count == 1 and mask.version == "v"
+
+
+def test_overlay_round_trip(tmp_path):
+    path = tmp_path / "sighting_flags.json"
+    overlay = ExclusionOverlay(path)
+    version = overlay.version
+    overlay.set_rule("out_of_range_dates", False)
+    # A flag that agrees with the enabled rules isn't stored
+    overlay.set_excluded({"a": (True, 0), "b": (True, DUPLICATE), "c": (False, OUT_OF_RANGE)})
+
+    reopened = ExclusionOverlay(path)
+    state = reopened.state()
+    assert state[0] == overlay.version != version
+    assert state[1] == sum(rule.bit for rule in RULES.values()) - OUT_OF_RANGE
+    assert state[2] == {"a": True}
@@ -0,0 +1,185 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from species_registry import UNKNOWN_SPECIES_ID
+
+# Months averaged in rolling trend lines unless another window is chosen
+ROLLING_MONTHS = 3
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over the last axis, skipping NaNs (months nobody surveyed).
+
+    Returns NaN where the window holds no values.
+    """
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=-1)
+    counts = np.cumsum(valid, axis=-1)
+    if window < values.shape[-1]:
+        sums[..., window:] = sums[..., window:] - sums[..., :-window].copy()
+        counts[..., window:] = counts[..., window:] - counts[..., :-window].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def percent_change(values: np.ndarray) -> np.ndarray:
+    """Change from each column to the next along the last axis, in percent; NaN for the first column."""
+    change = np.full(values.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change[..., 1:] = np.where(values[..., :-1] > 0,
+                                   (values[..., 1:] - values[..., :-1]) / values[..., :-1] * 100, np.nan)
+    return change
+
+
+class Trends:
+    """
+    Year-over-year changes, rolling averages and effort-normalised counts
+    for every species at once.
+
+    Counts are held as a dense species x month x field section array, next
+    to the survey effort in each month and field section: the number of
+    distinct survey columns (date, surveyors and field section) with at
+    least one sighting. Every measure is a few array operations across all
+    species; nothing loops over species. Months run without gaps from the
+    first sighting to the last, and months nobody surveyed are NaN rather
+    than zero.
+    """
+
+    def __init__(self, registry, locations: List[str], species_id: np.ndarray, month: np.ndarray,
+                 location_code: np.ndarray, count: np.ndarray, visit_month: np.ndarray,
+                 visit_location: np.ndarray):
+        """
+        Args:
+            registry: Registry the species IDs belong to
+            locations: Field section names the location codes index
+            species_id, month, location_code, count: One entry per sighting or
+                per pre-summed cell; months are counted from January 1970
+            visit_month, visit_location: One entry per survey column
+        """
+        self.registry = registry
+        self.locations = list(locations)
+        months = np.concatenate([month, visit_month])
+        self.first_month = int(months.min()) if len(months) else 0
+        n_months = int(months.max()) - self.first_month + 1 if len(months) else 0
+        self.months = (self.first_month + np.arange(n_months)).astype("datetime64[M]")
+        self.month_years = self.months.astype("datetime64[Y]").astype(np.int32) + 1970
+
+        shape = (len(registry), n_months, len(self.locations))
+        cell = np.ravel_multi_index((species_id, month - self.first_month, location_code), shape)
+        self.totals = np.bincount(cell, weights=count, minlength=int(np.prod(shape))).reshape(shape)
+        visit = np.ravel_multi_index((visit_month - self.first_month, visit_location), shape[1:])
+        self.effort = np.bincount(visit, minlength=int(np.prod(shape[1:]))).reshape(shape[1:])
+
+        self.seen = np.flatnonzero(self.totals.sum(axis=(1, 2)) > 0)
+
+    @classmethod
+    def from_table(cls, sightings, excluded: Optional[np.ndarray] = None) -> "Trends":
+        """Trends of a SightingTable, leaving out rows flagged in `excluded`."""
+        kept = np.arange(len(sightings)) if excluded is None else np.flatnonzero(~excluded)
+        location_code = sightings.location_code[kept]
+        # A survey column is a distinct date, surveyors and field section
+        visit = (sightings.ordinal[kept].astype(np.int64) * (len(sightings.surveyors) + 1) +
+                 sightings.surveyor_code[kept]) * (len(sightings.locations) + 1) + location_code
+        _, first = np.unique(visit, return_index=True)
+        month = sightings.month[kept]
+        return cls(sightings.registry, sightings.locations, sightings.species_id[kept], month, location_code,
+                   sightings.count[kept], month[first], location_code[first])
+
+    @classmethod
+    def from_store(cls, store) -> "Trends":
+        """Trends of a SightingStore, from its pre-summed cells and survey columns."""
+        cells = store.cell_totals()
+        visits = store.survey_visits()
+        locations = store.all_locations()
+
+        def months(values: pd.Series) -> np.ndarray:
+            return np.array(values.tolist(), dtype="datetime64[M]").astype(np.int64)
+
+        return cls(store.registry, locations, cells["species_id"].to_numpy(), months(cells["month"]),
+                   cells["location_id"].to_numpy(), cells["count"].to_numpy(),
+                   months(visits["month"]), visits["location_id"].to_numpy())
+
+    @property
+    def nbytes(self) -> int:
+        return self.totals.nbytes + self.effort.nbytes
+
+    def _restrict(self, locations=None):
+        """Monthly species totals and survey effort, summed over the chosen field sections."""
+        mask = np.ones(len(self.locations), dtype=bool)
+        if locations:
+            mask = np.isin(self.locations, list(locations))
+        totals = self.totals.compress(mask, axis=2).sum(axis=2)
+        effort = self.effort.compress(mask, axis=1).sum(axis=1)
+        # Months nobody surveyed have no count rather than a count of zero
+        totals[:, effort == 0] = np.nan
+        return totals, effort
+
+    def monthly(self, species_names: List[str], window: int = ROLLING_MONTHS, locations=None) -> pd.DataFrame:
+        """
+        Monthly counts of the given species, raw and per survey column, with
+        trailing `window`-month averages of both.
+
+        Returns:
+            DataFrame with `Species`, `Month` (first day of the month),
+            `Count`, `Surveys`, `Per Survey`, `Rolling Count` and
+            `Rolling Per Survey`, one row per species and surveyed month
+        """
+        totals, effort = self._restrict(locations)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            per_survey = totals / effort
+        rolling_count = rolling_mean(totals, window)
+        rolling_rate = rolling_mean(per_survey, window)
+
+        species_ids = np.array(sorted({self.registry.id_of(name) for name in species_names} -
+                                      {UNKNOWN_SPECIES_ID}), dtype=np.intp)
+        surveyed = np.flatnonzero(effort > 0)
+        rows = np.repeat(species_ids, len(surveyed))
+        columns = np.tile(surveyed, len(species_ids))
+        return pd.DataFrame({
+            "Species": [self.registry.species[i].name for i in rows],
+            "Month": self.months[columns].astype("datetime64[D]"),
+            "Count": totals[rows, columns],
+            "Surveys": effort[columns],
+            "Per Survey": per_survey[rows, columns],
+            "Rolling Count": rolling_count[rows, columns],
+            "Rolling Per Survey": rolling_rate[rows, columns],
+        })
+
+    def yearly(self, locations=None) -> pd.DataFrame:
+        """
+        Yearly counts of every species seen, raw and per survey column, with
+        the change from the previous surveyed year.
+
+        Years that were only partly surveyed compare fairly per survey
+        column, not by raw count. Years nobody surveyed are left out.
+
+        Returns:
+            DataFrame with `Species`, `Conservation Status`, `Year`, `Count`,
+            `Surveys`, `Per Survey`, `Change %` and `Per Survey Change %`
+        """
+        totals, effort = self._restrict(locations)
+        if not len(self.months):
+            return pd.DataFrame(columns=["Species", "Conservation Status", "Year", "Count", "Surveys",
+                                         "Per Survey", "Change %", "Per Survey Change %"])
+        # Months are contiguous, so each year is one run along the month axis
+        starts = np.flatnonzero(np.r_[True, np.diff(self.month_years) != 0])
+        yearly_effort = np.add.reduceat(effort, starts)
+        surveyed = yearly_effort > 0
+        years, yearly_effort = self.month_years[starts][surveyed], yearly_effort[surveyed]
+        yearly_totals = np.add.reduceat(np.nan_to_num(totals), starts, axis=1)[self.seen][:, surveyed]
+        per_survey = yearly_totals / yearly_effort
+
+        species = self.seen.repeat(len(years))
+        return pd.DataFrame({
+            "Species": [self.registry.species[i].name for i in species],
+            "Conservation Status": [self.registry.species[i].category for i in species],
+            "Year": np.tile(years, len(self.seen)),
+            "Count": yearly_totals.ravel().astype(np.int64),
+            "Surveys": np.tile(yearly_effort, len(self.seen)),
+            "Per Survey": per_survey.ravel(),
+            "Change %": percent_change(yearly_totals).ravel(),
+            "Per Survey Change %": percent_change(per_survey).ravel(),
+        })
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class Rule:
+    bit: int
+    label: str
+
+
+# Validation rules, each setting one bit of a sighting's issues
+RULES = {
+    "duplicate_rows": Rule(1, "Duplicate species row"),
+    "out_of_range_dates": Rule(2, "Date outside the sheet's year"),
+    "unknown_field_sections": Rule(4, "Unknown field section"),
+}
+
+
+def occurrences(sightings, start: int = 0) -> np.ndarray:
+    """
+    How many earlier sightings in the table share each sighting's species,
+    date, field section and surveyors. A species listed on two rows of a
+    sheet gives every survey column a second sighting with occurrence 1.
+
+    With `start`, only the sightings from that position on are counted,
+    e.g. those just appended, against every sighting before them.
+    """
+    positions = np.arange(start, len(sightings))
+    if start:
+        # Only earlier sightings on the same dates can share a survey column
+        earlier = np.flatnonzero(np.isin(sightings.ordinal[:start], sightings.ordinal[start:]))
+        positions = np.concatenate([earlier, positions])
+    codes = pd.DataFrame({"species": sightings.species_id[positions], "day": sightings.ordinal[positions],
+                          "location": sightings.location_code[positions],
+                          "surveyors": sightings.surveyor_code[positions]})
+    counts = codes.groupby(list(codes.columns), sort=False).cumcount().to_numpy()
+    return counts[len(positions) - (len(sightings) - start):]
+
+
+def sighting_keys(sightings, start: int = 0) -> np.ndarray:
+    """
+    Stable identifier of each sighting, e.g. "2025-05-03|Nightingale|Northern|Jo Bloggs|0".
+
+    Keys are built from names rather than codes, so they survive re-ingesting
+    the workbooks as long as the sighting itself is unchanged. They are only
+    unique within the whole dataset; compute them before taking subsets, or
+    pass `start` for the keys of the sightings from that position on.
+    """
+    def names(codes: np.ndarray, values: List[str]) -> pd.Series:
+        return pd.Series(np.array(values, dtype=object)[codes[start:]], dtype=object)
+
+    keys = (pd.Series(sightings.day[start:].astype(str), dtype=object) + "|" +
+            names(sightings.species_id, [s.name for s in sightings.registry.species]) + "|" +
+            names(sightings.location_code, sightings.locations) + "|" +
+            names(sightings.surveyor_code, sightings.surveyors) + "|" +
+            pd.Series(occurrences(sightings, start).astype(str), dtype=object))
+    return keys.to_numpy()
+
+
+def repeated_rows(species_ids: np.ndarray, seen: set) -> np.ndarray:
+    """
+    Which rows of a sheet list a species already listed on an earlier row,
+    given the species IDs of a block of rows and those of the rows before
+    it, which are updated with the block's.
+    """
+    repeated = pd.Series(species_ids).duplicated().to_numpy() | np.isin(species_ids, list(seen))
+    seen.update(species_ids.tolist())
+    return repeated
+
+
+def repeated_in_other_sheets(sightings, sheets: np.ndarray) -> np.ndarray:
+    """
+    Which sightings repeat one, with the same species, date, field section
+    and surveyors, from an earlier sheet (e.g. a copied workbook). Repeat
+    visits recorded in separate columns of one sheet are left alone.
+    """
+    codes = pd.DataFrame({"species": sightings.species_id, "day": sightings.ordinal,
+                          "location": sightings.location_code, "surveyors": sightings.surveyor_code})
+    first_sheet = pd.Series(sheets).groupby([codes[column] for column in codes.columns], sort=False).transform("first")
+    return sheets != first_sheet.to_numpy()
+
+
+def validate(sightings, sheets: np.ndarray, sheet_years: np.ndarray, field_sections: Iterable[str]) -> np.ndarray:
+    """
+    Evaluate every rule against a table in one vectorized pass.
+
+    Sightings from the second and later rows of a species within a sheet
+    are marked when the sheet is parsed (see `repeated_rows`), as only the
+    parser knows which row each came from; those marks are kept. Sightings
+    recorded again in a later sheet are marked here.
+
+    Args:
+        sightings: The whole dataset, so duplicates across sheets are seen
+        sheets: Position of the sheet each sighting was read from, in load order
+        sheet_years: Year of the sheet each sighting was read from; other dates are out of range
+        field_sections: Field sections the survey is divided into
+
+    Returns:
+        Issue bits per sighting, 0 for sightings that pass every rule
+    """
+    issues = sightings.issues & RULES["duplicate_rows"].bit
+    if not len(sightings):
+        return issues
+
+    issues[repeated_in_other_sheets(sightings, sheets)] |= RULES["duplicate_rows"].bit
+    issues[sightings.year != sheet_years] |= RULES["out_of_range_dates"].bit
+    known = np.isin(np.array(sightings.locations, dtype=object), list(field_sections))
+    issues[~known[sightings.location_code]] |= RULES["unknown_field_sections"].bit
+    return issues
+
+
+def validate_appended(sightings, start: int, field_sections: Iterable[str]) -> np.ndarray:
+    """
+    Evaluate the rules for the sightings appended from `start` on, e.g.
+    entered in the journal, against the whole table. Their dates were
+    entered rather than read from a sheet's header, so the date rule
+    doesn't apply.
+
+    Returns:
+        Issue bits per appended sighting
+    """
+    issues = np.zeros(len(sightings) - start, dtype=np.uint8)
+    issues[occurrences(sightings, start) > 0] |= RULES["duplicate_rows"].bit
+    known = np.isin(np.array(sightings.locations, dtype=object), list(field_sections))
+    issues[~known[sightings.location_code[start:]]] |= RULES["unknown_field_sections"].bit
+    return issues
+
+
+def describe_issues(issues: np.ndarray) -> List[str]:
+    """Labels of the rules each sighting breaks, comma separated."""
+    return [", ".join(rule.label for rule in RULES.values() if bits & rule.bit) for bits in issues.tolist()]
+
+
+def issue_counts(issues: np.ndarray) -> Dict[str, int]:
+    """Number of sightings breaking each rule."""
+    return {name: int(np.count_nonzero(issues & rule.bit)) for name, rule in RULES.items()}
+
+
+@dataclass
+class ExclusionMask:
+    """
+    Sightings left out of every view, for one version of the overlay.
+
+    `excluded` has one flag per sighting of the dataset it was built for, or
+    is None when the dataset applies the overlay itself (a SightingStore).
+    """
+    version: str
+    excluded: Optional[np.ndarray] = None
+
+    @cached_property
+    def packed(self) -> np.ndarray:
+        """Excluded rows as a packed bitset, for FilterIndex."""
+        return np.packbits(self.excluded)
+
+    @cached_property
+    def count(self) -> int:
+        return 0 if self.excluded is None else int(np.count_nonzero(self.excluded))
+
+
+# Overlay state: version, bits of the enabled rules and sightings flagged by hand
+OverlayState = Tuple[str, int, Dict[str, bool]]
+
+
+def exclusion_mask(keys: np.ndarray, issues: np.ndarray, state: OverlayState) -> ExclusionMask:
+    """Exclude sightings breaking an enabled rule, then apply the hand-set flags on top."""
+    version, rule_bits, flags = state
+    excluded = (issues & rule_bits) != 0
+    if flags:
+        positions = pd.Index(keys).get_indexer(list(flags))
+        found = positions >= 0
+        excluded[positions[found]] = np.array(list(flags.values()), dtype=bool)[found]
+    return ExclusionMask(version, excluded)
+
+
+class ExclusionOverlay:
+    """
+    Which validation rules exclude sightings, plus sightings flagged by hand,
+    persisted as a JSON file kept apart from the workbooks.
+
+    A flag either excludes a sighting (e.g. a doubtful record) or keeps one
+    that a rule would exclude. Flags are keyed on `sighting_keys`, so they
+    survive re-ingesting the workbooks. The overlay never changes the
+    dataset itself: `exclusion_mask` turns it into per-sighting exclusions
+    that are applied when filtering, so edits take effect on the next
+    rerun. The file is re-read when it changes on disk.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._rules = {name: True for name in RULES}
+        self._flags: Dict[str, bool] = {}
+        self._mtime_ns: Optional[int] = None
+        self._version = self._fingerprint()
+
+    def _fingerprint(self) -> str:
+        state = json.dumps({"rules": self._rules, "flags": self._flags}, sort_keys=True)
+        return hashlib.sha256(state.encode()).hexdigest()[:16]
+
+    def _reload(self) -> None:
+        """Re-read the file if it changed on disk. Called with the lock held."""
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns:
+            return
+        self._mtime_ns = mtime_ns
+        if mtime_ns is None:
+            return
+
+        try:
+            saved = json.loads(self.path.read_text())
+            rules = {name: bool(saved.get("rules", {}).get(name, True)) for name in RULES}
+            flags = {str(key): bool(value) for key, value in saved.get("flags", {}).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: Could not read sighting flags from {self.path}: {e}")
+            return
+        self._rules, self._flags = rules, flags
+        self._version = self._fingerprint()
+
+    def _save(self) -> None:
+        """Write the overlay atomically. Called with the lock held."""
+        self._version = self._fingerprint()
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"rules": self._rules, "flags": self._flags}, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
+        self._mtime_ns = self.path.stat().st_mtime_ns
+
+    def state(self) -> OverlayState:
+        """The version, enabled rule bits and flags, read together."""
+        with self._lock:
+            self._reload()
+            rule_bits = sum(RULES[name].bit for name, enabled in self._rules.items() if enabled)
+            return self._version, rule_bits, dict(self._flags)
+
+    @property
+    def version(self) -> str:
+        return self.state()[0]
+
+    def rules(self) -> Dict[str, bool]:
+        """Whether each rule excludes the sightings it catches."""
+        with self._lock:
+            self._reload()
+            return dict(self._rules)
+
+    def set_rule(self, name: str, enabled: bool) -> None:
+        if name not in RULES:
+            raise ValueError(f"Unknown validation rule '{name}'")
+        with self._lock:
+            self._reload()
+            self._rules[name] = enabled
+            self._save()
+
+    def set_excluded(self, changes: Dict[str, Tuple[bool, int]]) -> None:
+        """
+        Exclude or keep sightings by hand.
+
+        Args:
+            changes: Maps sighting keys to whether to exclude the sighting and
+                its issue bits. A flag that agrees with the enabled rules is
+                dropped rather than stored.
+        """
+        with self._lock:
+            self._reload()
+            rule_bits = sum(RULES[name].bit for name, enabled in self._rules.items() if enabled)
+            for key, (excluded, issues) in changes.items():
+                if excluded == bool(issues & rule_bits):
+                    self._flags.pop(key, None)
+                else:
+                    self._flags[key] = excluded
+            self._save()
@@ -0,0 +1,71 @@
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+# Seconds between background checks for changed workbooks; 0 turns the
+# watcher off and reloads changed workbooks on the next rerun instead
+WATCH_INTERVAL = float(os.environ.get("HEAL_WATCH_INTERVAL", "5"))
+
+
+class WorkbookWatcher(threading.Thread):
+    """
+    Background thread that polls for a new dataset version and reloads it.
+
+    `check` returns the version the workbooks are at now (cheap: stats, not
+    contents). A new version is only reloaded once it has been seen on two
+    polls in a row, so a workbook still being saved isn't parsed half-written.
+    `reload` does the parsing and swapping; sessions keep being served the
+    old dataset until it returns. Nothing is reloaded before `current`
+    reports a first version.
+    """
+
+    def __init__(self, check: Callable[[], str], reload: Callable[[str], bool],
+                 current: Callable[[], Optional[str]], interval: float = WATCH_INTERVAL):
+        super().__init__(name="workbook-watcher", daemon=True)
+        self.check = check
+        self.reload = reload
+        self.current = current
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.reloads = 0
+        self.failures = 0
+
+    def run(self) -> None:
+        seen = failed = None
+        while not self._stop_event.wait(self.interval):
+            try:
+                current = self.current()
+                if current is None:
+                    continue  # The first load happens in the foreground
+                version = self.check()
+                # A version that failed to load isn't retried until the workbooks change again
+                if version != current and version == seen and version != failed:
+                    if self.reload(version):
+                        self.reloads += 1
+                    else:
+                        self.failures += 1
+                        failed = version
+                seen = version
+            except Exception as e:
+                # Keep watching; the next change or poll may succeed
+                self.failures += 1
+                print(f"Warning: Reloading changed workbooks failed: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_watchers: Dict[str, WorkbookWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def start_watcher(name: str, check: Callable[[], str], reload: Callable[[str], bool],
+                  current: Callable[[], Optional[str]], interval: float = WATCH_INTERVAL) -> WorkbookWatcher:
+    """Start the process-wide watcher with the given name, unless it is already running."""
+    with _watchers_lock:
+        watcher = _watchers.get(name)
+        if watcher is None or not watcher.is_alive():
+            watcher = WorkbookWatcher(check, reload, current, interval)
+            watcher.start()
+            _watchers[name] = watcher
+        return watcher